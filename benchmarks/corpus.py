@@ -0,0 +1,193 @@
+import asyncio
+import json
+import re
+import time
+from typing import AsyncIterator, Dict, List, Union
+
+from llm.backends import (
+    Latency,
+    LLMBackend,
+    LLMResponse,
+    STREAM_CHUNK_PATTERN,
+)
+from llm.prompts import (
+    SQL_GEN_JSON_SYSTEM_PROMPT,
+    SQL_GEN_SYSTEM_PROMPT,
+    SQL_REPAIR_SYSTEM_PROMPT,
+    SQL_VAL_SYSTEM_PROMPT,
+)
+from utils.digest import estimate_tokens
+
+QUESTION_PATTERN = re.compile(r"<question>\s*(.*?)\s*</question>", re.S)
+TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.I)
+SUMMARY = (
+    "Here is what the flights data shows for your question, the detailed "
+    "rows are listed in the table below."
+)
+
+# Realistic questions with the SQL a good model writes for them, from
+# lookups of a few rows to scans of the whole flights table.
+QUESTIONS = {
+    "Which airline operates the most flights?": """
+        SELECT a.AIRLINE, SUM(r.FLIGHTS) AS TOTAL_FLIGHTS
+        FROM rollup_airline_month AS r
+        JOIN airlines AS a ON a.IATA_CODE = r.AIRLINE
+        GROUP BY a.AIRLINE ORDER BY TOTAL_FLIGHTS DESC LIMIT 1;""",
+    "What is the average arrival delay of each airline?": """
+        SELECT a.AIRLINE,
+            SUM(r.ARRIVAL_DELAY_SUM) * 1.0 / SUM(r.ARRIVAL_DELAY_COUNT)
+            AS AVG_ARRIVAL_DELAY
+        FROM rollup_airline_month AS r
+        JOIN airlines AS a ON a.IATA_CODE = r.AIRLINE
+        GROUP BY a.AIRLINE ORDER BY AVG_ARRIVAL_DELAY DESC;""",
+    "Which month had the highest cancellation rate?": """
+        SELECT r.MONTH,
+            SUM(r.CANCELLED_FLIGHTS) * 1.0 / SUM(r.FLIGHTS) AS CANCEL_RATE
+        FROM rollup_airline_month AS r
+        GROUP BY r.MONTH ORDER BY CANCEL_RATE DESC LIMIT 1;""",
+    "What are the ten busiest routes?": """
+        SELECT r.ORIGIN_AIRPORT, r.DESTINATION_AIRPORT,
+            SUM(r.FLIGHTS) AS TOTAL_FLIGHTS
+        FROM rollup_route_month AS r
+        GROUP BY r.ORIGIN_AIRPORT, r.DESTINATION_AIRPORT
+        ORDER BY TOTAL_FLIGHTS DESC LIMIT 10;""",
+    "Which airports have the worst departure delays?": """
+        SELECT p.AIRPORT, p.CITY,
+            SUM(r.DEPARTURE_DELAY_SUM) * 1.0 / SUM(r.DEPARTURE_DELAY_COUNT)
+            AS AVG_DEPARTURE_DELAY
+        FROM rollup_origin_month AS r
+        JOIN airports AS p ON p.IATA_CODE = r.ORIGIN_AIRPORT
+        GROUP BY p.AIRPORT, p.CITY
+        ORDER BY AVG_DEPARTURE_DELAY DESC LIMIT 10;""",
+    "Which day of the week has the most delayed arrivals?": """
+        SELECT r.DAY_OF_WEEK, SUM(r.DELAYED_ARRIVALS) AS DELAYED
+        FROM rollup_airline_day_of_week AS r
+        GROUP BY r.DAY_OF_WEEK ORDER BY DELAYED DESC LIMIT 1;""",
+    "How many flights departed from Atlanta on New Year's Day?": """
+        SELECT COUNT(*) AS FLIGHTS
+        FROM flights AS f
+        WHERE f.YEAR = 2015 AND f.MONTH = 1 AND f.DAY = 1
+            AND f.ORIGIN_AIRPORT = 'ATL';""",
+    "List the flights from JFK to LAX on July 4th.": """
+        SELECT f.AIRLINE, f.FLIGHT_NUMBER, f.SCHEDULED_DEPARTURE,
+            f.DEPARTURE_DELAY, f.ARRIVAL_DELAY
+        FROM flights AS f
+        WHERE f.YEAR = 2015 AND f.MONTH = 7 AND f.DAY = 4
+            AND f.ORIGIN_AIRPORT = 'JFK' AND f.DESTINATION_AIRPORT = 'LAX'
+        ORDER BY f.SCHEDULED_DEPARTURE;""",
+    "What was the longest flight by distance?": """
+        SELECT f.ORIGIN_AIRPORT, f.DESTINATION_AIRPORT, f.DISTANCE
+        FROM flights AS f ORDER BY f.DISTANCE DESC LIMIT 1;""",
+    "What are the most common cancellation reasons?": """
+        SELECT f.CANCELLATION_REASON, COUNT(*) AS CANCELLATIONS
+        FROM flights AS f
+        WHERE f.CANCELLED = 1
+        GROUP BY f.CANCELLATION_REASON ORDER BY CANCELLATIONS DESC;""",
+    "What is the average taxi out time at each airport?": """
+        SELECT f.ORIGIN_AIRPORT, AVG(f.TAXI_OUT) AS AVG_TAXI_OUT
+        FROM flights AS f
+        GROUP BY f.ORIGIN_AIRPORT ORDER BY AVG_TAXI_OUT DESC;""",
+    "How much of the arrival delay is caused by weather for each airline?": """
+        SELECT f.AIRLINE, SUM(f.WEATHER_DELAY) AS WEATHER_DELAY,
+            SUM(f.ARRIVAL_DELAY) AS ARRIVAL_DELAY
+        FROM flights AS f
+        WHERE f.ARRIVAL_DELAY > 15
+        GROUP BY f.AIRLINE;""",
+    "Which planes flew the most miles?": """
+        SELECT f.TAIL_NUMBER, SUM(f.DISTANCE) AS MILES
+        FROM flights AS f
+        WHERE f.TAIL_NUMBER IS NOT NULL
+        GROUP BY f.TAIL_NUMBER ORDER BY MILES DESC LIMIT 10;""",
+    "Show all flights delayed by more than three hours.": """
+        SELECT f.YEAR, f.MONTH, f.DAY, f.AIRLINE, f.FLIGHT_NUMBER,
+            f.ORIGIN_AIRPORT, f.DESTINATION_AIRPORT, f.ARRIVAL_DELAY
+        FROM flights AS f
+        WHERE f.ARRIVAL_DELAY > 180
+        ORDER BY f.ARRIVAL_DELAY DESC;""",
+    "How many airports are there in each state?": """
+        SELECT p.STATE, COUNT(*) AS AIRPORTS
+        FROM airports AS p
+        GROUP BY p.STATE ORDER BY AIRPORTS DESC;""",
+    "What is the weather like in Paris?": None,
+}
+
+
+class CorpusBackend(LLMBackend):
+    """
+    A local backend answering the questions of the corpus with their SQL
+    and every other prompt with a fixed text, after a simulated latency.
+    """
+
+    def __init__(
+        self,
+        questions: Dict[str, Union[str, None]] = QUESTIONS,
+        latency: Union[Latency, None] = None,
+    ) -> None:
+        """
+        Initialize the CorpusBackend instance.
+
+        Args:
+            questions (Dict[str, Union[str, None]]): SQL by question, None
+                for questions out of scope.
+            latency (Union[Latency, None]): Latency of every response, none
+                                            if None.
+        """
+        self.questions = questions
+        self.latency = latency or Latency()
+
+    def _content(self, messages: List[Dict], **params) -> str:
+        system = messages[0]["content"] if len(messages) > 1 else ""
+        if system in (
+            SQL_GEN_SYSTEM_PROMPT,
+            SQL_GEN_JSON_SYSTEM_PROMPT,
+            SQL_REPAIR_SYSTEM_PROMPT,
+        ):
+            match = QUESTION_PATTERN.search(messages[-1]["content"])
+            sql = self.questions.get(match.group(1)) if match else None
+            sql = " ".join(sql.split()) if sql else None
+            if system == SQL_GEN_JSON_SYSTEM_PROMPT:
+                return json.dumps(
+                    {
+                        "sql": sql,
+                        "in_scope": sql is not None,
+                        "tables_used": sorted(
+                            set(TABLE_PATTERN.findall(sql or ""))
+                        ),
+                    }
+                )
+            return sql or "None"
+        response_format = params.get("response_format") or {}
+        if (
+            system == SQL_VAL_SYSTEM_PROMPT
+            or response_format.get("type") == "json_object"
+        ):
+            return '{"is_valid": true}'
+        return SUMMARY
+
+    def _response(self, messages: List[Dict], **params) -> LLMResponse:
+        content = self._content(messages, **params)
+        return LLMResponse(
+            content,
+            prompt_tokens=sum(
+                estimate_tokens(message["content"]) for message in messages
+            ),
+            completion_tokens=estimate_tokens(content),
+        )
+
+    async def acomplete(self, messages: List[Dict], **params) -> LLMResponse:
+        await asyncio.sleep(self.latency.sample())
+        return self._response(messages, **params)
+
+    def complete(self, messages: List[Dict], **params) -> LLMResponse:
+        time.sleep(self.latency.sample())
+        return self._response(messages, **params)
+
+    async def astream(
+        self, messages: List[Dict], **params
+    ) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency.sample())
+        for chunk in STREAM_CHUNK_PATTERN.findall(
+            self._content(messages, **params)
+        ):
+            yield chunk
+            await asyncio.sleep(0)
@@ -0,0 +1,419 @@
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+BENCHMARK_DIR = Path(__file__).parent
+DATA_DIR = BENCHMARK_DIR / "data"
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+# The app imports the pipeline module as a top-level module.
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "src" / "app"))
+# No LLM API is called, the corpus backend answers instead.
+os.environ.setdefault("API_TYPE", "replay")
+
+from config.llm_config import LLMConfig  # noqa: E402
+from llm.backends import Latency  # noqa: E402
+from corpus import QUESTIONS, CorpusBackend  # noqa: E402
+
+# Tracing needs network access.
+LLMConfig.langfuse_enable = False
+import natural_to_sql  # noqa: E402
+import main  # noqa: E402
+
+# Functions of the pipeline timed as a stage of the requests.
+STAGES = {
+    "relevant_schema": "schema",
+    "database_schema": "schema",
+    "generate_sql_query": "generate",
+    "validate_query": "validate",
+    "repair_sql_query": "repair",
+    "aexecute_page": "execute",
+    "aexecute_query": "execute",
+    "build_result_digest": "digest",
+    "generate_natural_response": "summarize",
+}
+PERCENTILES = (50, 90, 99)
+# Latency changes smaller than this are noise, whatever the ratio.
+MIN_REGRESSION_MS = 5.0
+
+
+class StageTimer:
+    """
+    Collects the durations of the stages of the requests.
+    """
+
+    def __init__(self) -> None:
+        self.timings = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        self.timings[stage].append(seconds)
+
+    def reset(self):
+        self.timings.clear()
+
+    def wrap(self, module, name: str, stage: str):
+        """Time every call of a function of a module as a stage.
+
+        Args:
+            module: The module calling the function by its global name.
+            name (str): Function name.
+            stage (str): Stage name.
+        """
+        function = getattr(module, name)
+        if inspect.iscoroutinefunction(function):
+
+            @wraps(function)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        else:
+
+            @wraps(function)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        setattr(module, name, timed)
+
+    def summary(self) -> dict:
+        """Summarize the durations of every stage in milliseconds
+
+        Returns:
+            dict: Count, mean, percentiles and maximum by stage
+        """
+        summary = {}
+        for stage, seconds in sorted(self.timings.items()):
+            ms = np.array(seconds) * 1000
+            summary[stage] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 3),
+                **{
+                    f"p{q}_ms": round(float(np.percentile(ms, q)), 3)
+                    for q in PERCENTILES
+                },
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return summary
+
+
+def peak_rss_mib() -> float:
+    """Get the peak resident memory of the process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def synthetic_db(rows: int, rebuild: bool = False) -> Path:
+    """Get the synthetic database of a size, building it if needed
+
+    It is built in another process, so that its memory use does not
+    count towards the peak of the benchmark.
+
+    Args:
+        rows (int): Number of flights
+        rebuild (bool, optional): Whether to build it again
+
+    Returns:
+        Path: The database file
+    """
+    db_name = DATA_DIR / f"flights_{rows}.db"
+    if rebuild or not db_name.exists():
+        subprocess.run(
+            [
+                sys.executable,
+                str(BENCHMARK_DIR / "synthetic_db.py"),
+                str(db_name),
+                "--rows",
+                str(rows),
+            ],
+            check=True,
+        )
+    return db_name
+
+
+async def run_load(send, questions: list, n_requests: int, concurrency: int):
+    """Send requests with a bounded number in flight
+
+    Args:
+        send: Coroutine function sending one question.
+        questions (list): Questions asked in turn.
+        n_requests (int): Number of requests.
+        concurrency (int): Maximum number of requests in flight.
+
+    Returns:
+        Tuple[float, int]: Wall time in seconds and number of failures.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def request(index: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await send(questions[index % len(questions)])
+            except Exception as e:
+                errors += 1
+                print(f"Request failed: {e!r}")
+            finally:
+                timer.record("total", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(n_requests)))
+    return time.perf_counter() - start, errors
+
+
+async def benchmark_mode(mode: str, db_name: Path, args) -> dict:
+    """Run the workload against the pipeline or the app
+
+    Args:
+        mode (str): Either "pipeline" or "app".
+        db_name (Path): The database file.
+        args: The command line arguments.
+
+    Returns:
+        dict: Throughput, failures and stage durations of the run.
+    """
+    questions = list(QUESTIONS)
+    if mode == "pipeline":
+
+        async def send(question: str):
+            await natural_to_sql.process_query(db_name, question)
+
+        await run_load(send, questions, len(questions), 1)
+        timer.reset()
+        wall, errors = await run_load(
+            send, questions, args.requests, args.concurrency
+        )
+    else:
+        main.database_file_path = db_name
+        transport = httpx.ASGITransport(app=main.app)
+        async with main.lifespan(main.app), httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=None
+        ) as client:
+
+            async def send(question: str):
+                response = await client.post(
+                    "/process-query", data={"query": question}
+                )
+                response.raise_for_status()
+
+            await run_load(send, questions, len(questions), 1)
+            timer.reset()
+            wall, errors = await run_load(
+                send, questions, args.requests, args.concurrency
+            )
+
+    result = {
+        "requests": args.requests,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 2),
+        "stages": timer.summary(),
+    }
+    timer.reset()
+    return result
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """List the metrics of a run worse than the baseline
+
+    Args:
+        current (dict): Results of the run.
+        baseline (dict): Results of the baseline run.
+        tolerance (float): Relative change allowed, twice as much for the
+                           99th percentiles.
+
+    Returns:
+        list: One description per regression.
+    """
+    regressions = []
+    for mode, result in current["modes"].items():
+        base = baseline["modes"].get(mode)
+        if base is None:
+            continue
+        if result["throughput_rps"] < base["throughput_rps"] * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"{mode} throughput {result['throughput_rps']} rps < "
+                f"{base['throughput_rps']} rps"
+            )
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats is None:
+                continue
+            # Tail latencies vary more between runs.
+            for metric, allowed in (("p50_ms", 1), ("p99_ms", 2)):
+                value, reference = stats[metric], base_stats[metric]
+                if (
+                    value > reference * (1 + allowed * tolerance)
+                    and value - reference > MIN_REGRESSION_MS
+                ):
+                    regressions.append(
+                        f"{mode} {stage} {metric} {value} > {reference}"
+                    )
+    if current["peak_rss_mib"] > baseline["peak_rss_mib"] * (1 + tolerance):
+        regressions.append(
+            f"peak RSS {current['peak_rss_mib']} MiB > "
+            f"{baseline['peak_rss_mib']} MiB"
+        )
+    return regressions
+
+
+def print_report(report: dict):
+    print(json.dumps(report["config"]))
+    for mode, result in report["modes"].items():
+        print(
+            f"\n{mode}: {result['throughput_rps']} requests/s, "
+            f"{result['errors']} errors in {result['wall_seconds']}s"
+        )
+        print(
+            f"{'stage':<12}{'count':>8}{'mean':>10}"
+            + "".join(f"{f'p{q}':>10}" for q in PERCENTILES)
+            + f"{'max':>10}"
+        )
+        for stage, stats in result["stages"].items():
+            print(
+                f"{stage:<12}{stats['count']:>8}{stats['mean_ms']:>10.2f}"
+                + "".join(f"{stats[f'p{q}_ms']:>10.2f}" for q in PERCENTILES)
+                + f"{stats['max_ms']:>10.2f}"
+            )
+    print(f"\nPeak RSS: {report['peak_rss_mib']} MiB")
+
+
+timer = StageTimer()
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the query pipeline on a synthetic database"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=10000, help="Flights of the database"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=500, help="Number of requests"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Requests in flight"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["pipeline", "app", "all"],
+        default="all",
+        help="Call process_query, the app or both",
+    )
+    parser.add_argument(
+        "--llm-latency",
+        default="fixed:0",
+        help="LLM latency as distribution:mean[:stddev[:seed]] in seconds",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the answer cache and the few-shot examples enabled",
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Rebuild the database"
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help="Baseline file to compare with",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the baseline of this configuration",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative change tolerated before reporting a regression",
+    )
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+
+    # Keep the console readable, the log file still gets every record.
+    for handler in logging.getLogger().handlers:
+        # The queue handler passes records to the handlers writing them.
+        for target in getattr(handler, "handlers", (handler,)):
+            if not isinstance(target, logging.FileHandler):
+                target.setLevel(logging.WARNING)
+
+    db_name = synthetic_db(args.rows, rebuild=args.rebuild)
+    natural_to_sql.client.backend = CorpusBackend(
+        latency=Latency.from_spec(args.llm_latency)
+    )
+    if not args.cache:
+        natural_to_sql.answer_cache = None
+        natural_to_sql.example_store = None
+    for name, stage in STAGES.items():
+        timer.wrap(natural_to_sql, name, stage)
+
+    config = {
+        "rows": args.rows,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "llm_latency": args.llm_latency,
+        "cache": args.cache,
+    }
+    modes = ["pipeline", "app"] if args.mode == "all" else [args.mode]
+    report = {
+        "config": config,
+        "modes": {
+            mode: asyncio.run(benchmark_mode(mode, db_name, args))
+            for mode in modes
+        },
+        "peak_rss_mib": peak_rss_mib(),
+    }
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    key = " ".join(f"{name}={value}" for name, value in config.items())
+    baselines = (
+        json.loads(args.baseline.read_text())
+        if args.baseline.exists()
+        else {}
+    )
+    regressions = []
+    if key in baselines:
+        regressions = compare(report, baselines[key], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if not regressions:
+            print("No regression against the baseline")
+    if args.save_baseline:
+        baselines[key] = report
+        args.baseline.write_text(json.dumps(baselines, indent=2))
+        print(f"Saved the baseline to {args.baseline}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_benchmark()
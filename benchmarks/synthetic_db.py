@@ -0,0 +1,298 @@
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sqlite_db.create import (
+    BUILD_PRAGMAS,
+    SERVE_PRAGMAS,
+    apply_pragmas,
+    bump_data_version,
+    create_indexes,
+    create_table,
+    insert_query,
+)
+from sqlite_db.db_constants import TABLE_COLUMNS
+from sqlite_db.rollups import refresh_rollups
+
+DEFAULT_CHUNK_SIZE = 100000
+YEAR = 2015
+
+AIRLINES = [
+    ("WN", "Southwest Airlines Co.", 0.22),
+    ("DL", "Delta Air Lines Inc.", 0.15),
+    ("AA", "American Airlines Inc.", 0.12),
+    ("OO", "Skywest Airlines Inc.", 0.10),
+    ("EV", "Atlantic Southeast Airlines", 0.10),
+    ("UA", "United Air Lines Inc.", 0.09),
+    ("MQ", "American Eagle Airlines Inc.", 0.05),
+    ("B6", "JetBlue Airways", 0.05),
+    ("US", "US Airways Inc.", 0.03),
+    ("AS", "Alaska Airlines Inc.", 0.03),
+    ("NK", "Spirit Air Lines", 0.02),
+    ("F9", "Frontier Airlines Inc.", 0.02),
+    ("HA", "Hawaiian Airlines Inc.", 0.01),
+    ("VX", "Virgin America", 0.01),
+]
+
+AIRPORTS = [
+    ("ATL", "Hartsfield-Jackson Atlanta International Airport", "Atlanta",
+     "GA", 33.64044, -84.42694),
+    ("ORD", "Chicago O'Hare International Airport", "Chicago", "IL",
+     41.9796, -87.90446),
+    ("DFW", "Dallas/Fort Worth International Airport", "Dallas-Fort Worth",
+     "TX", 32.89595, -97.0372),
+    ("DEN", "Denver International Airport", "Denver", "CO", 39.85841,
+     -104.667),
+    ("LAX", "Los Angeles International Airport", "Los Angeles", "CA",
+     33.94254, -118.40807),
+    ("SFO", "San Francisco International Airport", "San Francisco", "CA",
+     37.619, -122.37484),
+    ("PHX", "Phoenix Sky Harbor International Airport", "Phoenix", "AZ",
+     33.43417, -112.00806),
+    ("IAH", "George Bush Intercontinental Airport", "Houston", "TX",
+     29.98047, -95.33972),
+    ("LAS", "McCarran International Airport", "Las Vegas", "NV", 36.08036,
+     -115.15233),
+    ("MSP", "Minneapolis-Saint Paul International Airport", "Minneapolis",
+     "MN", 44.88055, -93.21692),
+    ("MCO", "Orlando International Airport", "Orlando", "FL", 28.42889,
+     -81.31603),
+    ("SEA", "Seattle-Tacoma International Airport", "Seattle", "WA",
+     47.44898, -122.30931),
+    ("DTW", "Detroit Metropolitan Airport", "Detroit", "MI", 42.21206,
+     -83.34884),
+    ("BOS", "Gen. Edward Lawrence Logan International Airport", "Boston",
+     "MA", 42.36435, -71.00518),
+    ("EWR", "Newark Liberty International Airport", "Newark", "NJ",
+     40.6925, -74.16866),
+    ("CLT", "Charlotte Douglas International Airport", "Charlotte", "NC",
+     35.21401, -80.94313),
+    ("LGA", "LaGuardia Airport", "New York", "NY", 40.77724, -73.87261),
+    ("SLC", "Salt Lake City International Airport", "Salt Lake City", "UT",
+     40.78839, -111.97777),
+    ("JFK", "John F. Kennedy International Airport", "New York", "NY",
+     40.63975, -73.77893),
+    ("BWI", "Baltimore-Washington International Airport", "Baltimore", "MD",
+     39.1754, -76.6682),
+    ("MDW", "Chicago Midway International Airport", "Chicago", "IL",
+     41.78598, -87.75242),
+    ("DCA", "Ronald Reagan Washington National Airport", "Arlington", "VA",
+     38.85208, -77.03772),
+    ("FLL", "Fort Lauderdale-Hollywood International Airport",
+     "Ft. Lauderdale", "FL", 26.07258, -80.15275),
+    ("SAN", "San Diego International Airport", "San Diego", "CA", 32.73356,
+     -117.18966),
+    ("MIA", "Miami International Airport", "Miami", "FL", 25.79325,
+     -80.29056),
+    ("TPA", "Tampa International Airport", "Tampa", "FL", 27.97547,
+     -82.53325),
+    ("PDX", "Portland International Airport", "Portland", "OR", 45.58872,
+     -122.5975),
+    ("HNL", "Honolulu International Airport", "Honolulu", "HI", 21.31869,
+     -157.92241),
+    ("AUS", "Austin-Bergstrom International Airport", "Austin", "TX",
+     30.19453, -97.66987),
+    ("BNA", "Nashville International Airport", "Nashville", "TN", 36.12448,
+     -86.67818),
+]
+
+CANCELLATION_REASONS = np.array(["A", "B", "C", "D"], dtype=object)
+
+
+def _hhmm(minutes: np.ndarray) -> np.ndarray:
+    """Convert minutes after midnight to the hhmm clock times of the data"""
+    minutes = np.mod(minutes, 24 * 60)
+    return (minutes // 60) * 100 + minutes % 60
+
+
+def _distances() -> np.ndarray:
+    """Great circle distances in miles between every pair of airports"""
+    coordinates = np.radians(
+        np.array([(airport[4], airport[5]) for airport in AIRPORTS])
+    )
+    lat, lon = coordinates[:, 0], coordinates[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat[:, None]) * np.cos(lat[None, :]) * np.sin(dlon / 2) ** 2
+    )
+    return np.rint(2 * 3959 * np.arcsin(np.sqrt(a))).astype(np.int64)
+
+
+def generate_flights(rng: np.random.Generator, n_rows: int) -> dict:
+    """Generate random flights with plausible value distributions
+
+    Args:
+        rng (np.random.Generator): Random generator
+        n_rows (int): Number of flights
+
+    Returns:
+        dict: Column arrays by column name, NaN for missing values
+    """
+    dates = np.datetime64(f"{YEAR}-01-01") + rng.integers(0, 365, n_rows)
+    months = dates.astype("datetime64[M]")
+    # 1970-01-01 was a Thursday, DAY_OF_WEEK starts at 1 for Monday.
+    day_of_week = (dates.astype(np.int64) + 3) % 7 + 1
+
+    airline_weights = np.array([airline[2] for airline in AIRLINES])
+    airline = rng.choice(
+        len(AIRLINES), n_rows, p=airline_weights / airline_weights.sum()
+    )
+    # Busy hubs come first in AIRPORTS and get more traffic.
+    airport_weights = 1 / np.arange(1, len(AIRPORTS) + 1)
+    origin = rng.choice(
+        len(AIRPORTS), n_rows, p=airport_weights / airport_weights.sum()
+    )
+    destination = (origin + rng.integers(1, len(AIRPORTS), n_rows)) % len(
+        AIRPORTS
+    )
+    distance = _distances()[origin, destination]
+
+    cancelled = rng.random(n_rows) < 0.015
+    diverted = ~cancelled & (rng.random(n_rows) < 0.003)
+    flown = ~cancelled
+
+    scheduled_departure = rng.integers(5 * 60, 23 * 60, n_rows)
+    scheduled_time = np.rint(distance / 8 + 26 + rng.normal(0, 5, n_rows))
+    departure_delay = np.rint(rng.gamma(0.6, 25, n_rows) - 8)
+    taxi_out = np.rint(rng.gamma(4, 4, n_rows))
+    taxi_in = np.rint(rng.gamma(2, 3.5, n_rows))
+    air_time = np.rint(distance / 8 + rng.normal(0, 4, n_rows)).clip(15)
+    elapsed_time = taxi_out + air_time + taxi_in
+    arrival_delay = departure_delay + elapsed_time - scheduled_time
+    departure = scheduled_departure + departure_delay
+    wheels_off = departure + taxi_out
+    wheels_on = wheels_off + air_time
+
+    def flown_only(values, mask=flown):
+        return np.where(mask, values, np.nan)
+
+    arrived = flown & ~diverted
+    late = arrived & (arrival_delay > 15)
+    shares = rng.dirichlet(np.ones(5), n_rows) * arrival_delay[:, None]
+    reasons = CANCELLATION_REASONS[rng.integers(0, 4, n_rows)]
+
+    codes = np.array([airline[0] for airline in AIRLINES], dtype=object)
+    iata = np.array([airport[0] for airport in AIRPORTS], dtype=object)
+    tail = rng.integers(100, 1000, n_rows).astype(str).astype(object)
+    return {
+        "YEAR": months.astype(np.int64) // 12 + 1970,
+        "MONTH": months.astype(np.int64) % 12 + 1,
+        "DAY": (dates - months).astype(np.int64) + 1,
+        "DAY_OF_WEEK": day_of_week,
+        "AIRLINE": codes[airline],
+        "FLIGHT_NUMBER": rng.integers(1, 7000, n_rows),
+        "TAIL_NUMBER": "N" + tail + codes[airline],
+        "ORIGIN_AIRPORT": iata[origin],
+        "DESTINATION_AIRPORT": iata[destination],
+        "SCHEDULED_DEPARTURE": _hhmm(scheduled_departure),
+        "DEPARTURE_TIME": flown_only(_hhmm(departure)),
+        "DEPARTURE_DELAY": flown_only(departure_delay),
+        "TAXI_OUT": flown_only(taxi_out),
+        "WHEELS_OFF": flown_only(_hhmm(wheels_off)),
+        "SCHEDULED_TIME": scheduled_time,
+        "ELAPSED_TIME": flown_only(elapsed_time, arrived),
+        "AIR_TIME": flown_only(air_time, arrived),
+        "DISTANCE": distance,
+        "WHEELS_ON": flown_only(_hhmm(wheels_on), arrived),
+        "TAXI_IN": flown_only(taxi_in, arrived),
+        "SCHEDULED_ARRIVAL": _hhmm(scheduled_departure + scheduled_time),
+        "ARRIVAL_TIME": flown_only(_hhmm(wheels_on + taxi_in), arrived),
+        "ARRIVAL_DELAY": flown_only(arrival_delay, arrived),
+        "DIVERTED": diverted.astype(np.int64),
+        "CANCELLED": cancelled.astype(np.int64),
+        "CANCELLATION_REASON": np.where(cancelled, reasons, None),
+        "AIR_SYSTEM_DELAY": flown_only(np.rint(shares[:, 0]), late),
+        "SECURITY_DELAY": flown_only(np.rint(shares[:, 1]), late),
+        "AIRLINE_DELAY": flown_only(np.rint(shares[:, 2]), late),
+        "LATE_AIRCRAFT_DELAY": flown_only(np.rint(shares[:, 3]), late),
+        "WEATHER_DELAY": flown_only(np.rint(shares[:, 4]), late),
+    }
+
+
+def _rows(columns: dict) -> list:
+    """Turn column arrays into rows of Python values, NaN becoming None"""
+    values = []
+    for name in TABLE_COLUMNS["flights"]:
+        column = columns[name].tolist()
+        if columns[name].dtype.kind == "f":
+            column = [None if v != v else v for v in column]
+        values.append(column)
+    return list(zip(*values))
+
+
+def build_synthetic_db(
+    db_name: str,
+    n_rows: int,
+    seed: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """Build a flights database filled with random data
+
+    The tables, rollups and indexes are the ones built by create.py from
+    the real data, so queries behave alike on both.
+
+    Args:
+        db_name (str): Database name
+        n_rows (int): Number of flights
+        seed (int, optional): Seed of the random generator
+        chunk_size (int, optional): Number of flights inserted at once
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(db_name)
+    apply_pragmas(conn, BUILD_PRAGMAS)
+    for table_name in TABLE_COLUMNS:
+        create_table(conn, table_name)
+
+    conn.executemany(
+        insert_query("airlines"), [airline[:2] for airline in AIRLINES]
+    )
+    conn.executemany(
+        insert_query("airports"),
+        [airport[:4] + ("USA",) + airport[4:] for airport in AIRPORTS],
+    )
+    for offset in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - offset)
+        conn.executemany(
+            insert_query("flights"), _rows(generate_flights(rng, size))
+        )
+        conn.commit()
+        print(f"Inserted {offset + size} of {n_rows} flights")
+
+    refresh_rollups(conn, full=True)
+    create_indexes(conn)
+    bump_data_version(conn)
+    conn.commit()
+    apply_pragmas(conn, SERVE_PRAGMAS)
+    conn.close()
+    print(
+        f"Built {db_name} with {n_rows} flights in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a flights database filled with random data"
+    )
+    parser.add_argument("output", type=Path, help="Database file to create")
+    parser.add_argument(
+        "--rows", type=int, default=10000, help="Number of flights"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the random generator"
+    )
+    args = parser.parse_args()
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.unlink(missing_ok=True)
+    build_synthetic_db(str(args.output), args.rows, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,93 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Union
 from fastapi import FastAPI, Request, Form
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 import uvicorn
 import logging.config
 
-from natural_to_sql import process_query, score_feedback
-
-app = FastAPI()
+from natural_to_sql import (
+    process_query,
+    fetch_page,
+    export_result,
+    stream_query,
+    score_feedback,
+    cache_file_path,
+    client,
+)
+from utils.helpers import format_sse
+from utils.metrics import SharedMetrics, metrics
+from sqlite_db.pool import get_pool, close_pools
+from sqlite_db.result import ColumnarResult
+from config.pipeline_config import PipelineConfig
+from config.server_config import ServerConfig
+from config.telemetry_config import TelemetryConfig
+from sqlite_db.executor import get_executor, shutdown_executor
 
 parent_dir = Path(__file__).parent
 config_file_path = parent_dir.parent / "config" / "logging_config.ini"
 logging.config.fileConfig(config_file_path)
 logger = logging.getLogger()
 database_file_path = parent_dir.parent / "sqlite_db" / "flights.db"
+DISCONNECT_POLL_INTERVAL = 0.5
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Metrics of all the workers, None when serving from a single process.
+shared_metrics = None
+
+
+async def publish_metrics(shared: SharedMetrics):
+    """Write the metrics of this worker to the shared table periodically.
+
+    Args:
+        shared (SharedMetrics): The shared metrics of the workers.
+    """
+    while True:
+        await asyncio.sleep(ServerConfig.metrics_publish_interval)
+        await asyncio.to_thread(shared.publish)
+
+
+def render_metrics() -> str:
+    """Render the metrics of this worker, or of every worker if shared.
+
+    Returns:
+        str: The metrics in the Prometheus text format.
+    """
+    if shared_metrics is None:
+        return metrics.render_prometheus()
+    shared_metrics.publish()
+    return shared_metrics.collect().render_prometheus()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global shared_metrics
+    # Each worker process shares one connection pool of the flights
+    # database and one query executor across its requests.
+    pool = get_pool(database_file_path)
+    if not pool.health_check():
+        logger.warning("Database %s is not reachable", database_file_path)
+    get_executor()
+    publisher = None
+    if ServerConfig.workers > 1:
+        shared_metrics = SharedMetrics(cache_file_path, metrics)
+        publisher = asyncio.create_task(publish_metrics(shared_metrics))
+    yield
+    if publisher is not None:
+        publisher.cancel()
+        shared_metrics.publish()
+        shared_metrics.close()
+        shared_metrics = None
+    shutdown_executor(wait=False)
+    close_pools()
+    # Export the traces still queued, a later lifespan restarts the export.
+    await asyncio.to_thread(client.close, TelemetryConfig.shutdown_timeout)
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.mount(
@@ -26,18 +98,51 @@ app.mount(
 templates = Jinja2Templates(directory=parent_dir / "templates")
 
 
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before the response is ready."""
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Run a coroutine, cancelling it if the client disconnects.
+
+    Args:
+        request (Request): The incoming request.
+        coro: The coroutine handling the request.
+
+    Returns:
+        The result of the coroutine.
+    """
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            raise ClientDisconnected()
+
+
 @app.get("/")
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.post("/process-query")
-async def handle_query(request: Request, query: str = Form(...)):
-    msg, result_data = await process_query(
-        database_file_path=database_file_path, user_query=query
-    )
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
 
-    columns = list(result_data[0].keys()) if result_data else []
+
+def render_results(
+    request: Request,
+    query: str,
+    msg: str,
+    result_data: ColumnarResult,
+    page: dict,
+    trace_id: Union[str, None] = None,
+):
+    columns = result_data.columns if result_data else []
 
     return templates.TemplateResponse(
         "results.html",
@@ -47,17 +152,119 @@ async def handle_query(request: Request, query: str = Form(...)):
             "columns": columns,
             "message": msg if msg is not None else "",
             "data": result_data,
+            "page": page,
+            "trace_id": trace_id,
         },
     )
 
 
+@app.post("/process-query")
+async def handle_query(
+    request: Request,
+    query: str = Form(...),
+    page: int = Form(1),
+    page_size: int = Form(PipelineConfig.page_size),
+):
+    # The pipeline task inherits the trace of the request.
+    with client.trace_request(input=query) as trace_id:
+        try:
+            msg, result_data, page_info = await cancel_on_disconnect(
+                request,
+                process_query(
+                    database_file_path=database_file_path,
+                    user_query=query,
+                    page=page,
+                    page_size=page_size,
+                ),
+            )
+        except ClientDisconnected:
+            logger.info("Client disconnected, query cancelled")
+            return Response(status_code=499)
+
+    return render_results(
+        request, query, msg, result_data, page_info, trace_id
+    )
+
+
+@app.get("/results/{cursor}")
+async def handle_page(
+    request: Request,
+    cursor: str,
+    page: int = 1,
+    page_size: int = PipelineConfig.page_size,
+):
+    try:
+        msg, result_data, page_info = await cancel_on_disconnect(
+            request,
+            fetch_page(
+                database_file_path=database_file_path,
+                cursor=cursor,
+                page=page,
+                page_size=page_size,
+            ),
+        )
+    except ClientDisconnected:
+        logger.info("Client disconnected, query cancelled")
+        return Response(status_code=499)
+
+    return render_results(request, "", msg, result_data, page_info)
+
+
+@app.get("/results/{cursor}/export")
+async def handle_export(cursor: str, format: str = "csv"):
+    if format not in EXPORT_MEDIA_TYPES:
+        return Response(f"Unknown format: {format}", status_code=400)
+    result_data = await export_result(
+        database_file_path=database_file_path, cursor=cursor
+    )
+    if result_data is None:
+        return Response("Result not found", status_code=404)
+
+    if format == "csv":
+        content = result_data.to_csv()
+    elif format == "json":
+        content = result_data.to_json()
+    else:
+        try:
+            content = result_data.to_arrow_ipc()
+        except ImportError as e:
+            return Response(str(e), status_code=501)
+    return Response(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f"attachment; filename=result.{format}"
+        },
+    )
+
+
+@app.post("/process-query/stream")
+async def handle_query_stream(query: str = Form(...)):
+    async def event_stream():
+        with client.trace_request(input=query) as trace_id:
+            # Clients send the trace id back with their feedback.
+            yield format_sse("trace", trace_id)
+            async for event in stream_query(
+                database_file_path=database_file_path, user_query=query
+            ):
+                yield format_sse(event["event"], event["data"])
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/submit-feedback", response_class=HTMLResponse)
 async def submit_feedback(
     rating: int = Form(...),
     comment: str = Form(""),
+    cursor: str = Form(""),
+    trace_id: str = Form(""),
 ):
     await score_feedback(
-        rating=rating, score_name="Helpfulness", comment=comment
+        rating=rating,
+        score_name="Helpfulness",
+        comment=comment,
+        cursor=cursor or None,
+        trace_id=trace_id or None,
     )
     response_html = f"""
     <p>Thank you for your feedback!</p>
@@ -67,5 +274,26 @@ async def submit_feedback(
     return response_html
 
 
+@app.get("/metrics")
+async def handle_metrics():
+    content = await asyncio.to_thread(render_metrics)
+    return Response(content, media_type=PROMETHEUS_MEDIA_TYPE)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host=os.getenv("HOSTNAME"), port=int(os.getenv("PORT")))
+    host, port = os.getenv("HOSTNAME"), int(os.getenv("PORT"))
+    if ServerConfig.workers > 1:
+        # Start counting from zero, then let every worker process import
+        # the app by name and run its own lifespan.
+        shared = SharedMetrics(cache_file_path, metrics)
+        shared.clear()
+        shared.close()
+        uvicorn.run(
+            "main:app",
+            host=host,
+            port=port,
+            workers=ServerConfig.workers,
+            app_dir=str(parent_dir),
+        )
+    else:
+        uvicorn.run(app, host=host, port=port)
@@ -1,16 +1,44 @@
+import asyncio
+import inspect
+import time
+from functools import partial, wraps
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Dict,
+    Tuple,
+    Union,
+)
 import logging.config
 
-from sqlite_db.execute import execute_query
+from sqlite_db.catalog import database_schema, query_schema, relevant_schema
+from sqlite_db.execute import SQL_ERROR_PREFIX
+from sqlite_db.executor import acall, aexecute_query, aexecute_page
+from sqlite_db.pool import get_pool
+from sqlite_db.validate import validate_query
+from sqlite_db.result import ColumnarResult
+from sqlite_db.templates import TemplateMatch, match_template
 from config.llm_config import LLMConfig
+from config.cache_config import CacheConfig
+from config.pipeline_config import PipelineConfig
+from config.server_config import ServerConfig
 from llm.llm_client import LLMClient
 from llm.generator import (
     generate_sql_query,
+    generate_sql_json,
     validate_sql_query,
+    repair_sql_query,
     generate_natural_response,
+    stream_natural_response,
 )
 from utils.helpers import format_sql, format_json
+from utils.cache import create_answer_cache, create_cursor_store
+from utils.digest import build_result_digest, estimate_tokens
+from utils.examples import ExampleStore, format_examples
+from utils.metrics import metrics
 
 
 parent_dir = Path(__file__).parent
@@ -27,93 +55,983 @@ client = LLMClient(
     track_model_name=LLMConfig.track_model_name,
 )
 
+# Worker processes share their answers and cursors through SQLite.
+cache_backend = "sqlite" if ServerConfig.workers > 1 else CacheConfig.backend
+cache_file_path = parent_dir.parent / "sqlite_db" / CacheConfig.file_name
+
+answer_cache = (
+    create_answer_cache(
+        backend=cache_backend,
+        db_name=cache_file_path,
+        ttl_seconds=CacheConfig.ttl_seconds,
+        max_entries=CacheConfig.max_entries,
+        similarity_threshold=CacheConfig.similarity_threshold,
+    )
+    if CacheConfig.enable
+    else None
+)
+
+cursor_store = create_cursor_store(
+    backend=cache_backend,
+    db_name=cache_file_path,
+    ttl_seconds=CacheConfig.cursor_ttl_seconds,
+    max_entries=CacheConfig.max_entries,
+)
+
+example_store = (
+    ExampleStore(
+        parent_dir.parent / "sqlite_db" / PipelineConfig.examples_file_name,
+        max_examples=PipelineConfig.max_examples,
+    )
+    if PipelineConfig.few_shot_k
+    else None
+)
+
+OUT_OF_SCOPE_MESSAGE = (
+    "Sorry, I can only answer questions related to flights data."
+)
+GENERATION_ERROR_MESSAGE = (
+    "Sorry, I am facing some problems accessing the data. "
+    "Please try again!"
+)
+NO_RESULTS_MESSAGE = (
+    "Sorry, I could not find the answer to your questions. "
+    "Try again with better explanations!"
+)
+EXPIRED_CURSOR_MESSAGE = "Sorry, this result has expired. Please ask again!"
+
+# Validation errors worth sending back to the LLM for a repair.
+REPAIRABLE_CODES = {
+    "incomplete",
+    "multiple_statements",
+    "syntax_error",
+    "schema_error",
+}
+
+
+async def remember_example(user_query: str, sql: str):
+    """Store the SQL query of an answered question as an unverified
+       example for similar questions, in a thread to keep the write off
+       the event loop.
+
+    Args:
+        user_query (str): The answered user query.
+        sql (str): The SQL query returning its result.
+    """
+    if example_store is not None and PipelineConfig.few_shot_from_runs:
+        await asyncio.to_thread(example_store.add, user_query, sql)
+
+
+def traced(function):
+    """Give each call of a pipeline function a trace of its own, unless
+       it is called within the trace of a request.
+
+    Args:
+        function: A coroutine or async generator function.
+
+    Returns:
+        The decorated function.
+    """
+    if inspect.isasyncgenfunction(function):
+
+        @wraps(function)
+        async def traced_generator(*args, **kwargs):
+            with client.trace_request():
+                async for item in function(*args, **kwargs):
+                    yield item
+
+        return traced_generator
+
+    @wraps(function)
+    async def traced_coroutine(*args, **kwargs):
+        with client.trace_request():
+            return await function(*args, **kwargs)
 
-def error_response(message: str) -> Tuple[str, List[Dict], str]:
+    return traced_coroutine
+
+
+def stage_timer(stage: str):
+    """Time a stage of the pipeline in its latency histogram.
+
+    Args:
+        stage (str): Name of the stage.
+
+    Returns:
+        A context manager observing the duration of its block.
+    """
+    return metrics.timer("pipeline_stage_seconds", {"stage": stage})
+
+
+async def in_store(function: Callable, *args, **kwargs):
+    """Run an operation of the answer cache or cursor store, in a thread
+       when the store is a SQLite file so its disk writes and the locks of
+       other workers do not block the event loop.
+
+    Args:
+        function (Callable): The store operation.
+        *args: Positional arguments of the operation.
+        **kwargs: Keyword arguments of the operation.
+
+    Returns:
+        The result of the operation.
+    """
+    if cache_backend == "sqlite":
+        return await asyncio.to_thread(function, *args, **kwargs)
+    return function(*args, **kwargs)
+
+
+async def lookup_answer(user_query: str, data_version: int):
+    """Look up the cached answer of a question, counting hits and misses.
+
+    Args:
+        user_query (str): User query to look up.
+        data_version (int): Current version of the database.
+
+    Returns:
+        The cached answer, or None if there is none.
+    """
+    if not answer_cache:
+        return None
+    with stage_timer("cache_lookup"):
+        cached = await in_store(answer_cache.get, user_query, data_version)
+    metrics.increment(
+        "answer_cache_requests_total",
+        labels={"result": "miss" if cached is None else "hit"},
+    )
+    return cached
+
+
+async def match_question(
+    database_file_path: str, user_query: str
+) -> Union[TemplateMatch, None]:
+    """Find the template query answering the user query without the LLM,
+       counting matches and misses.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query to match.
+
+    Returns:
+        Union[TemplateMatch, None]: The matched query, or None if the
+                                    question needs the LLM.
+    """
+    if not PipelineConfig.query_templates:
+        return None
+    with stage_timer("template"):
+        matched = await acall(
+            match_template, database_file_path, user_query
+        )
+    metrics.increment(
+        "template_requests_total",
+        labels={"result": "miss" if matched is None else "hit"},
+    )
+    if matched is not None:
+        logger.info(
+            "Template %s: %s %s", matched.name, matched.sql, matched.params
+        )
+    return matched
+
+
+def error_response(message: str) -> Tuple[str, None, None]:
     """Helper to generate an error response message.
 
     Args:
         message (str): Error message to display.
 
     Returns:
-        Tuple[str, List[Dict], str]: Error message and empty data.
+        Tuple[str, None, None]: Error message, no data and no page info.
     """
-    return message, []
+    return message, None, None
 
 
-async def process_query(
-    database_file_path: str, user_query: str
-) -> Tuple[str, List[Dict]]:
-    """Process the user query and return the response.
+def clamp_page_size(page_size: Union[int, None]) -> int:
+    """Restrict a requested page size to the configured bounds.
+
+    Args:
+        page_size (Union[int, None]): Requested page size.
+
+    Returns:
+        int: Page size between 1 and the maximum page size.
+    """
+    if not page_size:
+        return PipelineConfig.page_size
+    return min(max(1, page_size), PipelineConfig.max_page_size)
+
+
+def _repairable_error(error: Union[str, None]) -> str:
+    """Keep an execution error only if SQLite rejected the statement.
+
+    Args:
+        error (Union[str, None]): The execution error message.
+
+    Returns:
+        str: The error, or an empty string if a repair cannot help.
+    """
+    if error and error.startswith(SQL_ERROR_PREFIX):
+        return error
+    return ""
+
+
+def _validation_error(validated_result: Dict) -> str:
+    """Describe the errors of a local validation for a repair.
+
+    Args:
+        validated_result (Dict): Result of validate_query.
+
+    Returns:
+        str: The error messages, or an empty string if a repair cannot
+             help, such as for statements which are not read-only.
+    """
+    errors = validated_result.get("errors") or []
+    if errors and all(e["code"] in REPAIRABLE_CODES for e in errors):
+        return " ".join(e["message"] for e in errors)
+    return ""
+
+
+async def _check_valid(
+    database_file_path: str, query: str
+) -> Tuple[Union[str, None], None]:
+    """Validate a repaired query against the database schema.
 
     Args:
         database_file_path (str): Path to the database file.
-        user_query (str): User query to process.
+        query (str): The repaired SQL query.
+
+    Returns:
+        Tuple[Union[str, None], None]: None if the query is valid, else
+            its repairable error, and no outcome.
+    """
+    validated_result = await acall(
+        validate_query, db_name=database_file_path, query=query
+    )
+    if validated_result.get("is_valid"):
+        return None, None
+    return _validation_error(validated_result), None
+
+
+async def _check_execution(
+    database_file_path: str,
+    execute: Callable[[str], Awaitable[Tuple]],
+    query: str,
+) -> Tuple[Union[str, None], Union[Tuple, None]]:
+    """Validate and execute a repaired query.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        execute (Callable[[str], Awaitable[Tuple]]): Executes a query,
+            returning the result data and the error first.
+        query (str): The repaired SQL query.
 
     Returns:
-        Tuple[str, List[Dict], str]: Response message and result data
+        Tuple[Union[str, None], Union[Tuple, None]]: None and the outcome
+            of execute if the query returned rows, else its repairable
+            error and no outcome.
     """
-    logger.info(f"User Query: {user_query}")
+    error, _ = await _check_valid(database_file_path, query)
+    if error is not None:
+        return error, None
+    outcome = await execute(query)
+    if outcome[0] is None:
+        return _repairable_error(outcome[1]), None
+    return None, outcome
+
+
+async def repair_query(
+    database_file_path: str,
+    user_query: str,
+    query: str,
+    error: str,
+    check: Callable[[str], Awaitable[Tuple]],
+) -> Tuple[Union[str, None], object]:
+    """Send a failing query and its error back to the LLM until it passes.
+
+    Repairs stop after the configured number of attempts, once the time
+    or token budget is spent or when the error cannot be repaired.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query the SQL query answers.
+        query (str): The failing SQL query.
+        error (str): The error of the query.
+        check (Callable[[str], Awaitable[Tuple]]): Checks a repaired query,
+            returning its error (None on success, empty if it cannot be
+            repaired) and its outcome, such as the result data.
+
+    Returns:
+        Tuple[Union[str, None], object]: The repaired query and the outcome
+            of its check, or None and None if no repair succeeded.
+    """
+    deadline = time.monotonic() + PipelineConfig.repair_time_budget
+    tokens, attempted = 0, False
+    for _ in range(PipelineConfig.repair_attempts):
+        schema = await acall(query_schema, database_file_path, query)
+        # The response is expected to be about as long as the query.
+        cost = estimate_tokens(user_query + query + error + schema)
+        cost += estimate_tokens(query)
+        remaining = deadline - time.monotonic()
+        over_budget = tokens + cost > PipelineConfig.repair_token_budget
+        if remaining <= 0 or over_budget:
+            break
+        tokens += cost
+
+        attempted = True
+        metrics.increment("sql_repair_attempts")
+        try:
+            with stage_timer("repair"):
+                response = await asyncio.wait_for(
+                    repair_sql_query(
+                        client, user_query, query, error, schema
+                    ),
+                    timeout=remaining,
+                )
+        except asyncio.TimeoutError:
+            break
+        logger.info("Repaired Query: %s", response)
+        if not response.get("result"):
+            break
+
+        query = format_sql(response.get("result"))
+        error, outcome = await check(query)
+        if error is None:
+            metrics.increment("sql_repair_successes")
+            return query, outcome
+        if not error:
+            break
+
+    if attempted:
+        metrics.increment("sql_repair_failures")
+    return None, None
+
+
+async def prepare_candidate(
+    database_file_path: str, user_query: str, **kwargs
+) -> Tuple[Union[str, None], Union[str, None]]:
+    """Generate and validate one SQL query answering the user query.
 
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query to process.
+        **kwargs: Additional arguments for the generation request.
+
+    Returns:
+        Tuple[Union[str, None], Union[str, None]]: The SQL query and the
+            message to show the user. The message is None for a valid
+            query, the query is None if none was generated.
+    """
     # Generate SQL query from the user input.
-    sql_query_response = await generate_sql_query(client, user_query)
-    logger.info(f"SQL Query: {sql_query_response}")
+    with stage_timer("generate"):
+        if PipelineConfig.fused_generation:
+            sql_query_response = await generate_sql_json(
+                client, user_query, **kwargs
+            )
+        else:
+            sql_query_response = await generate_sql_query(
+                client, user_query, **kwargs
+            )
+    logger.info("SQL Query: %s", sql_query_response)
 
     # Check for generation errors.
     if not sql_query_response.get("status"):
-        return error_response(
-            "Sorry, I am facing some problems accessing the data.\
-            Please try again!"
-        )
+        return None, GENERATION_ERROR_MESSAGE
     if not sql_query_response.get("result"):
-        return error_response(
-            "Sorry, I can only answer questions related to flights data."
-        )
+        return None, OUT_OF_SCOPE_MESSAGE
 
-    # Validate the generated SQL query.
-    validation_response = await validate_sql_query(client, sql_query_response)
-    logger.info(f"Validated Query: {validation_response}")
+    # Format the SQL query before validation and execution.
+    formatted_query = format_sql(sql_query_response.get("result"))
+    logger.info("Formatted Query: %s", formatted_query)
 
-    validated_result = format_json(validation_response.get("result"))
-    logger.info(f"Formatted Validated Query: {validated_result}")
+    # Validate the generated SQL query.
+    with stage_timer("validate"):
+        # A fused response already judged the scope of the question.
+        if (
+            PipelineConfig.validator == "local"
+            or PipelineConfig.fused_generation
+        ):
+            validated_result = await acall(
+                validate_query,
+                db_name=database_file_path,
+                query=formatted_query,
+            )
+        else:
+            validation_response = await validate_sql_query(
+                client, formatted_query
+            )
+            logger.info("Validated Query: %s", validation_response)
+            validated_result = format_json(
+                validation_response.get("result")
+            )
+    logger.info("Formatted Validated Query: %s", validated_result)
 
     if not validated_result.get("is_valid"):
-        return error_response(
-            "Sorry, I can only answer questions related to flights data."
+        error = _validation_error(validated_result)
+        if error:
+            repaired, _ = await repair_query(
+                database_file_path,
+                user_query,
+                formatted_query,
+                error,
+                partial(_check_valid, database_file_path),
+            )
+            if repaired is not None:
+                return repaired, None
+        return formatted_query, OUT_OF_SCOPE_MESSAGE
+    return formatted_query, None
+
+
+def _candidate_rank(candidate: Tuple) -> int:
+    """Order the outcomes of candidates from most to least useful.
+
+    Args:
+        candidate (Tuple): The SQL query, the message and whether the
+                           query returned rows.
+
+    Returns:
+        int: 0 for rows, 1 for a valid query, 2 for an invalid query,
+             3 for an out of scope question and 4 for an error.
+    """
+    sql, message, has_rows = candidate
+    if has_rows:
+        return 0
+    if message is None:
+        return 1
+    if sql is not None:
+        return 2
+    return 3 if message == OUT_OF_SCOPE_MESSAGE else 4
+
+
+async def speculate_sql(
+    database_file_path: str, user_query: str, n_candidates: int, **kwargs
+) -> Tuple[Union[str, None], Union[str, None]]:
+    """Generate several SQL queries concurrently, first valid one wins.
+
+    Every candidate is validated and dry-run for its first row as soon as
+    it is generated. The first candidate returning rows is used and the
+    pending ones are cancelled. Without such a candidate, the most useful
+    outcome of all candidates is returned.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query to process.
+        n_candidates (int): Number of concurrent candidates.
+        **kwargs: Additional arguments for the generation requests.
+
+    Returns:
+        Tuple[Union[str, None], Union[str, None]]: As prepare_candidate.
+    """
+    temperatures = PipelineConfig.candidate_temperatures
+
+    async def run_candidate(index: int) -> Tuple:
+        sql, message = await prepare_candidate(
+            database_file_path,
+            user_query,
+            temperature=temperatures[index % len(temperatures)],
+            **kwargs,
         )
+        if message is not None:
+            return sql, message, False
+        result, _ = await aexecute_query(
+            db_name=database_file_path,
+            query=sql,
+            timeout=PipelineConfig.dry_run_timeout,
+            limit=1,
+        )
+        return sql, message, bool(result)
 
-    # Format the SQL query before execution.
-    formatted_query = format_sql(sql_query_response.get("result"))
-    logger.info(f"Formatted Query: {formatted_query}")
+    tasks = [
+        asyncio.create_task(run_candidate(index))
+        for index in range(n_candidates)
+    ]
+    candidates = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                candidate = await next_done
+            except Exception as e:
+                logger.error("SQL candidate failed: %s", e)
+                candidate = (None, GENERATION_ERROR_MESSAGE, False)
+            if candidate[2]:
+                return candidate[:2]
+            candidates.append(candidate)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return min(candidates, key=_candidate_rank)[:2]
+
+
+async def prepare_sql(
+    database_file_path: str, user_query: str, data_version: int = 0
+) -> Tuple[Union[str, None], Union[str, None]]:
+    """Generate and validate the SQL query answering the user query.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query to process.
+        data_version (int): Version of the database, stored with cached
+                            verdicts.
+
+    Returns:
+        Tuple[Union[str, None], Union[str, None]]: The SQL query ready for
+            execution, or None and the message to show the user.
+    """
+    # The first lookup after a data change samples every table.
+    with stage_timer("schema"):
+        if PipelineConfig.schema_pruning:
+            schema = await acall(
+                relevant_schema, database_file_path, user_query
+            )
+        else:
+            schema = await acall(database_schema, database_file_path)
+    logger.info("Schema: %s", schema)
+    examples = ""
+    if example_store is not None:
+        with stage_timer("examples"):
+            examples = format_examples(
+                example_store.search(user_query, PipelineConfig.few_shot_k)
+            )
+
+    if PipelineConfig.sql_candidates > 1:
+        sql, message = await speculate_sql(
+            database_file_path,
+            user_query,
+            PipelineConfig.sql_candidates,
+            schema=schema,
+            examples=examples,
+        )
+    else:
+        sql, message = await prepare_candidate(
+            database_file_path, user_query, schema=schema, examples=examples
+        )
 
-    # Execute the SQL query.
-    result, _ = execute_query(
-        db_name=database_file_path, query=formatted_query
+    if message is None:
+        return sql, None
+    if sql is not None and answer_cache:
+        # Remember invalid queries so the question is not generated again.
+        await in_store(
+            answer_cache.set,
+            user_query,
+            sql=sql,
+            is_valid=False,
+            answer=message,
+            data_version=data_version,
+        )
+    return None, message
+
+
+@metrics.timed("pipeline_request_seconds", {"endpoint": "process_query"})
+@traced
+async def process_query(
+    database_file_path: str,
+    user_query: str,
+    page: int = 1,
+    page_size: Union[int, None] = None,
+) -> Tuple[str, Union[ColumnarResult, None], Union[Dict, None]]:
+    """Process the user query and return the response.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query to process.
+        page (int): One-based page of the result to return.
+        page_size (Union[int, None]): Number of result rows per page.
+
+    Returns:
+        Tuple[str, Union[ColumnarResult, None], Union[Dict, None]]:
+            Response message, result data of the page and page info
+            including the cursor token used to fetch other pages.
+    """
+    logger.info("User Query: %s", user_query)
+    page_size = clamp_page_size(page_size)
+    data_version = get_pool(database_file_path).data_version()
+
+    # Answer common shapes of questions without the LLM.
+    matched = await match_question(database_file_path, user_query)
+    if matched is not None:
+        with stage_timer("execute"):
+            result, _, page_info = await aexecute_page(
+                db_name=database_file_path,
+                query=matched.sql,
+                params=matched.params,
+                page=page,
+                page_size=page_size,
+                count_cap=PipelineConfig.count_cap,
+            )
+        if not result:
+            return error_response(NO_RESULTS_MESSAGE)
+        if page > 1:
+            # The answer describes the first row of the whole result.
+            with stage_timer("execute"):
+                result_start, _ = await aexecute_query(
+                    db_name=database_file_path,
+                    query=matched.sql,
+                    params=matched.params,
+                    limit=1,
+                )
+            answer = matched.describe(result_start)
+        else:
+            answer = matched.describe(result)
+        page_info["cursor"] = await in_store(
+            cursor_store.create,
+            question=user_query,
+            sql=matched.sql,
+            params=matched.params,
+            message=answer,
+            data_version=data_version,
+            total=page_info["total"],
+            total_capped=page_info["total_capped"],
+            trace_id=client.trace_id,
+        )
+        return answer, result, page_info
+
+    # Serve repeated questions from the answer cache.
+    cached = await lookup_answer(user_query, data_version)
+    if cached is not None:
+        logger.info("Cache hit: %s", cached.question)
+        if not cached.is_valid:
+            return error_response(OUT_OF_SCOPE_MESSAGE)
+        with stage_timer("execute"):
+            result, _, page_info = await aexecute_page(
+                db_name=database_file_path,
+                query=cached.sql,
+                page=page,
+                page_size=page_size,
+                count_cap=PipelineConfig.count_cap,
+            )
+        if result:
+            page_info["cursor"] = await in_store(
+                cursor_store.create,
+                question=user_query,
+                sql=cached.sql,
+                message=cached.answer,
+                data_version=data_version,
+                total=page_info["total"],
+                total_capped=page_info["total_capped"],
+                trace_id=client.trace_id,
+            )
+            return cached.answer, result, page_info
+
+    formatted_query, message = await prepare_sql(
+        database_file_path, user_query, data_version
     )
-    logger.info(f"Result after executing query: {result}")
+    if formatted_query is None:
+        return error_response(message)
+
+    async def execute(query: str, page: int = page) -> Tuple:
+        with stage_timer("execute"):
+            return await aexecute_page(
+                db_name=database_file_path,
+                query=query,
+                page=page,
+                page_size=page_size,
+                count_cap=PipelineConfig.count_cap,
+            )
+
+    # Execute the SQL query, repairing it if SQLite rejects it.
+    result, error, page_info = await execute(formatted_query)
+    if _repairable_error(error):
+        repaired, outcome = await repair_query(
+            database_file_path,
+            user_query,
+            formatted_query,
+            error,
+            partial(_check_execution, database_file_path, execute),
+        )
+        if repaired is not None:
+            formatted_query = repaired
+            result, error, page_info = outcome
+    logger.info("Result after executing query: %s", result)
 
     # Generate a natural language response if results are found.
     if result:
-        natural_response = await generate_natural_response(
-            client, user_query, result
+        first_page = result
+        if page > 1:
+            # The answer is cached and kept for every page, so it
+            # describes the result from its first page.
+            first_page, _, _ = await execute(formatted_query, page=1)
+        with stage_timer("digest"):
+            digest = build_result_digest(
+                first_page or result, total_rows=page_info["total"]
+            )
+        with stage_timer("summarize"):
+            natural_response = await generate_natural_response(
+                client, user_query, digest
+            )
+        logger.info("Natural Response: %s", natural_response)
+        if answer_cache and natural_response.get("status"):
+            await in_store(
+                answer_cache.set,
+                user_query,
+                sql=formatted_query,
+                is_valid=True,
+                answer=natural_response.get("result"),
+                data_version=data_version,
+            )
+        await remember_example(user_query, formatted_query)
+        page_info["cursor"] = await in_store(
+            cursor_store.create,
+            question=user_query,
+            sql=formatted_query,
+            message=natural_response.get("result"),
+            data_version=data_version,
+            total=page_info["total"],
+            total_capped=page_info["total_capped"],
+            trace_id=client.trace_id,
         )
-        logger.info(f"Natural Response: {natural_response}")
-        return natural_response.get("result"), result
+        return natural_response.get("result"), result, page_info
 
     # Fallback if no results were returned.
-    return error_response(
-        "Sorry, I could not find the answer to your questions.\
-        Try again with better explanations!"
+    return error_response(NO_RESULTS_MESSAGE)
+
+
+async def get_cursor_state(
+    database_file_path: str, cursor: str
+) -> Union[Dict, None]:
+    """Look up a cursor, treating cursors of older data as expired.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        cursor (str): Cursor token returned with the first page.
+
+    Returns:
+        Union[Dict, None]: The cursor state, or None if it expired.
+    """
+    state = await in_store(cursor_store.get, cursor)
+    data_version = get_pool(database_file_path).data_version()
+    if state is None or state.get("data_version", 0) != data_version:
+        return None
+    return state
+
+
+@metrics.timed("pipeline_request_seconds", {"endpoint": "fetch_page"})
+async def fetch_page(
+    database_file_path: str,
+    cursor: str,
+    page: int,
+    page_size: Union[int, None] = None,
+) -> Tuple[str, Union[ColumnarResult, None], Union[Dict, None]]:
+    """Fetch another page of an earlier result without calling the LLM.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        cursor (str): Cursor token returned with the first page.
+        page (int): One-based page of the result to return.
+        page_size (Union[int, None]): Number of result rows per page.
+
+    Returns:
+        Tuple[str, Union[ColumnarResult, None], Union[Dict, None]]:
+            Response message, result data of the page and page info.
+    """
+    state = await get_cursor_state(database_file_path, cursor)
+    if state is None:
+        return error_response(EXPIRED_CURSOR_MESSAGE)
+
+    result, _, page_info = await aexecute_page(
+        db_name=database_file_path,
+        query=state["sql"],
+        params=state.get("params", ()),
+        page=page,
+        page_size=clamp_page_size(page_size),
+        count_cap=PipelineConfig.count_cap,
+        total=state.get("total"),
+        total_capped=state.get("total_capped", False),
+    )
+    if not result:
+        return error_response(NO_RESULTS_MESSAGE)
+    page_info["cursor"] = cursor
+    return state["message"], result, page_info
+
+
+async def export_result(
+    database_file_path: str, cursor: str
+) -> Union[ColumnarResult, None]:
+    """Fetch an earlier result for export, up to the configured row cap.
+
+    Args:
+        database_file_path (str): Path to the database file.
+        cursor (str): Cursor token returned with the first page.
+
+    Returns:
+        Union[ColumnarResult, None]: The result data, or None if the
+                                     cursor expired or nothing was found.
+    """
+    state = await get_cursor_state(database_file_path, cursor)
+    if state is None:
+        return None
+    result, _ = await aexecute_query(
+        db_name=database_file_path,
+        query=state["sql"],
+        params=state.get("params", ()),
+        limit=PipelineConfig.max_rows,
     )
+    return result
+
+
+def _row_batches(result: ColumnarResult) -> Iterator[Dict]:
+    """Split result rows into stream events of the configured batch size.
+
+    Args:
+        result (ColumnarResult): Result data.
+
+    Yields:
+        Dict: Events with the rows of each batch.
+    """
+    batch_size = PipelineConfig.stream_batch_size
+    for start in range(0, len(result), batch_size):
+        batch = result[start:start + batch_size]
+        yield {"event": "rows", "data": batch.to_dict()}
+
+
+@metrics.timed("pipeline_request_seconds", {"endpoint": "stream_query"})
+@traced
+async def stream_query(
+    database_file_path: str, user_query: str
+) -> AsyncIterator[Dict]:
+    """Process the user query, yielding each stage as it completes.
+
+    Events have the keys event and data. The event is one of "sql",
+    "rows" (a batch of result rows), "summary" (a token of the natural
+    language response), "error" and finally "done".
+
+    Args:
+        database_file_path (str): Path to the database file.
+        user_query (str): User query to process.
+
+    Yields:
+        Dict: The events of the response.
+    """
+    logger.info("User Query: %s", user_query)
+    data_version = get_pool(database_file_path).data_version()
+
+    matched = await match_question(database_file_path, user_query)
+    if matched is not None:
+        yield {"event": "sql", "data": matched.sql}
+        with stage_timer("execute"):
+            result, _ = await aexecute_query(
+                db_name=database_file_path,
+                query=matched.sql,
+                params=matched.params,
+                limit=PipelineConfig.max_rows,
+            )
+        if not result:
+            yield {"event": "error", "data": NO_RESULTS_MESSAGE}
+        else:
+            for batch in _row_batches(result):
+                yield batch
+            yield {"event": "summary", "data": matched.describe(result)}
+        yield {"event": "done", "data": None}
+        return
+
+    cached = await lookup_answer(user_query, data_version)
+    if cached is not None and not cached.is_valid:
+        yield {"event": "error", "data": OUT_OF_SCOPE_MESSAGE}
+        yield {"event": "done", "data": None}
+        return
+
+    if cached is not None:
+        logger.info("Cache hit: %s", cached.question)
+        formatted_query = cached.sql
+    else:
+        formatted_query, message = await prepare_sql(
+            database_file_path, user_query, data_version
+        )
+        if formatted_query is None:
+            yield {"event": "error", "data": message}
+            yield {"event": "done", "data": None}
+            return
+    yield {"event": "sql", "data": formatted_query}
+
+    async def execute(query: str) -> Tuple:
+        with stage_timer("execute"):
+            return await aexecute_query(
+                db_name=database_file_path,
+                query=query,
+                limit=PipelineConfig.max_rows,
+            )
+
+    result, error = await execute(formatted_query)
+    if _repairable_error(error):
+        repaired, outcome = await repair_query(
+            database_file_path,
+            user_query,
+            formatted_query,
+            error,
+            partial(_check_execution, database_file_path, execute),
+        )
+        if repaired is not None:
+            formatted_query = repaired
+            result, error = outcome
+            yield {"event": "sql", "data": formatted_query}
+    logger.info("Result after executing query: %s", result)
+    if not result:
+        yield {"event": "error", "data": NO_RESULTS_MESSAGE}
+        yield {"event": "done", "data": None}
+        return
+    for batch in _row_batches(result):
+        yield batch
+
+    if cached is not None:
+        yield {"event": "summary", "data": cached.answer}
+    else:
+        tokens = []
+        with stage_timer("digest"):
+            digest = build_result_digest(result)
+        async for token in stream_natural_response(
+            client, user_query, digest
+        ):
+            tokens.append(token)
+            yield {"event": "summary", "data": token}
+        natural_response = "".join(tokens)
+        logger.info("Natural Response: %s", natural_response)
+        await remember_example(user_query, formatted_query)
+        if answer_cache and natural_response:
+            await in_store(
+                answer_cache.set,
+                user_query,
+                sql=formatted_query,
+                is_valid=True,
+                answer=natural_response,
+                data_version=data_version,
+            )
+    yield {"event": "done", "data": None}
+
 
+async def score_feedback(
+    rating: int,
+    score_name: str,
+    comment: str,
+    cursor: Union[str, None] = None,
+    trace_id: Union[str, None] = None,
+):
+    """Score the trace of the rated answer based on user feedback.
 
-async def score_feedback(rating: int, score_name: str, comment: str):
-    """Score the generation based on user feedback.
+    A good rating verifies the SQL query of the rated result as an example
+    for similar questions, a poor rating removes it from the examples.
 
     Args:
         rating (int): Rating value.
         score_name (str): Name of the score.
         comment (str): User comment.
+        cursor (Union[str, None]): Cursor token of the rated result.
+        trace_id (Union[str, None]): ID of the trace of the rated answer,
+                                     else the trace of the cursor.
     """
+    state = await in_store(cursor_store.get, cursor) if cursor else None
+    if trace_id is None and state:
+        trace_id = state.get("trace_id")
     client.score_generation(
-        score_value=rating, score_name=score_name, comment=comment
+        score_value=rating,
+        score_name=score_name,
+        comment=comment,
+        trace_id=trace_id,
     )
+    # Template queries have parameters, they are no examples for the LLM.
+    if (
+        example_store is not None
+        and state
+        and state.get("question")
+        and not state.get("params")
+    ):
+        if rating >= PipelineConfig.few_shot_min_rating:
+            await asyncio.to_thread(
+                example_store.add, state["question"], state["sql"], True
+            )
+        elif rating < PipelineConfig.few_shot_min_rating - 1:
+            await asyncio.to_thread(example_store.remove, state["question"])
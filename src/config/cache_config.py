@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from typing import Union
+
+
+@dataclass
+class CacheConfig:
+    """
+    A configuration class for the answer cache.
+
+    Attributes:
+        enable (bool): A flag to enable or disable the answer cache.
+        backend (str): The storage backend, either "memory" or "sqlite".
+        file_name (str): The file name of the SQLite backend, relative to
+                         the sqlite_db directory.
+        ttl_seconds (float): Number of seconds an entry stays fresh.
+        max_entries (int): Maximum number of entries before the least
+                           recently used ones are evicted.
+        similarity_threshold (Union[float, None]): Minimum token similarity
+                           for a near-duplicate match, or None to only
+                           serve exact matches of the normalized question.
+                           Near-duplicates have the same words apart from
+                           stop words and are never served rejections.
+        cursor_ttl_seconds (float): Number of seconds the cursor of a
+                                    paginated result stays valid.
+    """
+
+    enable: bool = True
+    backend: str = "memory"
+    file_name: str = "answer_cache.db"
+    ttl_seconds: float = 3600.0
+    max_entries: int = 1024
+    similarity_threshold: Union[float, None] = None
+    cursor_ttl_seconds: float = 3600.0
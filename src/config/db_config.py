@@ -0,0 +1,39 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class DBConfig:
+    """
+    A configuration class for the flights database connections.
+
+    Attributes:
+        cache_size_kib (int): Page cache size of every connection in KiB.
+        mmap_size (int): Maximum number of bytes of the database file
+                         mapped into memory per connection.
+        health_check_interval (float): Seconds after which a connection is
+                                       pinged again before being reused.
+        enable_wal (bool): A flag to switch the database file to WAL mode
+                           when the pool is created, so that readers are
+                           never blocked by a writer.
+        max_workers (int): Number of worker threads executing queries off
+                           the event loop.
+        query_timeout (float): Seconds after which a running query is
+                               interrupted.
+        progress_steps (int): Number of SQLite virtual machine steps
+                              between checks for timeouts and cancellation.
+        catalog_sample_rows (int): Number of rows spread over every table
+                                   read to find sample values for the
+                                   schema catalog.
+        catalog_sample_values (int): Number of sample values described per
+                                     text column.
+    """
+
+    cache_size_kib: int = 65536
+    mmap_size: int = 268435456
+    health_check_interval: float = 30.0
+    enable_wal: bool = True
+    max_workers: int = 4
+    query_timeout: float = 30.0
+    progress_steps: int = 1000
+    catalog_sample_rows: int = 10000
+    catalog_sample_values: int = 3
@@ -1,5 +1,5 @@
-from uuid6 import uuid7
 from dataclasses import dataclass
+from typing import Union
 
 
 @dataclass
@@ -12,13 +12,16 @@ class LLMConfig:
         which controls the randomness of the output.
         langfuse_enable (bool): A flag to enable or disable LangFuse
                                 integration.
-        trace_id (str): A unique identifier for tracing purposes
+        trace_id (Union[str, None]): Identifier of the trace of calls made
+                                     outside of a request, generated if
+                                     None. Each request gets a trace of
+                                     its own.
         trace_name (str): The name assigned to the trace.
         track_model_name (str): The name of the model being tracked.
     """
 
     temperature: float = 0.0
     langfuse_enable: bool = True
-    trace_id: str = str(uuid7())
+    trace_id: Union[str, None] = None
     trace_name: str = "Air Q&A"
     track_model_name: str = "gpt-4o"
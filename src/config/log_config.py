@@ -0,0 +1,15 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class LogConfig:
+    """
+    A configuration class for the application logs.
+
+    Attributes:
+        max_message_chars (int): Longest logged message, longer messages
+                                 such as large schemas or results are
+                                 truncated.
+    """
+
+    max_message_chars: int = 2000
@@ -0,0 +1,61 @@
+import copy
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+
+def _handler_by_name(name: str) -> logging.Handler:
+    """Find a handler created by the logging configuration.
+
+    Args:
+        name (str): The handler name, a key of the handlers section.
+
+    Returns:
+        logging.Handler: The handler.
+    """
+    get_handler = getattr(logging, "getHandlerByName", None)
+    # Python < 3.12 only keeps the named handlers in a private registry.
+    handler = (
+        get_handler(name) if get_handler else logging._handlers.get(name)
+    )
+    if handler is None:
+        raise ValueError(f"Unknown log handler: {name}")
+    return handler
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    A handler putting records on a queue, from which a background thread
+    passes them to the named handlers.
+
+    Records are queued unformatted, so that their message is only built
+    and written to files or the console off the calling thread. The
+    named handlers must be listed before this one in the configuration.
+    """
+
+    def __init__(self, *handler_names: str) -> None:
+        """
+        Initialize the QueueListenerHandler instance and start its thread.
+
+        Args:
+            *handler_names (str): Names of the handlers writing records.
+        """
+        super().__init__(SimpleQueue())
+        self.handlers = tuple(_handler_by_name(name) for name in handler_names)
+        self.listener = QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+        self._listening = True
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Skip the formatting of QueueHandler, the handlers format
+        # records on the listener thread.
+        return copy.copy(record)
+
+    def close(self):
+        """Write the queued records, then stop the listener thread."""
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+        super().close()
@@ -1,6 +1,24 @@
+import json
 import os
 import logging
 
+from .log_config import LogConfig
+
+
+def truncate_message(message: str, limit: int) -> str:
+    """Cut a message down to a number of characters, noting the cut.
+
+    Args:
+        message (str): The log message.
+        limit (int): Maximum number of characters kept.
+
+    Returns:
+        str: The message, truncated if longer than the limit.
+    """
+    if len(message) <= limit:
+        return message
+    return f"{message[:limit]}... [{len(message) - limit} chars truncated]"
+
 
 class RelativePathFormatter(logging.Formatter):
     """
@@ -13,6 +31,8 @@ class RelativePathFormatter(logging.Formatter):
     If an error occurs during this conversion,
     the original absolute path is retained.
 
+    Messages longer than LogConfig.max_message_chars are truncated.
+
     Methods:
         format(record):
             Formats the specified log record as text.
@@ -20,11 +40,47 @@ class RelativePathFormatter(logging.Formatter):
             path if possible.
     """
 
-    def format(self, record):
+    def relative_path(self, record):
         try:
             cwd = os.getcwd()
             record.pathname = os.path.relpath(record.pathname, cwd)
         except Exception:
             # If any error occurs, fallback to the original pathname.
             pass
+
+    def format(self, record):
+        self.relative_path(record)
         return super().format(record)
+
+    def formatMessage(self, record):
+        record.message = truncate_message(
+            record.message, LogConfig.max_message_chars
+        )
+        return super().formatMessage(record)
+
+
+class JsonFormatter(RelativePathFormatter):
+    """
+    A logging formatter writing each record as a JSON object on one line,
+    with the keys time, level, logger, path, line, function and message,
+    and exception or stack when the record carries them.
+    """
+
+    def format(self, record):
+        self.relative_path(record)
+        fields = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "path": record.pathname,
+            "line": record.lineno,
+            "function": record.funcName,
+            "message": truncate_message(
+                record.getMessage(), LogConfig.max_message_chars
+            ),
+        }
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            fields["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(fields, default=str)
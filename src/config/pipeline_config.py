@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass
+class PipelineConfig:
+    """
+    A configuration class for the natural language to SQL pipeline.
+
+    Attributes:
+        validator (str): How generated SQL is validated, either "local" to
+                         check it against the database schema or "llm" to
+                         ask the language model.
+        query_templates (bool): A flag to answer common shapes of questions,
+                                such as the average delay of an airline in
+                                a month, with parameterized SQL queries and
+                                answers, without the LLM.
+        fused_generation (bool): A flag to generate the SQL query and judge
+                                 the scope of the question in one JSON
+                                 response. The query is then validated
+                                 locally, without a second LLM call.
+        stream_batch_size (int): Number of result rows per event of a
+                                 streamed response.
+        digest_token_budget (int): Maximum estimated tokens of the result
+                                   passed to the natural response prompt.
+        digest_top_k (int): Number of leading rows kept in a digest.
+        digest_sample_size (int): Number of sampled rows kept in a digest.
+        page_size (int): Default number of result rows per page.
+        max_page_size (int): Largest page size a client may request.
+        max_rows (int): Maximum number of rows of a streamed result.
+        count_cap (int): Maximum number of rows counted for the total
+                         row hint of a paginated result.
+        sql_candidates (int): Number of SQL queries generated concurrently
+                              for a question. The first one that validates
+                              and returns rows is used, the others are
+                              cancelled. A single candidate if 1.
+        candidate_temperatures (Tuple[float, ...]): Sampling temperatures
+                              cycled through by the candidates.
+        dry_run_timeout (float): Seconds a candidate may run to fetch its
+                                 first row.
+        repair_attempts (int): Maximum number of times a failing SQL query
+                               is sent back to the LLM with its error.
+                               No repair if 0.
+        repair_time_budget (float): Seconds all repairs of a question may
+                                    take in total.
+        repair_token_budget (int): Maximum estimated tokens of all repair
+                                   prompts and responses of a question.
+        schema_pruning (bool): A flag to describe only the tables and
+                               columns relevant to the question in the SQL
+                               generation prompt instead of the full schema.
+        few_shot_k (int): Number of stored examples of similar questions
+                          added to the SQL generation prompt. No examples
+                          if 0.
+        few_shot_from_runs (bool): A flag to store the SQL of every answered
+                                   question as an unverified example.
+        few_shot_min_rating (int): Lowest feedback rating verifying an
+                                   example. Ratings at least two below it
+                                   remove the example.
+        max_examples (int): Maximum number of stored examples. The oldest
+                            unverified examples are removed beyond it.
+        examples_file_name (str): Name of the example store database file.
+    """
+
+    validator: str = "local"
+    query_templates: bool = True
+    fused_generation: bool = False
+    stream_batch_size: int = 500
+    digest_token_budget: int = 2000
+    digest_top_k: int = 10
+    digest_sample_size: int = 20
+    page_size: int = 100
+    max_page_size: int = 1000
+    max_rows: int = 10000
+    count_cap: int = 100000
+    sql_candidates: int = 1
+    candidate_temperatures: Tuple[float, ...] = (0.0, 0.4, 0.8)
+    dry_run_timeout: float = 5.0
+    repair_attempts: int = 2
+    repair_time_budget: float = 10.0
+    repair_token_budget: int = 4000
+    schema_pruning: bool = True
+    few_shot_k: int = 3
+    few_shot_from_runs: bool = True
+    few_shot_min_rating: int = 4
+    max_examples: int = 5000
+    examples_file_name: str = "sql_examples.db"
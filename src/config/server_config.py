@@ -0,0 +1,21 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass
+class ServerConfig:
+    """
+    A configuration class for serving the web application.
+
+    Attributes:
+        workers (int): Number of worker processes, from the WORKERS
+                       environment variable. Workers share the answer
+                       cache, the result cursors, the few-shot examples
+                       and the metrics through SQLite files.
+        metrics_publish_interval (float): Seconds between two writes of
+                                          the metrics of a worker to the
+                                          shared metrics table.
+    """
+
+    workers: int = int(os.getenv("WORKERS", "1"))
+    metrics_publish_interval: float = 5.0
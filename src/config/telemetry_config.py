@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class TelemetryConfig:
+    """
+    A configuration class for the export of LLM traces.
+
+    Attributes:
+        max_queue_size (int): Maximum number of events waiting for export.
+                              Events arriving while the queue is full are
+                              dropped.
+        batch_size (int): Maximum number of events exported at once.
+        flush_interval (float): Seconds the exporter waits for more events
+                                before exporting a partial batch.
+        sample_rate (float): Share of the traces exported, between 0 and 1.
+                             A trace is either exported with all of its
+                             events or not at all.
+        shutdown_timeout (float): Seconds to wait for the queued events to
+                                  be exported when the app stops.
+    """
+
+    max_queue_size: int = 10000
+    batch_size: int = 100
+    flush_interval: float = 1.0
+    sample_rate: float = 1.0
+    shutdown_timeout: float = 5.0
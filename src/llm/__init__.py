@@ -1,9 +1,13 @@
+from . import backends
 from . import llm_client
 from . import prompts
 from . import generator
+from . import telemetry
 
 __all__ = [
+    "backends",
     "llm_client",
     "prompts",
     "generator",
+    "telemetry",
 ]
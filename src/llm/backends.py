@@ -0,0 +1,397 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Union
+from openai import AsyncAzureOpenAI, AzureOpenAI, AsyncOpenAI, OpenAI
+
+# Constants for environment variable keys
+API_TYPE = "API_TYPE"
+API_KEY_ENV = "API_KEY"
+API_BASE_ENV = "API_BASE_URL"
+MODEL_ENV = "MODEL_NAME"
+REPLAY_FILE_ENV = "REPLAY_FILE"
+REPLAY_LATENCY_ENV = "REPLAY_LATENCY"
+REPLAY_DEFAULT_ENV = "REPLAY_DEFAULT"
+RECORD_FILE_ENV = "RECORD_FILE"
+
+# Pieces of a replayed response streamed one at a time.
+STREAM_CHUNK_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass
+class LLMResponse:
+    """
+    A completion of chat messages.
+
+    Attributes:
+        content (str): The generated text.
+        prompt_tokens (int): Tokens of the messages, 0 if unknown.
+        completion_tokens (int): Tokens of the generated text, 0 if unknown.
+    """
+
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+def prompt_key(messages: List[Dict], **params) -> str:
+    """Identify a prompt by the hash of its messages and response format.
+
+    Sampling parameters such as the temperature are left out, so that a
+    recording serves every candidate generated for the same prompt.
+
+    Args:
+        messages (List[Dict]): Messages sent to the model.
+        **params: Parameters of the request.
+
+    Returns:
+        str: The SHA-256 hex digest of the prompt.
+    """
+    payload = json.dumps(
+        {
+            "messages": messages,
+            "response_format": params.get("response_format"),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Latency:
+    """
+    A distribution of response latencies in seconds.
+    """
+
+    DISTRIBUTIONS = ("fixed", "normal", "lognormal", "exponential")
+
+    def __init__(
+        self,
+        distribution: str = "fixed",
+        mean: float = 0.0,
+        stddev: float = 0.0,
+        seed: Union[int, None] = None,
+    ) -> None:
+        """
+        Initialize the Latency instance.
+
+        Args:
+            distribution (str): One of "fixed", "normal", "lognormal" or
+                                "exponential".
+            mean (float): Mean latency in seconds.
+            stddev (float): Standard deviation of the latency in seconds,
+                            ignored by the fixed and exponential
+                            distributions.
+            seed (Union[int, None]): Seed of the random generator.
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean = mean
+        self.stddev = stddev
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "Latency":
+        """
+        Parse a latency written as "distribution:mean[:stddev[:seed]]",
+        e.g. "lognormal:0.8:0.3".
+
+        Args:
+            spec (str): The latency specification.
+
+        Returns:
+            Latency: The latency distribution.
+        """
+        distribution, *values = spec.split(":")
+        mean = float(values[0]) if len(values) > 0 else 0.0
+        stddev = float(values[1]) if len(values) > 1 else 0.0
+        seed = int(values[2]) if len(values) > 2 else None
+        return cls(distribution, mean, stddev, seed)
+
+    def sample(self) -> float:
+        """
+        Draw a latency.
+
+        Returns:
+            float: A non-negative number of seconds.
+        """
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "normal":
+            return max(0.0, self._random.gauss(self.mean, self.stddev))
+        if self.distribution == "lognormal":
+            # Parameters of the underlying normal for the requested moments.
+            sigma = math.sqrt(math.log(1 + (self.stddev / self.mean) ** 2))
+            mu = math.log(self.mean) - sigma**2 / 2
+            return self._random.lognormvariate(mu, sigma)
+        if self.distribution == "exponential":
+            return self._random.expovariate(1 / self.mean)
+        return self.mean
+
+    def __repr__(self) -> str:
+        return (
+            f"Latency(distribution={self.distribution!r}, "
+            f"mean={self.mean}, stddev={self.stddev})"
+        )
+
+
+class LLMBackend:
+    """
+    Base class for the services completing chat messages.
+    """
+
+    async def acomplete(self, messages: List[Dict], **params) -> LLMResponse:
+        raise NotImplementedError
+
+    def complete(self, messages: List[Dict], **params) -> LLMResponse:
+        raise NotImplementedError
+
+    async def astream(
+        self, messages: List[Dict], **params
+    ) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    A backend calling the OpenAI or Azure OpenAI chat completions API.
+    """
+
+    def __init__(
+        self,
+        azure: bool = False,
+        api_key: Union[str, None] = None,
+        base_url: Union[str, None] = None,
+        model: Union[str, None] = None,
+    ) -> None:
+        """
+        Initialize the OpenAIBackend instance.
+
+        Args:
+            azure (bool): Whether to call the Azure OpenAI API.
+            api_key (Union[str, None]): API key, from the environment if
+                                        None.
+            base_url (Union[str, None]): API base URL, from the environment
+                                         if None.
+            model (Union[str, None]): Model name, from the environment if
+                                      None.
+        """
+        api_key = api_key or os.getenv(API_KEY_ENV)
+        base_url = base_url or os.getenv(API_BASE_ENV)
+        self.model = model or os.getenv(MODEL_ENV)
+        if azure:
+            self.async_client = AsyncAzureOpenAI(
+                api_key=api_key, azure_endpoint=base_url
+            )
+            self.client = AzureOpenAI(api_key=api_key, azure_endpoint=base_url)
+        else:
+            self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+            self.client = OpenAI(api_key=api_key, base_url=base_url)
+
+    @staticmethod
+    def _response(response) -> LLMResponse:
+        usage = response.usage
+        return LLMResponse(
+            response.choices[0].message.content,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+    async def acomplete(self, messages: List[Dict], **params) -> LLMResponse:
+        response = await self.async_client.chat.completions.create(
+            messages=messages, model=self.model, **params
+        )
+        return self._response(response)
+
+    def complete(self, messages: List[Dict], **params) -> LLMResponse:
+        response = self.client.chat.completions.create(
+            messages=messages, model=self.model, **params
+        )
+        return self._response(response)
+
+    async def astream(
+        self, messages: List[Dict], **params
+    ) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            messages=messages, model=self.model, stream=True, **params
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
+
+class ReplayBackend(LLMBackend):
+    """
+    A local backend serving recorded responses by prompt hash after a
+    simulated latency, to run the pipeline without network access.
+    """
+
+    def __init__(
+        self,
+        responses: Union[Dict[str, Union[str, LLMResponse]], None] = None,
+        latency: Union[Latency, None] = None,
+        default: Union[str, LLMResponse, None] = None,
+    ) -> None:
+        """
+        Initialize the ReplayBackend instance.
+
+        Args:
+            responses (Union[Dict[str, Union[str, LLMResponse]], None]):
+                Responses by prompt key.
+            latency (Union[Latency, None]): Latency of every response, none
+                                            if None.
+            default (Union[str, LLMResponse, None]): Response to unknown
+                prompts. They raise a KeyError if None.
+        """
+        self.responses = dict(responses or {})
+        self.latency = latency or Latency()
+        self.default = default
+
+    @classmethod
+    def from_file(cls, file_name: str, **kwargs) -> "ReplayBackend":
+        """
+        Load the responses written by a RecordingBackend.
+
+        Args:
+            file_name (str): Path to the JSON lines recording.
+            **kwargs: Additional arguments of the backend.
+
+        Returns:
+            ReplayBackend: The backend replaying the recording.
+        """
+        responses = {}
+        with open(file_name, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    responses[record["key"]] = LLMResponse(
+                        record["response"],
+                        record.get("prompt_tokens", 0),
+                        record.get("completion_tokens", 0),
+                    )
+        return cls(responses, **kwargs)
+
+    def _response(self, messages: List[Dict], **params) -> LLMResponse:
+        key = prompt_key(messages, **params)
+        response = self.responses.get(key, self.default)
+        if response is None:
+            raise KeyError(f"No recorded response for prompt {key}")
+        if isinstance(response, str):
+            return LLMResponse(response)
+        return response
+
+    async def acomplete(self, messages: List[Dict], **params) -> LLMResponse:
+        response = self._response(messages, **params)
+        await asyncio.sleep(self.latency.sample())
+        return response
+
+    def complete(self, messages: List[Dict], **params) -> LLMResponse:
+        response = self._response(messages, **params)
+        time.sleep(self.latency.sample())
+        return response
+
+    async def astream(
+        self, messages: List[Dict], **params
+    ) -> AsyncIterator[str]:
+        response = self._response(messages, **params)
+        await asyncio.sleep(self.latency.sample())
+        for chunk in STREAM_CHUNK_PATTERN.findall(response.content):
+            yield chunk
+            await asyncio.sleep(0)
+
+
+class RecordingBackend(LLMBackend):
+    """
+    A backend appending the responses of another backend to a JSON lines
+    file, for a ReplayBackend to serve later.
+    """
+
+    def __init__(self, backend: LLMBackend, file_name: str) -> None:
+        """
+        Initialize the RecordingBackend instance.
+
+        Args:
+            backend (LLMBackend): The backend answering the prompts.
+            file_name (str): Path to the JSON lines recording.
+        """
+        self.backend = backend
+        self.file_name = file_name
+        self._lock = threading.Lock()
+
+    def _record(
+        self, messages: List[Dict], response: LLMResponse, **params
+    ):
+        record = {
+            "key": prompt_key(messages, **params),
+            "response": response.content,
+            "prompt_tokens": response.prompt_tokens,
+            "completion_tokens": response.completion_tokens,
+        }
+        with self._lock, open(self.file_name, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def acomplete(self, messages: List[Dict], **params) -> LLMResponse:
+        response = await self.backend.acomplete(messages, **params)
+        self._record(messages, response, **params)
+        return response
+
+    def complete(self, messages: List[Dict], **params) -> LLMResponse:
+        response = self.backend.complete(messages, **params)
+        self._record(messages, response, **params)
+        return response
+
+    async def astream(
+        self, messages: List[Dict], **params
+    ) -> AsyncIterator[str]:
+        chunks = []
+        async for token in self.backend.astream(messages, **params):
+            chunks.append(token)
+            yield token
+        self._record(messages, LLMResponse("".join(chunks)), **params)
+
+
+def create_backend(api_type: Union[str, None] = None) -> LLMBackend:
+    """Create the backend selected by the environment.
+
+    API_TYPE selects "azure", "replay" or otherwise OpenAI. The
+    replay backend reads the recording at REPLAY_FILE, waits for a latency
+    drawn from REPLAY_LATENCY and answers unknown prompts with
+    REPLAY_DEFAULT. Responses of the other backends are recorded to
+    RECORD_FILE when it is set.
+
+    Args:
+        api_type (Union[str, None]): Backend type, from the environment if
+                                     None.
+
+    Returns:
+        LLMBackend: The configured backend.
+    """
+    api_type = api_type or os.getenv(API_TYPE)
+    if api_type == "replay":
+        kwargs = {
+            "latency": Latency.from_spec(
+                os.getenv(REPLAY_LATENCY_ENV, "fixed:0")
+            ),
+            "default": os.getenv(REPLAY_DEFAULT_ENV),
+        }
+        file_name = os.getenv(REPLAY_FILE_ENV)
+        if file_name:
+            return ReplayBackend.from_file(file_name, **kwargs)
+        return ReplayBackend(**kwargs)
+    backend = OpenAIBackend(azure=api_type == "azure")
+    record_file = os.getenv(RECORD_FILE_ENV)
+    if record_file:
+        return RecordingBackend(backend, record_file)
+    return backend
@@ -1,33 +1,57 @@
+from typing import AsyncIterator
+
+from sqlite_db.db_constants import SCHEMA
+from utils.helpers import parse_json_object
 from .llm_client import LLMClient
 from .prompts import (
     SQL_GEN_HUMAN_PROMPT,
     SQL_GEN_SYSTEM_PROMPT,
+    SQL_GEN_JSON_HUMAN_PROMPT,
+    SQL_GEN_JSON_SYSTEM_PROMPT,
     SQL_VAL_SYSTEM_PROMPT,
     SQL_VAL_HUMAN_PROMPT,
     NATURAL_SYSTEM_PROMPT,
     NATURAL_HUMAN_PROMPT,
+    SQL_REPAIR_SYSTEM_PROMPT,
+    SQL_REPAIR_HUMAN_PROMPT,
 )
 
 
-async def generate_sql_query(llm_client: LLMClient, question: str) -> dict:
+async def generate_sql_query(
+    llm_client: LLMClient,
+    question: str,
+    schema: str = SCHEMA,
+    examples: str = "",
+    **kwargs,
+) -> dict:
     """Generate SQL query from the given question.
 
     Args:
         llm_client (LLMClient): The LLM client object.
         question (str): The question to generate SQL query.
+        schema (str): The database schema described to the model.
+        examples (str): Similar questions with their SQL, shown to the
+                        model as examples.
+        **kwargs: Additional arguments for the API request, such as the
+                  temperature.
 
     Returns:
         dict: Dictionary with keys status and result.
     """
 
     try:
-        input_msg = {"question": question}
+        input_msg = {
+            "question": question,
+            "schema": schema,
+            "examples": examples,
+        }
 
         result = await llm_client.arun(
             input_message=input_msg,
             system_message=SQL_GEN_SYSTEM_PROMPT,
             human_message=SQL_GEN_HUMAN_PROMPT,
             generation_name="SQL Query Generation",
+            **kwargs,
         )
         return {"status": True, "result": result if result != "None" else None}
     except Exception as e:
@@ -35,6 +59,62 @@ async def generate_sql_query(llm_client: LLMClient, question: str) -> dict:
         return {"status": False, "result": None}
 
 
+async def generate_sql_json(
+    llm_client: LLMClient,
+    question: str,
+    schema: str = SCHEMA,
+    examples: str = "",
+    **kwargs,
+) -> dict:
+    """Generate SQL query from the given question and judge its scope in
+       one JSON response, so that it needs no separate validation call.
+
+    Args:
+        llm_client (LLMClient): The LLM client object.
+        question (str): The question to generate SQL query.
+        schema (str): The database schema described to the model.
+        examples (str): Similar questions with their SQL, shown to the
+                        model as examples.
+        **kwargs: Additional arguments for the API request, such as the
+                  temperature.
+
+    Returns:
+        dict: Dictionary with keys status, result, the SQL query or None
+              if the question is out of scope, and tables_used.
+    """
+
+    try:
+        input_msg = {
+            "question": question,
+            "schema": schema,
+            "examples": examples,
+        }
+
+        result = await llm_client.arun(
+            input_message=input_msg,
+            system_message=SQL_GEN_JSON_SYSTEM_PROMPT,
+            human_message=SQL_GEN_JSON_HUMAN_PROMPT,
+            generation_name="SQL Query Generation",
+            response_format="json_object",
+            **kwargs,
+        )
+        if not isinstance(result, dict):
+            # The client keeps responses it cannot parse as text.
+            result = parse_json_object(result)
+        sql = result.get("sql")
+        if not isinstance(sql, str) or not result.get("in_scope", True):
+            sql = ""
+        sql = sql.strip()
+        return {
+            "status": True,
+            "result": sql if sql and sql != "None" else None,
+            "tables_used": list(result.get("tables_used") or []),
+        }
+    except Exception as e:
+        print(f"Error in generate_sql_json: {e}")
+        return {"status": False, "result": None, "tables_used": []}
+
+
 async def validate_sql_query(llm_client: LLMClient, sql_query: str) -> dict:
     """Validate the given SQL query.
 
@@ -61,6 +141,46 @@ async def validate_sql_query(llm_client: LLMClient, sql_query: str) -> dict:
         return {"status": False, "result": None}
 
 
+async def repair_sql_query(
+    llm_client: LLMClient,
+    question: str,
+    sql_query: str,
+    error: str,
+    schema: str,
+) -> dict:
+    """Repair a SQL query given the database error it failed with.
+
+    Args:
+        llm_client (LLMClient): The LLM client object.
+        question (str): The question the SQL query answers.
+        sql_query (str): The failing SQL query.
+        error (str): The database error.
+        schema (str): The schema of the tables used by the query.
+
+    Returns:
+        dict: Dictionary with keys status and result.
+    """
+    try:
+        input_msg = {
+            "question": question,
+            "query": sql_query,
+            "error": error,
+            "schema": schema,
+        }
+
+        result = await llm_client.arun(
+            input_message=input_msg,
+            system_message=SQL_REPAIR_SYSTEM_PROMPT,
+            human_message=SQL_REPAIR_HUMAN_PROMPT,
+            generation_name="SQL Query Repair",
+        )
+        return {"status": True, "result": result}
+
+    except Exception as e:
+        print(f"Error in repair_sql_query: {e}")
+        return {"status": False, "result": None}
+
+
 async def generate_natural_response(
     llm_client: LLMClient, question: str, result: str
 ) -> dict:
@@ -88,3 +208,31 @@ async def generate_natural_response(
     except Exception as e:
         print(f"Error in generate_natural_response: {e}")
         return {"status": False, "result": None}
+
+
+async def stream_natural_response(
+    llm_client: LLMClient, question: str, result: str
+) -> AsyncIterator[str]:
+    """Stream natural response for the given question and result
+
+    Args:
+        llm_client (LLMClient): The LLM client object.
+        question (str): User question
+        result (str): Result of the query
+
+    Yields:
+        str: Tokens of the natural response as they are generated.
+    """
+    try:
+        input_msg = {"question": question, "result": result}
+
+        async for token in llm_client.astream(
+            input_message=input_msg,
+            system_message=NATURAL_SYSTEM_PROMPT,
+            human_message=NATURAL_HUMAN_PROMPT,
+            generation_name="Natural Response Generation",
+        ):
+            yield token
+
+    except Exception as e:
+        print(f"Error in stream_natural_response: {e}")
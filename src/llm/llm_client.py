@@ -1,25 +1,29 @@
 import base64
-import json
 import os
-from typing import Dict, List, Union
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator, List, Union
 from dotenv import find_dotenv, load_dotenv
 from langfuse import Langfuse
-from openai import AsyncAzureOpenAI, AzureOpenAI, AsyncOpenAI, OpenAI
+from uuid6 import uuid7
 
-status = load_dotenv(find_dotenv())
-assert status, "Failed to load .env file"
+from utils.helpers import parse_json_object
+from utils.metrics import metrics
+from .backends import LLMBackend, LLMResponse, create_backend
+from .telemetry import TelemetryExporter, create_exporter
 
-# Constants for environment variable keys
-API_TYPE = "API_TYPE"
-API_KEY_ENV = "API_KEY"
-API_BASE_ENV = "API_BASE_URL"
-MODEL_ENV = "MODEL_NAME"
+# Settings may also come from the environment itself, e.g. in containers.
+load_dotenv(find_dotenv())
 
 # Model constants
 DEFAULT_TEMPERATURE = 0.0
 DEFAULT_PRESENCE_PENALTY = 0.0
 DEFAULT_FREQUENCY_PENALTY = 0.0
 
+# Trace id and trace of the request being handled, see trace_request.
+_request_trace: ContextVar = ContextVar("request_trace", default=None)
+
 
 class Langfuse_Morph:
     def __call__(self, *args, **kwargs):
@@ -43,6 +47,8 @@ class LLMClient:
         trace_id: Union[str, None] = None,
         trace_name: Union[str, None] = None,
         track_model_name: str = None,
+        backend: Union[LLMBackend, None] = None,
+        telemetry: Union[TelemetryExporter, None] = None,
     ) -> None:
         """
         Initialize the LLMClient instance.
@@ -52,53 +58,89 @@ class LLMClient:
             presence_penalty (float): Penalty for presence of certain tokens.
             frequency_penalty (float): Penalty for frequency of certain tokens.
             langfuse_enable (bool): Whether to enable Langfuse tracing.
-            trace_id (Union[str, None]): ID for the trace in Langfuse.
-            trace_name (Union[str, None]): Name for the trace in Langfuse.
+            trace_id (Union[str, None]): ID of the trace in Langfuse of the
+                generations outside of a request, generated if None.
+            trace_name (Union[str, None]): Name for the traces in Langfuse.
             track_model_name (str): Name of the model to track in Langfuse.
+            backend (Union[LLMBackend, None]): The service completing the
+                messages, selected by the environment if None.
+            telemetry (Union[TelemetryExporter, None]): The exporter of the
+                traces, to Langfuse if enabled else selected by the
+                environment if None.
         """
         self.temperature = temperature
         self.presence_penalty = presence_penalty
         self.frequency_penalty = frequency_penalty
         self.langfuse_enable = langfuse_enable
         self.track_model_name = track_model_name
+        self.trace_name = trace_name
 
         if self.langfuse_enable:
             self.langfuse_client = Langfuse()
-            self.trace = self.langfuse_client.trace(
-                id=trace_id, name=trace_name, metadata=self._prepare_metadata()
-            )
         else:
             self.langfuse_client = Langfuse_Morph()
-            self.trace = self.langfuse_client.trace(
-                id=trace_id, name=trace_name, metadata=self._prepare_metadata()
-            )
-        self.async_client, self.client = self._create_client()
+        self.telemetry = telemetry or create_exporter(
+            self.langfuse_client if self.langfuse_enable else None
+        )
+        self._trace_id = trace_id or str(uuid7())
+        self._trace = self.telemetry.trace(
+            id=self._trace_id,
+            name=trace_name,
+            metadata=self._prepare_metadata(),
+        )
+        self.backend = backend or create_backend()
 
-    def _create_client(self) -> tuple:
-        """Create the LLM client.
+    @property
+    def trace(self):
+        """The trace of the current request, else the trace of the client."""
+        current = _request_trace.get()
+        return current[1] if current else self._trace
 
-        Returns:
-            tuple: A tuple containing the async client and sync client.
+    @property
+    def trace_id(self) -> str:
+        """The id of the trace generations are currently added to."""
+        current = _request_trace.get()
+        return current[0] if current else self._trace_id
+
+    @contextmanager
+    def trace_request(
+        self, trace_id: Union[str, None] = None, **kwargs
+    ) -> Iterator[str]:
         """
-        if os.getenv(API_TYPE) == "azure":
-            async_client = AsyncAzureOpenAI(
-                api_key=os.getenv(API_KEY_ENV),
-                azure_endpoint=os.getenv(API_BASE_ENV),
-            )
-            client = AzureOpenAI(
-                api_key=os.getenv(API_KEY_ENV),
-                azure_endpoint=os.getenv(API_BASE_ENV),
-            )
-        else:
-            async_client = AsyncOpenAI(
-                api_key=os.getenv(API_KEY_ENV),
-                base_url=os.getenv(API_BASE_ENV),
-            )
-            client = OpenAI(
-                api_key=os.getenv(API_KEY_ENV),
-                base_url=os.getenv(API_BASE_ENV),
-            )
-        return async_client, client
+        Add the generations of the block to the trace of a request.
+
+        The trace is kept in a context variable, so that it follows the
+        request through tasks and awaits. A block inside the block of
+        another request joins its trace.
+
+        Args:
+            trace_id (Union[str, None]): ID of the trace, generated if None.
+            **kwargs: Additional attributes of a new trace, e.g. input.
+
+        Yields:
+            str: The trace id.
+        """
+        current = _request_trace.get()
+        if current is not None:
+            yield current[0]
+            return
+
+        trace_id = trace_id or str(uuid7())
+        trace = self.telemetry.trace(
+            id=trace_id,
+            name=self.trace_name,
+            metadata=self._prepare_metadata(),
+            **kwargs,
+        )
+        token = _request_trace.set((trace_id, trace))
+        try:
+            yield trace_id
+        finally:
+            try:
+                _request_trace.reset(token)
+            except ValueError:
+                # Async generators may be closed from another context.
+                _request_trace.set(None)
 
     @staticmethod
     def _encode_image(img_path: str) -> str:
@@ -265,18 +307,83 @@ class LLMClient:
             model=metadata["model"],
             metadata=metadata,
         )
+        started, status = time.perf_counter(), "success"
         try:
             response_content = await self._get_response_content_async(
-                messages, metadata, gen_obj
+                messages, metadata, gen_obj, generation_name
             )
             self._update_trace(gen_obj, response_content)
         except Exception as e:
-            response_content = ""
+            response_content, status = "", "error"
             self._update_trace(
                 gen_obj, response_content, status_message=str(e), level="ERROR"
             )
+        self._record_request(generation_name, started, status)
         return response_content
 
+    async def astream(
+        self,
+        prompt_name: Union[str, None] = None,
+        input_message: Dict = {},
+        system_message: str = "",
+        human_message: str = "",
+        image_path: Union[str, List[str]] = "",
+        generation_name: Union[str, None] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Asynchronously stream a result from the LLM model token by token.
+
+        Args:
+            prompt_name (Union[str, None]): Name of the prompt.
+            input_message (Dict): Input message dictionary.
+            system_message (str): Template for the system message.
+            human_message (str): Template for the human message.
+            image_path (Union[str, List[str]]): Path(s) to the image(s).
+            generation_name (Union[str, None]): Name for the generation trace.
+            **kwargs: Additional arguments for the API request.
+
+        Yields:
+            str: The pieces of the model's response as they arrive.
+        """
+        messages, prompt = self._get_prompt_and_messages(
+            prompt_name,
+            input_message,
+            system_message,
+            human_message,
+            image_path,
+        )
+
+        metadata = self._prepare_metadata(**kwargs)
+        gen_obj = self.trace.generation(
+            name=generation_name,
+            prompt=prompt,
+            input=input_message,
+            model=metadata["model"],
+            metadata=metadata,
+        )
+        metadata.pop("model", None)
+        chunks = []
+        started, status = time.perf_counter(), "success"
+        try:
+            async for token in self.backend.astream(messages, **metadata):
+                if not chunks:
+                    metrics.observe(
+                        "llm_first_token_seconds",
+                        time.perf_counter() - started,
+                        {"generation": generation_name or "Unnamed"},
+                    )
+                chunks.append(token)
+                yield token
+            self._update_trace(gen_obj, "".join(chunks))
+        except Exception as e:
+            status = "error"
+            self._update_trace(
+                gen_obj, "".join(chunks), status_message=str(e), level="ERROR"
+            )
+        finally:
+            self._record_request(generation_name, started, status)
+
     def run(
         self,
         prompt_name: Union[str, None] = None,
@@ -318,16 +425,18 @@ class LLMClient:
             metadata=metadata,
             status_message="Generating response...",
         )
+        started, status = time.perf_counter(), "success"
         try:
             response_content = self._get_response_content(
-                messages, metadata, gen_obj
+                messages, metadata, gen_obj, generation_name
             )
             self._update_trace(gen_obj, response_content)
         except Exception as e:
-            response_content = ""
+            response_content, status = "", "error"
             self._update_trace(
                 gen_obj, response_content, status_message=str(e), level="ERROR"
             )
+        self._record_request(generation_name, started, status)
         return response_content
 
     def _get_prompt_and_messages(
@@ -397,22 +506,25 @@ class LLMClient:
 
         return messages, prompt
 
-    async def _get_response_content_async(self, messages, metadata, gen_obj):
+    async def _get_response_content_async(
+        self, messages, metadata, gen_obj, generation_name=None
+    ):
         """
         Asynchronously get the response content from the API.
 
         Args:
             messages (List[Dict]): List of messages for the API.
             metadata (Dict): Metadata for the API request.
+            gen_obj: The generation object.
+            generation_name (str): Name of the generation in the metrics.
 
         Returns:
-            str: The response content from the API.
+            str: The response content from the backend.
         """
         metadata.pop("model", None)
-        response = await self.async_client.chat.completions.create(
-            messages=messages, model=os.getenv(MODEL_ENV), **metadata
-        )
-        response_content = response.choices[0].message.content
+        response = await self.backend.acomplete(messages, **metadata)
+        self._record_usage(gen_obj, generation_name, response)
+        response_content = response.content
         response_format = metadata.get("response_format", {}).get(
             "type", "text"
         )
@@ -425,22 +537,25 @@ class LLMClient:
                 span_obj.end(status_message=str(e), level="ERROR")
         return response_content
 
-    def _get_response_content(self, messages, metadata, gen_obj):
+    def _get_response_content(
+        self, messages, metadata, gen_obj, generation_name=None
+    ):
         """
         Get the response content from the API.
 
         Args:
             messages (List[Dict]): List of messages for the API.
             metadata (Dict): Metadata for the API request.
+            gen_obj: The generation object.
+            generation_name (str): Name of the generation in the metrics.
 
         Returns:
-            str: The response content from the API.
+            str: The response content from the backend.
         """
         metadata.pop("model", None)
-        response = self.client.chat.completions.create(
-            messages=messages, model=os.getenv(MODEL_ENV), **metadata
-        )
-        response_content = response.choices[0].message.content
+        response = self.backend.complete(messages, **metadata)
+        self._record_usage(gen_obj, generation_name, response)
+        response_content = response.content
         response_format = metadata.get("response_format", {}).get(
             "type", "text"
         )
@@ -453,6 +568,48 @@ class LLMClient:
                 span_obj.end(status_message=str(e), level="ERROR")
         return response_content
 
+    def _record_usage(self, gen_obj, generation_name, response: LLMResponse):
+        """
+        Record the token usage of a response in the metrics and the trace.
+
+        Args:
+            gen_obj: The generation object.
+            generation_name (str): Name of the generation.
+            response (LLMResponse): The response of the backend.
+        """
+        labels = {"generation": generation_name or "Unnamed"}
+        metrics.increment(
+            "llm_prompt_tokens_total", response.prompt_tokens, labels
+        )
+        metrics.increment(
+            "llm_completion_tokens_total", response.completion_tokens, labels
+        )
+        if response.prompt_tokens or response.completion_tokens:
+            gen_obj.update(
+                usage={
+                    "input": response.prompt_tokens,
+                    "output": response.completion_tokens,
+                }
+            )
+
+    @staticmethod
+    def _record_request(generation_name, started: float, status: str):
+        """
+        Record the latency and the outcome of a request in the metrics.
+
+        Args:
+            generation_name (str): Name of the generation.
+            started (float): time.perf_counter() when the request started.
+            status (str): Either "success" or "error".
+        """
+        labels = {"generation": generation_name or "Unnamed"}
+        metrics.observe(
+            "llm_request_seconds", time.perf_counter() - started, labels
+        )
+        metrics.increment(
+            "llm_requests_total", labels={**labels, "status": status}
+        )
+
     def _update_trace(self, gen_obj, response_content, **kwargs):
         """
         Update the trace with the response content and usage.
@@ -462,14 +619,15 @@ class LLMClient:
             response_content (str): The response content from the API.
         """
         gen_obj.end(
-            output=response_content, status_message="Success", **kwargs
+            output=response_content, **{"status_message": "Success", **kwargs}
         )
         self.trace.update(output=response_content, **kwargs)
 
     @staticmethod
     def json_parse(content: str, strict: bool = False, **kwargs) -> Dict:
         """
-        Parse JSON content.
+        Parse the JSON object of a response, ignoring a markdown code
+        block or text around it.
 
         Args:
             content (str): The JSON content to parse.
@@ -479,7 +637,7 @@ class LLMClient:
         Returns:
             Dict: The parsed JSON content.
         """
-        return json.loads(content.strip("```json\n"), strict=strict, **kwargs)
+        return parse_json_object(content, strict=strict, **kwargs)
 
     def score_generation(
         self,
@@ -487,26 +645,35 @@ class LLMClient:
         score_name: str,
         data_type: str = "NUMERIC",
         comment: str = None,
+        trace_id: Union[str, None] = None,
     ):
         """
-        Score a specific generation in the current trace.
+        Score a trace, such as the trace of an answered request.
 
         Args:
             score_value (int|float|str): The score value (e.g., a rating).
             score_name (str): The name for the score
             data_type (str): One of "NUMERIC", "CATEGORICAL", or "BOOLEAN".
             comment (str): Optional comment to attach with the score.
+            trace_id (Union[str, None]): ID of the scored trace, the
+                                         current trace if None.
+        """
+        self.telemetry.score(
+            trace_id=trace_id or self.trace_id,
+            name=score_name,
+            value=score_value,
+            data_type=data_type,
+            comment=comment,
+        )
+
+    def close(self, timeout: float = 5.0):
         """
-        try:
-            self.langfuse_client.score(
-                trace_id=self.trace.id,
-                name=score_name,
-                value=score_value,
-                data_type=data_type,
-                comment=comment,
-            )
-        except Exception as e:
-            print(f"Error scoring generation: {e}")
+        Export the queued traces and scores, then stop the exporter.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+        """
+        self.telemetry.close(timeout)
 
     def __repr__(self) -> str:
         """
@@ -534,6 +701,3 @@ class LLMClient:
             f"presence_penalty={self.presence_penalty}, "
             f"frequency_penalty={self.frequency_penalty}"
         )
-
-    def __del__(self):
-        self.langfuse_client.shutdown()
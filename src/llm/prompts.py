@@ -1,14 +1,15 @@
-from sqlite_db.db_constants import TABLES, SCHEMA, DB_ENGINE
+from sqlite_db.db_constants import TABLES, DB_ENGINE
 
 SQL_GEN_SYSTEM_PROMPT = f"""\
 You are an expert SQL query generator. Your task is to produce correct, optimized, and syntactically valid SQL queries based on the provided schema and DB engine specifications. Always follow the instructions exactly and output only the final SQL query without any commentary.
 If the user is asking something out of the scope of this information (not related to queries regarding f{", ".join(TABLES)}), return None.
 """
 
-SQL_GEN_HUMAN_PROMPT = f"""
+_SQL_GEN_TASK_PROMPT = f"""
 Database Schema:
-{SCHEMA}
+{{schema}}
 
+{{examples}}
 Task: Generate {DB_ENGINE}-compatible SQL to answer: "<question>{{question}}</question>"
 
 Requirements:
@@ -39,13 +40,28 @@ Example JOIN pattern:
 FROM orders AS o
 INNER JOIN customers AS c
   ON o.customer_id = c.id
+"""
 
+SQL_GEN_HUMAN_PROMPT = _SQL_GEN_TASK_PROMPT + f"""
 Additional Instruction:
 If the user's question is not related to queries regarding {", ".join(TABLES)}, return None.
 
 Return either the final SQL code using {DB_ENGINE} syntax or None.
 """
 
+SQL_GEN_JSON_SYSTEM_PROMPT = f"""\
+You are an expert SQL query generator. Your task is to produce correct, optimized, and syntactically valid SQL queries based on the provided schema and DB engine specifications, and to judge whether the question can be answered from the data at all. Always follow the instructions exactly and output only a single JSON object without any commentary.
+If the user is asking something out of the scope of this information (not related to queries regarding {", ".join(TABLES)}), set "in_scope" to false and "sql" to null.
+"""
+
+SQL_GEN_JSON_HUMAN_PROMPT = _SQL_GEN_TASK_PROMPT + f"""
+Additional Instruction:
+If the user's question is not related to queries regarding {", ".join(TABLES)}, set "in_scope" to false and "sql" to null.
+
+Return a JSON object in the following format:
+{{{{"sql": "<the final {DB_ENGINE} SQL query, or null>", "in_scope": true, "tables_used": ["<names of the tables read by the query>"]}}}}
+"""
+
 
 SQL_VAL_SYSTEM_PROMPT = """\
 You are a seasoned SQL syntax validator. Your role is to assess whether an input string is a syntactically valid SQL query. Focus solely on syntax: disregard semantic issues or execution context.
@@ -74,3 +90,20 @@ Inputs:
 
 Please provide your final summary as a single, short, self-contained paragraph.
 """
+
+SQL_REPAIR_SYSTEM_PROMPT = f"""\
+You are an expert {DB_ENGINE} SQL debugger. Your task is to fix a SQL query that failed with a database error, keeping its intent. Output only the corrected SQL query without any commentary.
+"""
+
+SQL_REPAIR_HUMAN_PROMPT = f"""\
+The SQL query below was generated to answer the user question but failed with the given {DB_ENGINE} error.
+
+Inputs:
+- User Question: <question>{{question}}</question>
+- Failing SQL Query: <query>{{query}}</query>
+- Error: <error>{{error}}</error>
+- Relevant Schema:
+{{schema}}
+
+Return only the corrected read-only {DB_ENGINE} query.
+"""
@@ -0,0 +1,398 @@
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Union
+from uuid import uuid4
+
+from config.telemetry_config import TelemetryConfig
+from utils.metrics import metrics
+
+# Constants for environment variable keys
+TELEMETRY_FILE_ENV = "TELEMETRY_FILE"
+
+# Queue item stopping the export thread.
+_STOP = object()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class TelemetrySink:
+    """
+    Base class for the destinations of exported telemetry events.
+    """
+
+    def export(self, events: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Deliver the exported events buffered by the sink, if any."""
+
+    def close(self) -> None:
+        """Release the resources of the sink, if any."""
+
+
+class LangfuseSink(TelemetrySink):
+    """
+    Sends the events to Langfuse. Every event creates or updates a trace,
+    a generation, a span or a score by id.
+    """
+
+    def __init__(self, langfuse_client) -> None:
+        """
+        Initialize the LangfuseSink instance.
+
+        Args:
+            langfuse_client (Langfuse): The Langfuse client.
+        """
+        self.langfuse_client = langfuse_client
+
+    def export(self, events: List[Dict]) -> None:
+        for event in events:
+            kind = event["type"].split("-")[0]
+            body = event["body"]
+            if kind == "trace":
+                self.langfuse_client.trace(id=event["id"], **body)
+            elif kind == "score":
+                self.langfuse_client.score(trace_id=event["trace_id"], **body)
+            else:
+                # generation or span
+                getattr(self.langfuse_client, kind)(
+                    id=event["id"],
+                    trace_id=event["trace_id"],
+                    parent_observation_id=event["parent_id"],
+                    **body,
+                )
+
+    def flush(self) -> None:
+        self.langfuse_client.flush()
+
+    def close(self) -> None:
+        self.langfuse_client.shutdown()
+
+
+class FileSink(TelemetrySink):
+    """
+    Appends the events to a JSON lines file, e.g. for offline runs.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        """
+        Initialize the FileSink instance.
+
+        Args:
+            file_name (str): Path to the JSON lines file.
+        """
+        self.file_name = file_name
+        self._file = None
+
+    def export(self, events: List[Dict]) -> None:
+        if self._file is None:
+            self._file = open(self.file_name, "a", encoding="utf-8")
+        for event in events:
+            self._file.write(json.dumps(event, default=str) + "\n")
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TelemetryExporter:
+    """
+    Queues telemetry events on the request path and exports them in
+    batches from a background thread.
+
+    The queue is bounded: events arriving while it is full are dropped
+    and counted, so that a slow sink never delays requests nor grows the
+    memory. Traces are sampled by id, keeping or dropping all of their
+    events.
+    """
+
+    def __init__(
+        self,
+        sink: Union[TelemetrySink, None],
+        max_queue_size: int = TelemetryConfig.max_queue_size,
+        batch_size: int = TelemetryConfig.batch_size,
+        flush_interval: float = TelemetryConfig.flush_interval,
+        sample_rate: float = TelemetryConfig.sample_rate,
+    ) -> None:
+        """
+        Initialize the TelemetryExporter instance.
+
+        Args:
+            sink (Union[TelemetrySink, None]): Destination of the events.
+                                               Events are discarded if None.
+            max_queue_size (int): Maximum number of queued events.
+            batch_size (int): Maximum number of events exported at once.
+            flush_interval (float): Seconds to wait for a full batch.
+            sample_rate (float): Share of the traces exported.
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _sampled(self, trace_id: str) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        bucket = zlib.crc32(trace_id.encode("utf-8")) / 0xFFFFFFFF
+        return bucket < self.sample_rate
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="telemetry-export", daemon=True
+                )
+                self._thread.start()
+
+    def emit(
+        self,
+        event_type: str,
+        trace_id: str,
+        body: Dict,
+        id: Union[str, None] = None,
+        parent_id: Union[str, None] = None,
+    ):
+        """
+        Queue an event for export without ever blocking.
+
+        Args:
+            event_type (str): The kind of object and the change, such as
+                              "generation-create" or "score".
+            trace_id (str): ID of the trace of the event.
+            body (Dict): Attributes of the object.
+            id (Union[str, None]): ID of the object, the trace if None.
+            parent_id (Union[str, None]): ID of the parent observation.
+        """
+        if self.sink is None or not self._sampled(trace_id):
+            return
+        if self._thread is None:
+            self._start()
+        event = {
+            "type": event_type,
+            "id": id or trace_id,
+            "trace_id": trace_id,
+            "parent_id": parent_id,
+            "body": body,
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            metrics.increment("telemetry_dropped_total")
+
+    def _export(self, events: List[Dict]):
+        try:
+            self.sink.export(events)
+            metrics.increment("telemetry_exported_total", len(events))
+        except Exception:
+            metrics.increment("telemetry_export_errors_total")
+
+    def _run(self):
+        """Export the queued events in batches until stopped."""
+        events, deadline = [], None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # The batch waited long enough for more events.
+                item = None
+
+            if item is _STOP or isinstance(item, threading.Event):
+                if events:
+                    self._export(events)
+                events, deadline = [], None
+                try:
+                    if item is _STOP:
+                        self.sink.close()
+                    else:
+                        self.sink.flush()
+                except Exception:
+                    metrics.increment("telemetry_export_errors_total")
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+
+            if item is not None:
+                events.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if events and (item is None or len(events) >= self.batch_size):
+                self._export(events)
+                events, deadline = [], None
+
+    def flush(self, timeout: float = TelemetryConfig.shutdown_timeout):
+        """
+        Wait until the events queued so far are exported.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            bool: Whether every event was exported in time.
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = TelemetryConfig.shutdown_timeout):
+        """
+        Export the queued events, then stop the thread and close the sink.
+        Events emitted later start a new thread.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def trace(self, id: str, **body) -> "TraceHandle":
+        """
+        Create a trace.
+
+        Args:
+            id (str): ID of the trace.
+            **body: Attributes of the trace, such as name and metadata.
+
+        Returns:
+            TraceHandle: The handle of the trace.
+        """
+        self.emit("trace-create", id, {"timestamp": _now(), **body})
+        return TraceHandle(self, id)
+
+    def score(self, trace_id: str, **body):
+        """
+        Score a trace.
+
+        Args:
+            trace_id (str): ID of the scored trace.
+            **body: Attributes of the score, such as name and value.
+        """
+        self.emit("score", trace_id, body, id=str(uuid4()))
+
+
+class ObservationHandle:
+    """
+    A generation or span whose changes are queued on an exporter.
+    """
+
+    def __init__(
+        self,
+        exporter: TelemetryExporter,
+        kind: str,
+        trace_id: str,
+        parent_id: Union[str, None] = None,
+    ) -> None:
+        """
+        Initialize the ObservationHandle instance.
+
+        Args:
+            exporter (TelemetryExporter): The exporter of the events.
+            kind (str): Either "generation" or "span".
+            trace_id (str): ID of the trace.
+            parent_id (Union[str, None]): ID of the parent observation.
+        """
+        self.exporter = exporter
+        self.kind = kind
+        self.id = str(uuid4())
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+
+    def _emit(self, change: str, body: Dict):
+        self.exporter.emit(
+            f"{self.kind}-{change}",
+            self.trace_id,
+            body,
+            id=self.id,
+            parent_id=self.parent_id,
+        )
+
+    def span(self, **body) -> "ObservationHandle":
+        """Start a span nested in this observation."""
+        span = ObservationHandle(self.exporter, "span", self.trace_id, self.id)
+        span._emit("create", {"start_time": _now(), **body})
+        return span
+
+    def update(self, **body):
+        """Change attributes of the observation, e.g. its usage."""
+        self._emit("update", body)
+
+    def end(self, **body):
+        """End the observation, e.g. with its output."""
+        self._emit("update", {"end_time": _now(), **body})
+
+
+class TraceHandle:
+    """
+    A trace whose changes are queued on an exporter.
+    """
+
+    def __init__(self, exporter: TelemetryExporter, id: str) -> None:
+        """
+        Initialize the TraceHandle instance.
+
+        Args:
+            exporter (TelemetryExporter): The exporter of the events.
+            id (str): ID of the trace.
+        """
+        self.exporter = exporter
+        self.id = id
+
+    def generation(self, **body) -> ObservationHandle:
+        """Start a generation in the trace."""
+        generation = ObservationHandle(self.exporter, "generation", self.id)
+        generation._emit("create", {"start_time": _now(), **body})
+        return generation
+
+    def update(self, **body):
+        """Change attributes of the trace, e.g. its output."""
+        self.exporter.emit("trace-update", self.id, body)
+
+
+def create_exporter(langfuse_client=None) -> TelemetryExporter:
+    """Create the telemetry exporter selected by the environment.
+
+    Args:
+        langfuse_client (Langfuse, optional): Events are sent to Langfuse
+            with this client if given, else appended to the file at
+            TELEMETRY_FILE if set, else discarded.
+
+    Returns:
+        TelemetryExporter: The exporter.
+    """
+    if langfuse_client is not None:
+        sink = LangfuseSink(langfuse_client)
+    elif os.getenv(TELEMETRY_FILE_ENV):
+        sink = FileSink(os.getenv(TELEMETRY_FILE_ENV))
+    else:
+        sink = None
+    return TelemetryExporter(sink)
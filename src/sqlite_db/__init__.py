@@ -1,5 +1,21 @@
 from . import db_constants
+from . import rollups
 from . import create
+from . import pool
+from . import result
 from . import execute
+from . import executor
+from . import validate
+from . import catalog
 
-__all__ = ["db_constants", "create", "execute"]
+__all__ = [
+    "db_constants",
+    "rollups",
+    "create",
+    "pool",
+    "result",
+    "execute",
+    "executor",
+    "validate",
+    "catalog",
+]
@@ -0,0 +1,501 @@
+import re
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Union
+
+from config.db_config import DBConfig
+from .db_constants import (
+    NATURAL_KEYS,
+    RELATIONSHIPS,
+    ROLLUP_NOTES,
+    ROLLUPS,
+    SCHEMA,
+)
+from .pool import get_pool
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Tables with more columns are reduced to the relevant ones in prompts.
+PRUNED_TABLE_COLUMNS = 15
+# Words of a question which say nothing about the columns it needs.
+STOP_WORDS = {
+    "all",
+    "and",
+    "any",
+    "are",
+    "average",
+    "count",
+    "did",
+    "does",
+    "each",
+    "for",
+    "from",
+    "give",
+    "has",
+    "have",
+    "how",
+    "least",
+    "list",
+    "many",
+    "most",
+    "much",
+    "number",
+    "per",
+    "show",
+    "than",
+    "that",
+    "the",
+    "their",
+    "there",
+    "this",
+    "top",
+    "total",
+    "was",
+    "were",
+    "what",
+    "which",
+    "who",
+    "with",
+}
+# Question words mapped to the words of the column names they refer to.
+SYNONYMS = {
+    "aircraft": ["tail"],
+    "carrier": ["airline"],
+    "date": ["year", "month", "day"],
+    "far": ["distance"],
+    "late": ["delay"],
+    "lateness": ["delay"],
+    "long": ["distance", "elapsed"],
+    "plane": ["tail"],
+    "punctual": ["delay"],
+    "route": ["origin", "destination"],
+    "weekday": ["week"],
+    "weekend": ["week"],
+}
+
+
+@dataclass
+class ColumnInfo:
+    """
+    A column of a table as found in the database.
+
+    Attributes:
+        name (str): The column name.
+        type (str): The declared column type.
+        not_null (bool): Whether the column has a NOT NULL constraint.
+        primary_key (bool): Whether the column is part of the primary key.
+        distinct_values (int): Number of distinct values among the sampled
+                               rows.
+        samples (List): The most frequent sampled values.
+    """
+
+    name: str
+    type: str
+    not_null: bool = False
+    primary_key: bool = False
+    distinct_values: int = 0
+    samples: List = field(default_factory=list)
+
+
+@dataclass
+class TableInfo:
+    """
+    A table as found in the database.
+
+    Attributes:
+        name (str): The table name.
+        columns (List[ColumnInfo]): The columns in declaration order.
+        indexes (Dict[str, List[str]]): Indexed columns by index name.
+        row_count (Union[int, None]): Number of rows estimated by ANALYZE.
+    """
+
+    name: str
+    columns: List[ColumnInfo]
+    indexes: Dict[str, List[str]] = field(default_factory=dict)
+    row_count: Union[int, None] = None
+
+
+def _tokens(text: str) -> Set[str]:
+    """Split a text or an identifier into lower-case words."""
+    return set(TOKEN_PATTERN.findall(text.lower().replace("_", " ")))
+
+
+def _similar(word: str, other: str) -> bool:
+    """Compare two words on their first letters, to ignore inflections.
+
+    Args:
+        word (str): First word.
+        other (str): Second word.
+
+    Returns:
+        bool: Whether the words share a prefix of up to 5 letters. Short
+              words only match exactly.
+    """
+    length = min(5, len(word), len(other))
+    if length < 4:
+        return word == other
+    return word[:length] == other[:length]
+
+
+def _matches(words: Set[str], candidates: Iterable[str]) -> bool:
+    return any(_similar(w, c) for w in words for c in candidates)
+
+
+def _sample_rows(
+    conn: sqlite3.Connection, table_name: str, sample_rows: int
+) -> List[tuple]:
+    """Read rows at an even rowid stride over the whole table.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        table_name (str): Table name.
+        sample_rows (int): Maximum number of rows to read.
+
+    Returns:
+        List[tuple]: The sampled rows, fewer where rowids have gaps.
+    """
+    try:
+        first, last = conn.execute(
+            f"SELECT MIN(rowid), MAX(rowid) FROM {table_name}"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # Tables without rowid are sampled from their leading rows.
+        return conn.execute(
+            f"SELECT * FROM {table_name} LIMIT ?", (sample_rows,)
+        ).fetchall()
+    if first is None:
+        return []
+    stride = max(1, (last - first + 1) // max(1, sample_rows))
+    return conn.execute(
+        "WITH RECURSIVE sample(id) AS ("
+        "SELECT ? UNION ALL SELECT id + ? FROM sample WHERE id + ? <= ?) "
+        f"SELECT {table_name}.* FROM sample "
+        f"JOIN {table_name} ON {table_name}.rowid = sample.id "
+        "LIMIT ?",
+        (first, stride, stride, last, sample_rows),
+    ).fetchall()
+
+
+def introspect_table(
+    conn: sqlite3.Connection,
+    table_name: str,
+    sample_rows: int = DBConfig.catalog_sample_rows,
+    sample_values: int = DBConfig.catalog_sample_values,
+) -> TableInfo:
+    """Read the columns, indexes and sample values of a table.
+
+    Samples come from rows spread evenly over the rowids of the table, so
+    that introspection stays fast on large tables without only seeing the
+    rows loaded first.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        table_name (str): Table name.
+        sample_rows (int): Number of rows sampled per table.
+        sample_values (int): Number of sample values kept per column.
+
+    Returns:
+        TableInfo: The description of the table.
+    """
+    columns = [
+        ColumnInfo(
+            name=row[1],
+            type=row[2],
+            not_null=bool(row[3]),
+            primary_key=bool(row[5]),
+        )
+        for row in conn.execute(f"PRAGMA table_info({table_name})")
+    ]
+    rows = _sample_rows(conn, table_name, sample_rows)
+    for column, values in zip(columns, zip(*rows)):
+        counts = Counter(value for value in values if value is not None)
+        column.distinct_values = len(counts)
+        column.samples = [v for v, _ in counts.most_common(sample_values)]
+
+    indexes = {}
+    for row in conn.execute(f"PRAGMA index_list({table_name})"):
+        indexes[row[1]] = [
+            info[2] for info in conn.execute(f"PRAGMA index_info({row[1]})")
+        ]
+
+    row_count = None
+    try:
+        stat = conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1",
+            (table_name,),
+        ).fetchone()
+        if stat:
+            row_count = int(stat[0].split()[0])
+    except sqlite3.Error:
+        # The statistics table only exists once ANALYZE ran.
+        pass
+    return TableInfo(table_name, columns, indexes, row_count)
+
+
+class SchemaCatalog:
+    """
+    The schema of a database introspected from the file itself, able to
+    describe only the tables and columns relevant to a question.
+    """
+
+    def __init__(self, tables: List[TableInfo]) -> None:
+        """
+        Initialize the SchemaCatalog instance.
+
+        Args:
+            tables (List[TableInfo]): The tables of the database.
+        """
+        self.tables = {table.name: table for table in tables}
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection) -> "SchemaCatalog":
+        """
+        Introspect every user table of a database.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+
+        Returns:
+            SchemaCatalog: The catalog of the database.
+        """
+        names = [
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' "
+                "ESCAPE '\\' ORDER BY name"
+            )
+        ]
+        return cls([introspect_table(conn, name) for name in names])
+
+    def key_columns(self, table_name: str) -> Set[str]:
+        """
+        List the columns needed to filter and join a table.
+
+        Args:
+            table_name (str): Table name.
+
+        Returns:
+            Set[str]: Primary key, natural key, rollup group and join
+                      columns of the table.
+        """
+        table = self.tables[table_name]
+        keys = {column.name for column in table.columns if column.primary_key}
+        keys.update(NATURAL_KEYS.get(table_name, []))
+        keys.update(ROLLUPS.get(table_name, []))
+        for left, right in RELATIONSHIPS:
+            for side in (left, right):
+                name, column = side.split(".")
+                if name == table_name:
+                    keys.add(column)
+        return keys
+
+    def describe(
+        self,
+        tables: Union[Iterable[str], None] = None,
+        columns: Union[Dict[str, Set[str]], None] = None,
+    ) -> str:
+        """
+        Describe tables of the catalog for a prompt.
+
+        Args:
+            tables (Union[Iterable[str], None]): Tables to describe. All
+                tables if None.
+            columns (Union[Dict[str, Set[str]], None]): Columns to keep per
+                table. All columns of the tables missing from it.
+
+        Returns:
+            str: One line per table with its typed columns, the distinct
+                 values and samples of text columns and the indexes
+                 leading with a described column, followed by the
+                 relationships between the tables.
+        """
+        names = [
+            name
+            for name in (self.tables if tables is None else tables)
+            if name in self.tables
+        ]
+        columns = columns or {}
+        lines = []
+        for name in names:
+            table = self.tables[name]
+            keep = columns.get(name)
+            parts = []
+            for column in table.columns:
+                if keep is not None and column.name not in keep:
+                    continue
+                part = f"{column.name} {column.type}"
+                if column.type.upper() == "TEXT" and column.samples:
+                    samples = ", ".join(repr(v) for v in column.samples)
+                    part += (
+                        f" ~{column.distinct_values:,} distinct e.g. "
+                        f"{samples}"
+                    )
+                parts.append(part)
+            rows = f" ~{table.row_count:,} rows" if table.row_count else ""
+            line = f"- {name}{rows} ({', '.join(parts)})"
+            indexes = [
+                f"({', '.join(indexed)})"
+                for indexed in table.indexes.values()
+                if indexed and (keep is None or indexed[0] in keep)
+            ]
+            if indexes:
+                line += f" indexed on {', '.join(indexes)}"
+            lines.append(line)
+
+        relationships = [
+            f"- {left} = {right}"
+            for left, right in RELATIONSHIPS
+            if left.split(".")[0] in names and right.split(".")[0] in names
+        ]
+        if relationships:
+            lines += ["", "Table Relationships:"] + relationships
+        if any(name in ROLLUPS for name in names):
+            lines += ["", "Rollup Tables:", ROLLUP_NOTES]
+        return "\n".join(lines)
+
+    def relevant_schema(self, question: str) -> str:
+        """
+        Describe only the tables and columns a question refers to.
+
+        A column is relevant when one of its name words is similar to a
+        question word, or when the question mentions one of its sample
+        values. Tables with a relevant column or named by the question are
+        described, rollups only for relevant measures and dimensions. Wide
+        tables are reduced to their key columns and the relevant ones.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            str: The pruned schema, or the full schema if nothing matched.
+        """
+        words = _tokens(question) - STOP_WORDS
+        words = {word for word in words if len(word) >= 3}
+        for word in list(words):
+            words.update(SYNONYMS.get(word, []))
+
+        tables, columns = [], {}
+        for name, table in self.tables.items():
+            matched = {
+                column.name
+                for column in table.columns
+                if _matches(words, _tokens(column.name))
+                or words & {str(v).lower() for v in column.samples}
+            }
+            if name in ROLLUPS:
+                # Rollups only help when the question asks for one of their
+                # measures grouped by all of their dimensions.
+                dimensions = set(ROLLUPS[name]) - {"YEAR", "MONTH"}
+                relevant = bool(matched - self.key_columns(name)) and (
+                    dimensions <= matched
+                )
+            else:
+                relevant = bool(matched) or _matches(words, _tokens(name))
+            if not relevant:
+                continue
+            tables.append(name)
+            if len(table.columns) > PRUNED_TABLE_COLUMNS:
+                columns[name] = matched | self.key_columns(name)
+
+        if not tables:
+            return self.describe()
+        return self.describe(tables, columns)
+
+    def query_schema(self, query: str) -> str:
+        """
+        Describe the tables referenced by a SQL query.
+
+        Args:
+            query (str): The SQL query.
+
+        Returns:
+            str: The schema of the referenced tables, or the full schema
+                 if the query references no known table.
+        """
+        tables = [
+            name
+            for name in self.tables
+            if re.search(rf"\b{name}\b", query, re.IGNORECASE)
+        ]
+        return self.describe(tables) if tables else self.describe()
+
+    def __repr__(self) -> str:
+        return f"SchemaCatalog(tables={list(self.tables)})"
+
+
+_catalogs: Dict[str, tuple] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db_name: str) -> Union[SchemaCatalog, None]:
+    """Get the catalog of a database, introspecting it again whenever its
+       data version changes.
+
+    Args:
+        db_name (str): Database name
+
+    Returns:
+        Union[SchemaCatalog, None]: The catalog, or None if the database
+                                    cannot be read.
+    """
+    key = str(Path(db_name).resolve())
+    pool = get_pool(key)
+    version = pool.data_version()
+    with _catalogs_lock:
+        cached = _catalogs.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            catalog = SchemaCatalog.from_connection(pool.connection())
+        except sqlite3.Error as e:
+            print(f"Could not introspect {key}: {e}")
+            return None
+        _catalogs[key] = (version, catalog)
+        return catalog
+
+
+def database_schema(db_name: str) -> str:
+    """Describe every table of a database.
+
+    Args:
+        db_name (str): Database name
+
+    Returns:
+        str: The introspected schema, or the static schema if the database
+             cannot be introspected.
+    """
+    catalog = get_catalog(db_name)
+    return catalog.describe() if catalog else SCHEMA
+
+
+def relevant_schema(db_name: str, question: str) -> str:
+    """Describe the part of a database schema relevant to a question.
+
+    Args:
+        db_name (str): Database name
+        question (str): The user question.
+
+    Returns:
+        str: The pruned schema, or the static schema if the database
+             cannot be introspected.
+    """
+    catalog = get_catalog(db_name)
+    return catalog.relevant_schema(question) if catalog else SCHEMA
+
+
+def query_schema(db_name: str, query: str) -> str:
+    """Describe the tables of a database referenced by a SQL query.
+
+    Args:
+        db_name (str): Database name
+        query (str): The SQL query.
+
+    Returns:
+        str: The schema of the referenced tables, or the static schema if
+             the database cannot be introspected.
+    """
+    catalog = get_catalog(db_name)
+    return catalog.query_schema(query) if catalog else SCHEMA
@@ -1,37 +1,491 @@
+import argparse
+import csv
 import sqlite3
+import time
 import pandas as pd
 from pathlib import Path
 
+from sqlite_db.db_constants import (
+    TABLE_COLUMNS,
+    NATURAL_KEYS,
+    INDEXES,
+    COVERING_INDEXES,
+)
+from sqlite_db.rollups import SOURCE_TABLE, refresh_rollups
 
-def csv_to_sqlite(db_name: str, csv_files: dict, n_rows: int = None):
+PANDAS_DTYPES = {"INTEGER": "Int64", "REAL": "float64", "TEXT": "string"}
+DEFAULT_CHUNK_SIZE = 200000
+
+# Fast but unsafe settings used while the database is being built.
+BUILD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+}
+# Settings restored once the build is complete.
+SERVE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+
+
+def column_dtypes(table_name: str) -> dict:
+    """Get the pandas dtypes matching the column types of a table
+
+    Args:
+        table_name (str): Table name
+
+    Returns:
+        dict: Dictionary with column names as keys and dtypes as values
+    """
+    return {
+        column: PANDAS_DTYPES[column_type.split()[0]]
+        for column, column_type in TABLE_COLUMNS[table_name].items()
+    }
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict):
+    """Apply PRAGMA settings to a connection
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        pragmas (dict): Dictionary with pragma names as keys and values
+    """
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+
+
+def create_table(conn: sqlite3.Connection, table_name: str):
+    """Create an empty typed table, replacing any existing one
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        table_name (str): Table name
+    """
+    columns = ", ".join(
+        f"{column} {column_type}"
+        for column, column_type in TABLE_COLUMNS[table_name].items()
+    )
+    conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+    conn.execute(f"CREATE TABLE {table_name} ({columns})")
+
+
+def create_indexes(conn: sqlite3.Connection, covering: bool = False):
+    """Create the indexes of the loaded tables and gather statistics
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        covering (bool): Whether to also create the covering indexes for
+                         delay aggregations
+    """
+    indexes = dict(INDEXES)
+    if covering:
+        indexes.update(COVERING_INDEXES)
+
+    tables = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    }
+    for index_name, (table_name, columns) in indexes.items():
+        if table_name not in tables:
+            continue
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table_name} ({', '.join(columns)})"
+        )
+        print(f"Created index {index_name}")
+    conn.execute("ANALYZE")
+
+
+def insert_query(table_name: str, target: str = None) -> str:
+    """Build the INSERT statement of a table described in TABLE_COLUMNS
+
+    Args:
+        table_name (str): Table name
+        target (str, optional): Table to insert into, table_name if None
+
+    Returns:
+        str: INSERT statement taking one parameter per column
+    """
+    columns = list(TABLE_COLUMNS[table_name])
+    return (
+        f"INSERT INTO {target or table_name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+
+def read_chunks(
+    table_name: str,
+    csv_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    skip_rows: int = 0,
+    n_rows: int = None,
+):
+    """Read a CSV file in chunks of rows ready to be inserted
+
+    Args:
+        table_name (str): Table name, described in TABLE_COLUMNS
+        csv_file (str): Path of the CSV file
+        chunk_size (int, optional): Number of rows per chunk
+        skip_rows (int, optional): Number of leading rows to skip
+        n_rows (int, optional): Maximum number of rows to read
+
+    Yields:
+        List[Tuple]: Rows in column order, with None for missing values
+    """
+    dtypes = column_dtypes(table_name)
+    columns = list(dtypes)
+    with open(csv_file, newline="") as handle:
+        header = next(csv.reader([handle.readline()]))
+        # Skip the leading rows without parsing them.
+        for _ in range(skip_rows):
+            handle.readline()
+
+        reader = pd.read_csv(
+            handle,
+            header=None,
+            names=header,
+            usecols=columns,
+            dtype=dtypes,
+            chunksize=chunk_size,
+            nrows=n_rows,
+        )
+        for chunk in reader:
+            chunk = chunk[columns]
+            rows = chunk.astype(object).where(chunk.notna(), None)
+            yield list(rows.itertuples(index=False, name=None))
+
+
+def _create_progress_table(conn: sqlite3.Connection):
+    """Create the table tracking the progress of the CSV imports"""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS _ingest_progress ("
+        "table_name TEXT PRIMARY KEY, source TEXT NOT NULL, "
+        "rows_loaded INTEGER NOT NULL, completed INTEGER NOT NULL)"
+    )
+
+
+def _loaded_rows(conn: sqlite3.Connection, table_name: str, source: str):
+    """Get the import progress of a source into a table
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        table_name (str): Table name
+        source (str): Path of the CSV file
+
+    Returns:
+        Tuple[int, bool]: Number of loaded rows and whether the import was
+                          completed. No rows if the table was loaded from
+                          another source or not at all
+    """
+    row = conn.execute(
+        "SELECT source, rows_loaded, completed FROM _ingest_progress "
+        "WHERE table_name = ?",
+        (table_name,),
+    ).fetchone()
+    if row is None or row[0] != source:
+        return 0, False
+    return row[1], bool(row[2])
+
+
+def _record_progress(
+    conn: sqlite3.Connection,
+    table_name: str,
+    source: str,
+    rows_loaded: int,
+    completed: bool = False,
+):
+    """Record the number of rows of a source loaded into a table"""
+    conn.execute(
+        "INSERT OR REPLACE INTO _ingest_progress VALUES (?, ?, ?, ?)",
+        (table_name, source, rows_loaded, int(completed)),
+    )
+
+
+def ingest_csv(
+    conn: sqlite3.Connection,
+    table_name: str,
+    csv_file: str,
+    n_rows: int = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = False,
+) -> int:
+    """Stream a CSV file into a typed table in chunks
+
+    Every chunk is inserted with executemany in its own transaction,
+    together with the number of rows loaded so far, so that an interrupted
+    import can be resumed from the last committed chunk.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        table_name (str): Table name, described in TABLE_COLUMNS
+        csv_file (str): Path of the CSV file
+        n_rows (int, optional): Maximum number of rows to consider
+        chunk_size (int, optional): Number of rows per chunk
+        resume (bool, optional): Whether to continue a previous import of
+                                 the same file instead of starting over
+
+    Returns:
+        int: Number of rows loaded into the table
+    """
+    source = str(Path(csv_file).resolve())
+    _create_progress_table(conn)
+    rows_loaded, completed = (
+        _loaded_rows(conn, table_name, source) if resume else (0, False)
+    )
+    if completed:
+        print(f"Skipping {table_name}, already imported")
+        return rows_loaded
+    if rows_loaded == 0:
+        create_table(conn, table_name)
+        _record_progress(conn, table_name, source, 0)
+        conn.commit()
+    else:
+        # Drop rows of a chunk that was written but never committed.
+        conn.execute(
+            f"DELETE FROM {table_name} WHERE rowid > ?", (rows_loaded,)
+        )
+        conn.commit()
+        print(f"Resuming {table_name} after {rows_loaded:,} rows")
+
+    remaining = n_rows - rows_loaded if n_rows else None
+    if remaining is not None and remaining <= 0:
+        return rows_loaded
+
+    insert = insert_query(table_name)
+    start = time.perf_counter()
+    new_rows = 0
+    chunks = read_chunks(
+        table_name,
+        csv_file,
+        chunk_size,
+        skip_rows=rows_loaded,
+        n_rows=remaining,
+    )
+    for rows in chunks:
+        conn.executemany(insert, rows)
+        rows_loaded += len(rows)
+        new_rows += len(rows)
+        _record_progress(conn, table_name, source, rows_loaded)
+        conn.commit()
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"{table_name}: {rows_loaded:,} rows loaded "
+            f"({new_rows / elapsed:,.0f} rows/s)"
+        )
+
+    # The file is exhausted unless the reader stopped at n_rows.
+    completed = remaining is None or new_rows < remaining
+    _record_progress(conn, table_name, source, rows_loaded, completed)
+    conn.commit()
+    return rows_loaded
+
+
+def csv_to_sqlite(
+    db_name: str,
+    csv_files: dict,
+    n_rows: int = None,
+    covering_indexes: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = False,
+):
     """Import CSV files into a SQLite database
 
+    Tables described in db_constants.TABLE_COLUMNS are streamed in chunks
+    into tables with their column types and keys, other tables are typed
+    by pandas. The rollup tables are rebuilt once flights are loaded.
+
     Args:
         db_name (str): Database name
         csv_files (dict): Dictionary with table names as keys and
                           CSV file paths as values
         n_rows (int, optional): Maximum number of rows to consider
+        covering_indexes (bool, optional): Whether to create the covering
+                                           indexes for delay aggregations
+        chunk_size (int, optional): Number of rows per chunk
+        resume (bool, optional): Whether to continue an interrupted import
     """
     conn = sqlite3.connect(db_name)
+    apply_pragmas(conn, BUILD_PRAGMAS)
 
     for table_name, f in csv_files.items():
-        df = pd.read_csv(f, nrows=n_rows) if n_rows else pd.read_csv(f)
-        # Write the DataFrame to the SQLite database
-        df.to_sql(table_name, conn, if_exists="replace", index=False)
+        if table_name in TABLE_COLUMNS:
+            ingest_csv(
+                conn,
+                table_name,
+                f,
+                n_rows=n_rows,
+                chunk_size=chunk_size,
+                resume=resume,
+            )
+        else:
+            df = pd.read_csv(f, nrows=n_rows) if n_rows else pd.read_csv(f)
+            # Write the DataFrame to the SQLite database
+            df.to_sql(table_name, conn, if_exists="replace", index=False)
 
         print(f"Imported {f} into table {table_name}")
 
+    if SOURCE_TABLE in csv_files:
+        refresh_rollups(conn, full=True)
+    create_indexes(conn, covering=covering_indexes)
+    bump_data_version(conn)
     conn.commit()
+    apply_pragmas(conn, SERVE_PRAGMAS)
     conn.close()
     print("All tables imported successfully!")
 
 
+def bump_data_version(conn: sqlite3.Connection) -> int:
+    """Increment the data version stored in the database header
+
+    Caches of query results compare it to detect changed data.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+
+    Returns:
+        int: The new data version
+    """
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    conn.execute(f"PRAGMA user_version={version + 1}")
+    return version + 1
+
+
+def _record_watermark(
+    conn: sqlite3.Connection, source: str, rows_read: int, rows_added: int
+):
+    """Record an append together with the latest flight date loaded"""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS _ingest_watermark ("
+        "id INTEGER PRIMARY KEY, source TEXT NOT NULL, "
+        "loaded_at REAL NOT NULL, rows_read INTEGER NOT NULL, "
+        "rows_added INTEGER NOT NULL, last_date TEXT, "
+        "data_version INTEGER NOT NULL)"
+    )
+    last = conn.execute(
+        f"SELECT YEAR, MONTH, DAY FROM {SOURCE_TABLE} "
+        "ORDER BY YEAR DESC, MONTH DESC, DAY DESC LIMIT 1"
+    ).fetchone()
+    last_date = "{:04d}-{:02d}-{:02d}".format(*last) if last else None
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    conn.execute(
+        "INSERT INTO _ingest_watermark (source, loaded_at, rows_read, "
+        "rows_added, last_date, data_version) VALUES (?, ?, ?, ?, ?, ?)",
+        (source, time.time(), rows_read, rows_added, last_date, version),
+    )
+
+
+def append_flights(
+    db_name: str, csv_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Append the new flights of a CSV file to an existing database
+
+    The file is staged in a temporary table, then the flights missing from
+    the database according to their natural key are inserted, the affected
+    rollup months refreshed, the watermark recorded and the data version
+    bumped. Everything is committed as one transaction in WAL mode, so
+    readers keep seeing the previous data until the append is complete.
+
+    Args:
+        db_name (str): Database name
+        csv_file (str): Path of the CSV file with new flights
+        chunk_size (int, optional): Number of rows per chunk
+
+    Returns:
+        int: Number of flights added
+    """
+    conn = sqlite3.connect(db_name, timeout=60.0)
+    apply_pragmas(conn, SERVE_PRAGMAS)
+
+    staging = f"temp._staging_{SOURCE_TABLE}"
+    conn.execute(f"DROP TABLE IF EXISTS {staging}")
+    conn.execute(
+        f"CREATE TABLE {staging} AS SELECT * FROM {SOURCE_TABLE} LIMIT 0"
+    )
+    rows_read = 0
+    insert = insert_query(SOURCE_TABLE, target=staging)
+    for rows in read_chunks(SOURCE_TABLE, csv_file, chunk_size):
+        conn.executemany(insert, rows)
+        rows_read += len(rows)
+
+    columns = ", ".join(TABLE_COLUMNS[SOURCE_TABLE])
+    key = NATURAL_KEYS[SOURCE_TABLE]
+    cursor = conn.execute(
+        f"INSERT INTO {SOURCE_TABLE} ({columns}) "
+        f"SELECT {columns} FROM {staging} AS s "
+        f"WHERE s.rowid IN (SELECT MIN(rowid) FROM {staging} "
+        f"GROUP BY {', '.join(key)}) "
+        f"AND NOT EXISTS (SELECT 1 FROM {SOURCE_TABLE} AS f WHERE "
+        + " AND ".join(f"f.{column} = s.{column}" for column in key)
+        + ")"
+    )
+    rows_added = cursor.rowcount
+
+    if rows_added:
+        refresh_rollups(conn)
+        bump_data_version(conn)
+    source = str(Path(csv_file).resolve())
+    _record_watermark(conn, source, rows_read, rows_added)
+    conn.commit()
+
+    conn.execute(f"DROP TABLE {staging}")
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    print(f"Appended {rows_added:,} of {rows_read:,} flights from {csv_file}")
+    return rows_added
+
+
 def main():
+    parser = argparse.ArgumentParser(
+        description="Import the raw flight CSV files into SQLite"
+    )
+    parser.add_argument(
+        "--n-rows",
+        type=int,
+        default=None,
+        help="Maximum number of rows per file, all rows if omitted",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted import",
+    )
+    parser.add_argument(
+        "--append",
+        type=Path,
+        default=None,
+        help="Append the new flights of a CSV file to the database",
+    )
+    parser.add_argument(
+        "--covering-indexes",
+        action="store_true",
+        help="Create covering indexes for delay aggregations",
+    )
+    args = parser.parse_args()
+
     raw_csv_path = Path(__file__).parent / "raw_data"
     DATABASE = Path(__file__).parent / "flights.db"
 
+    if args.append:
+        append_flights(DATABASE, args.append, chunk_size=args.chunk_size)
+        return
+
     csv_files = {file.stem: file for file in raw_csv_path.glob("*.csv")}
-    csv_to_sqlite(DATABASE, csv_files, n_rows=10000)
+    csv_to_sqlite(
+        DATABASE,
+        csv_files,
+        n_rows=args.n_rows,
+        covering_indexes=args.covering_indexes,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+    )
 
 
 if __name__ == "__main__":
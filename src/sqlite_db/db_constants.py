@@ -1,6 +1,10 @@
 DB_ENGINE = "SQLite"
 TABLES = ["airlines", "airports", "flights"]
-SCHEMA = """
+ROLLUP_NOTES = """\
+- Averages are SUM(<X>_SUM) / SUM(<X>_COUNT), rates are
+  SUM(CANCELLED_FLIGHTS) * 1.0 / SUM(FLIGHTS). DELAYED_ARRIVALS counts
+  arrivals more than 15 minutes late."""
+SCHEMA = f"""
 Database Schema:
 - airlines (IATA_CODE, AIRLINE)
 - airports (IATA_CODE, AIRPORT, CITY, STATE, COUNTRY, LATITUDE, LONGITUDE)
@@ -18,4 +22,154 @@ Table Relationships:
 - airlines.IATA_CODE = flights.AIRLINE
 - airports.IATA_CODE = flights.ORIGIN_AIRPORT
 - airports.IATA_CODE = flights.DESTINATION_AIRPORT
+
+Rollup Tables (pre-aggregated flights, prefer them for aggregates):
+- rollup_airline_month (YEAR, MONTH, AIRLINE, <measures>)
+- rollup_origin_month (YEAR, MONTH, ORIGIN_AIRPORT, <measures>)
+- rollup_route_month (
+    YEAR, MONTH, ORIGIN_AIRPORT, DESTINATION_AIRPORT, <measures>
+)
+- rollup_airline_day_of_week (YEAR, MONTH, AIRLINE, DAY_OF_WEEK, <measures>)
+- <measures>: FLIGHTS, CANCELLED_FLIGHTS, DIVERTED_FLIGHTS,
+    DEPARTURE_DELAY_SUM, DEPARTURE_DELAY_COUNT, ARRIVAL_DELAY_SUM,
+    ARRIVAL_DELAY_COUNT, DELAYED_ARRIVALS, DISTANCE_SUM
+{ROLLUP_NOTES}
 """
+
+# Column types of every table, in CSV order. Constraints follow the type.
+TABLE_COLUMNS = {
+    "airlines": {
+        "IATA_CODE": "TEXT PRIMARY KEY",
+        "AIRLINE": "TEXT NOT NULL",
+    },
+    "airports": {
+        "IATA_CODE": "TEXT PRIMARY KEY",
+        "AIRPORT": "TEXT NOT NULL",
+        "CITY": "TEXT",
+        "STATE": "TEXT",
+        "COUNTRY": "TEXT",
+        "LATITUDE": "REAL",
+        "LONGITUDE": "REAL",
+    },
+    "flights": {
+        "YEAR": "INTEGER NOT NULL",
+        "MONTH": "INTEGER NOT NULL",
+        "DAY": "INTEGER NOT NULL",
+        "DAY_OF_WEEK": "INTEGER NOT NULL",
+        "AIRLINE": "TEXT NOT NULL",
+        "FLIGHT_NUMBER": "INTEGER NOT NULL",
+        "TAIL_NUMBER": "TEXT",
+        "ORIGIN_AIRPORT": "TEXT NOT NULL",
+        "DESTINATION_AIRPORT": "TEXT NOT NULL",
+        "SCHEDULED_DEPARTURE": "INTEGER",
+        "DEPARTURE_TIME": "REAL",
+        "DEPARTURE_DELAY": "REAL",
+        "TAXI_OUT": "REAL",
+        "WHEELS_OFF": "REAL",
+        "SCHEDULED_TIME": "REAL",
+        "ELAPSED_TIME": "REAL",
+        "AIR_TIME": "REAL",
+        "DISTANCE": "INTEGER",
+        "WHEELS_ON": "REAL",
+        "TAXI_IN": "REAL",
+        "SCHEDULED_ARRIVAL": "INTEGER",
+        "ARRIVAL_TIME": "REAL",
+        "ARRIVAL_DELAY": "REAL",
+        "DIVERTED": "INTEGER",
+        "CANCELLED": "INTEGER",
+        "CANCELLATION_REASON": "TEXT",
+        "AIR_SYSTEM_DELAY": "REAL",
+        "SECURITY_DELAY": "REAL",
+        "AIRLINE_DELAY": "REAL",
+        "LATE_AIRCRAFT_DELAY": "REAL",
+        "WEATHER_DELAY": "REAL",
+    },
+}
+
+# Join conditions between the tables, described with the schema.
+RELATIONSHIPS = [
+    ("airlines.IATA_CODE", "flights.AIRLINE"),
+    ("airports.IATA_CODE", "flights.ORIGIN_AIRPORT"),
+    ("airports.IATA_CODE", "flights.DESTINATION_AIRPORT"),
+]
+
+# Columns identifying a row, used to skip duplicates when appending.
+NATURAL_KEYS = {
+    "flights": [
+        "YEAR",
+        "MONTH",
+        "DAY",
+        "AIRLINE",
+        "FLIGHT_NUMBER",
+        "ORIGIN_AIRPORT",
+    ],
+}
+
+# Indexes on the join keys and date columns of flights. The date index
+# extends to the natural key so that duplicate checks are index lookups.
+INDEXES = {
+    "idx_flights_date": ("flights", NATURAL_KEYS["flights"]),
+    "idx_flights_airline_date": ("flights", ["AIRLINE", "YEAR", "MONTH"]),
+    "idx_flights_origin_date": (
+        "flights",
+        ["ORIGIN_AIRPORT", "YEAR", "MONTH"],
+    ),
+    "idx_flights_destination_date": (
+        "flights",
+        ["DESTINATION_AIRPORT", "YEAR", "MONTH"],
+    ),
+    "idx_flights_day_of_week": ("flights", ["DAY_OF_WEEK"]),
+}
+
+# Optional covering indexes answering delay aggregations without
+# touching the table rows.
+COVERING_INDEXES = {
+    "idx_flights_airline_delays": (
+        "flights",
+        [
+            "AIRLINE",
+            "MONTH",
+            "DEPARTURE_DELAY",
+            "ARRIVAL_DELAY",
+            "CANCELLED",
+        ],
+    ),
+    "idx_flights_origin_delays": (
+        "flights",
+        [
+            "ORIGIN_AIRPORT",
+            "MONTH",
+            "DEPARTURE_DELAY",
+            "ARRIVAL_DELAY",
+            "CANCELLED",
+        ],
+    ),
+}
+
+# Measures of the rollup tables. Sums and counts are stored separately so
+# that averages stay exact when rollup rows are aggregated further.
+ROLLUP_MEASURES = {
+    "FLIGHTS": "COUNT(*)",
+    "CANCELLED_FLIGHTS": "SUM(CANCELLED)",
+    "DIVERTED_FLIGHTS": "SUM(DIVERTED)",
+    "DEPARTURE_DELAY_SUM": "SUM(DEPARTURE_DELAY)",
+    "DEPARTURE_DELAY_COUNT": "COUNT(DEPARTURE_DELAY)",
+    "ARRIVAL_DELAY_SUM": "SUM(ARRIVAL_DELAY)",
+    "ARRIVAL_DELAY_COUNT": "COUNT(ARRIVAL_DELAY)",
+    "DELAYED_ARRIVALS": "SUM(ARRIVAL_DELAY > 15)",
+    "DISTANCE_SUM": "SUM(DISTANCE)",
+}
+
+# Grouping columns of the rollup tables over flights. Every rollup is
+# grouped by YEAR and MONTH first so it can be refreshed month by month.
+ROLLUPS = {
+    "rollup_airline_month": ["YEAR", "MONTH", "AIRLINE"],
+    "rollup_origin_month": ["YEAR", "MONTH", "ORIGIN_AIRPORT"],
+    "rollup_route_month": [
+        "YEAR",
+        "MONTH",
+        "ORIGIN_AIRPORT",
+        "DESTINATION_AIRPORT",
+    ],
+    "rollup_airline_day_of_week": ["YEAR", "MONTH", "AIRLINE", "DAY_OF_WEEK"],
+}
@@ -1,23 +1,298 @@
 import sqlite3
-import pandas as pd
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Sequence, Union
 
+from config.db_config import DBConfig
+from utils.metrics import SIZE_BUCKETS, metrics
+from .pool import get_pool
+from .result import ColumnarResult
 
-def execute_query(db_name: str, query: str):
+# Prefix of the messages of statements rejected by SQLite itself.
+SQL_ERROR_PREFIX = "SQL Error"
+
+
+def strip_statement(query: str) -> str:
+    """Remove surrounding whitespace and trailing semicolons of a query.
+
+    Args:
+        query (str): SQL Query
+
+    Returns:
+        str: The bare statement, safe to nest as a subquery.
+    """
+    return query.strip().rstrip(";").strip()
+
+
+def limit_query(query: str) -> str:
+    """Wrap a query so that only a window of its rows is returned.
+
+    The query is nested on its own lines so that trailing comments cannot
+    swallow the closing parenthesis.
+
+    Args:
+        query (str): SQL Query
+
+    Returns:
+        str: Query taking LIMIT and OFFSET parameters.
+    """
+    return f"SELECT * FROM (\n{strip_statement(query)}\n) LIMIT ? OFFSET ?"
+
+
+def count_query(query: str) -> str:
+    """Wrap a query so that it counts its rows up to a cap.
+
+    Args:
+        query (str): SQL Query
+
+    Returns:
+        str: Query taking the cap as LIMIT parameter.
+    """
+    return (
+        "SELECT COUNT(*) FROM (SELECT 1 FROM (\n"
+        f"{strip_statement(query)}\n) LIMIT ?)"
+    )
+
+
+@contextmanager
+def _interruptible(
+    conn: sqlite3.Connection,
+    deadline: Union[float, None],
+    cancel_event: Union[threading.Event, None],
+):
+    """Interrupt statements of the connection past the deadline or once
+       the cancel event is set.
+
+    Args:
+        conn (sqlite3.Connection): Connection running the statements.
+        deadline (Union[float, None]): time.monotonic() deadline.
+        cancel_event (Union[threading.Event, None]): Cancellation event.
+    """
+    if deadline is None and cancel_event is None:
+        yield
+        return
+
+    def should_interrupt() -> int:
+        if cancel_event is not None and cancel_event.is_set():
+            return 1
+        if deadline is not None and time.monotonic() > deadline:
+            return 1
+        return 0
+
+    conn.set_progress_handler(should_interrupt, DBConfig.progress_steps)
+    try:
+        yield
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def _error_message(
+    e: Exception,
+    timeout: Union[float, None],
+    deadline: Union[float, None],
+    cancel_event: Union[threading.Event, None],
+) -> str:
+    """Describe why a statement failed.
+
+    Args:
+        e (Exception): The raised exception.
+        timeout (Union[float, None]): The timeout of the statement.
+        deadline (Union[float, None]): time.monotonic() deadline.
+        cancel_event (Union[threading.Event, None]): Cancellation event.
+
+    Returns:
+        str: The error message.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return "Cancelled: The query was cancelled"
+    if deadline is not None and time.monotonic() > deadline:
+        return f"Timeout Error: Query exceeded {timeout} seconds"
+    return f"{SQL_ERROR_PREFIX}: {str(e)}"
+
+
+def _record_error(message: str) -> str:
+    """Count a failed statement by the kind of its error message.
+
+    Args:
+        message (str): The error message.
+
+    Returns:
+        str: The same error message.
+    """
+    kind = message.split(":", 1)[0]
+    metrics.increment("sqlite_errors_total", labels={"error": kind})
+    return message
+
+
+def _deadline(timeout: Union[float, None]) -> Union[float, None]:
+    return time.monotonic() + timeout if timeout is not None else None
+
+
+def execute_query(
+    db_name: str,
+    query: str,
+    timeout: Union[float, None] = None,
+    cancel_event: Union[threading.Event, None] = None,
+    limit: Union[int, None] = None,
+    offset: int = 0,
+    params: Sequence = (),
+):
     """Execute SQL query from given database
 
     Args:
         db_name (str): Database name
         query (str): SQL Query
+        timeout (Union[float, None]): Seconds after which the query is
+                                      interrupted. No limit if None.
+        cancel_event (Union[threading.Event, None]): Event which interrupts
+                                                     the query once set.
+        limit (Union[int, None]): Maximum number of rows to fetch. All
+                                  rows if None.
+        offset (int): Number of leading rows to skip when limited.
+        params (Sequence): Values of the ? parameters of the query.
+
+    Returns:
+        Tuple: The ColumnarResult and the error message.
     """
-    conn = sqlite3.connect(db_name)
+    deadline = _deadline(timeout)
     try:
-        df = pd.read_sql_query(query, conn)
-        if df.empty:
+        conn = get_pool(db_name).connection()
+        with _interruptible(conn, deadline, cancel_event), metrics.timer(
+            "sqlite_query_seconds", {"operation": "query"}
+        ):
+            if limit is None:
+                cursor = conn.execute(query, params)
+            else:
+                cursor = conn.execute(
+                    limit_query(query), (*params, limit, offset)
+                )
+            rows = cursor.fetchall()
+        metrics.observe(
+            "sqlite_rows_returned", len(rows), buckets=SIZE_BUCKETS
+        )
+        if not rows:
             return None, "No results found"
-        return df.to_dict("records"), None
-    except pd.errors.DatabaseError as e:
-        return None, f"SQL Error: {str(e)}"
+        columns = [description[0] for description in cursor.description]
+        return ColumnarResult.from_rows(columns, rows), None
+    except sqlite3.Error as e:
+        return None, _record_error(
+            _error_message(e, timeout, deadline, cancel_event)
+        )
     except Exception as e:
-        return None, f"Unexpected Error: {str(e)}"
-    finally:
-        conn.close()
+        return None, _record_error(f"Unexpected Error: {str(e)}")
+
+
+def count_rows(
+    db_name: str,
+    query: str,
+    cap: int,
+    timeout: Union[float, None] = None,
+    cancel_event: Union[threading.Event, None] = None,
+    params: Sequence = (),
+):
+    """Count the rows of a query result, stopping at a cap
+
+    Args:
+        db_name (str): Database name
+        query (str): SQL Query
+        cap (int): Maximum number of rows to count.
+        timeout (Union[float, None]): Seconds after which counting is
+                                      interrupted. No limit if None.
+        cancel_event (Union[threading.Event, None]): Event which interrupts
+                                                     counting once set.
+        params (Sequence): Values of the ? parameters of the query.
+    """
+    deadline = _deadline(timeout)
+    try:
+        conn = get_pool(db_name).connection()
+        with _interruptible(conn, deadline, cancel_event), metrics.timer(
+            "sqlite_query_seconds", {"operation": "count"}
+        ):
+            (count,) = conn.execute(
+                count_query(query), (*params, cap)
+            ).fetchone()
+        return count, None
+    except sqlite3.Error as e:
+        return None, _record_error(
+            _error_message(e, timeout, deadline, cancel_event)
+        )
+
+
+def execute_page(
+    db_name: str,
+    query: str,
+    page: int = 1,
+    page_size: int = 100,
+    count_cap: Union[int, None] = None,
+    timeout: Union[float, None] = None,
+    cancel_event: Union[threading.Event, None] = None,
+    params: Sequence = (),
+    total: Union[int, None] = None,
+    total_capped: bool = False,
+):
+    """Execute SQL query from given database, fetching a single page
+
+    Args:
+        db_name (str): Database name
+        query (str): SQL Query
+        page (int): One-based page number.
+        page_size (int): Number of rows per page.
+        count_cap (Union[int, None]): Maximum number of rows counted for
+                                      the total hint. Not counted if None.
+        timeout (Union[float, None]): Seconds after which the query is
+                                      interrupted. No limit if None.
+        cancel_event (Union[threading.Event, None]): Event which interrupts
+                                                     the query once set.
+        params (Sequence): Values of the ? parameters of the query.
+        total (Union[int, None]): Row count of an earlier page of the
+                                  result, reused instead of counting the
+                                  rows again.
+        total_capped (bool): Whether the reused row count hit the cap.
+
+    Returns:
+        Tuple: The ColumnarResult, the error message and the page info
+               with keys page, page_size, has_more, total and
+               total_capped.
+    """
+    page = max(1, page)
+    # Fetch one extra row to know whether another page follows.
+    result, error = execute_query(
+        db_name,
+        query,
+        timeout=timeout,
+        cancel_event=cancel_event,
+        limit=page_size + 1,
+        offset=(page - 1) * page_size,
+        params=params,
+    )
+    has_more = bool(result) and len(result) > page_size
+    page_info: Dict = {
+        "page": page,
+        "page_size": page_size,
+        "has_more": has_more,
+        "total": None,
+        "total_capped": False,
+    }
+    if result is None:
+        return None, error, page_info
+    result = result[:page_size]
+
+    if count_cap is not None and not has_more:
+        page_info["total"] = (page - 1) * page_size + len(result)
+    elif count_cap is not None and total is not None:
+        page_info["total"] = total
+        page_info["total_capped"] = total_capped
+    elif count_cap is not None:
+        total, _ = count_rows(
+            db_name,
+            query,
+            count_cap,
+            timeout=timeout,
+            cancel_event=cancel_event,
+            params=params,
+        )
+        if total is not None:
+            page_info["total"] = total
+            page_info["total_capped"] = total >= count_cap
+    return result, None, page_info
@@ -0,0 +1,266 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Union
+
+from config.db_config import DBConfig
+from utils.metrics import metrics
+from .execute import execute_query, execute_page
+
+
+class QueryExecutor:
+    """
+    Runs SQL queries on a bounded pool of worker threads so that slow
+    queries never block the event loop.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DBConfig.max_workers,
+        timeout: Union[float, None] = DBConfig.query_timeout,
+    ) -> None:
+        """
+        Initialize the QueryExecutor instance.
+
+        Args:
+            max_workers (int): Number of worker threads.
+            timeout (Union[float, None]): Default seconds after which a
+                                          query is interrupted.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sqlite-query"
+        )
+
+    async def _submit(
+        self, func, timeout: Union[float, None] = None, *args, **kwargs
+    ):
+        """
+        Run a blocking query function on a worker thread.
+
+        Cancelling the awaiting task interrupts the running query.
+
+        Args:
+            func: Query function accepting timeout and cancel_event.
+            timeout (Union[float, None]): Seconds after which the query is
+                                          interrupted. Defaults to the
+                                          executor timeout.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            The return value of the function.
+        """
+        cancel_event = threading.Event()
+        call = partial(
+            func,
+            *args,
+            timeout=timeout if timeout is not None else self.timeout,
+            cancel_event=cancel_event,
+            **kwargs,
+        )
+        return await self._run(call, cancel_event)
+
+    async def _run(
+        self, call, cancel_event: Union[threading.Event, None] = None
+    ):
+        """
+        Run a blocking call on a worker thread.
+
+        Args:
+            call: Function without arguments.
+            cancel_event (Union[threading.Event, None]): Event set when
+                the awaiting task is cancelled.
+
+        Returns:
+            The return value of the call.
+        """
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def run_call():
+            # Time spent waiting for a free worker thread.
+            metrics.observe(
+                "sqlite_queue_wait_seconds", time.perf_counter() - submitted
+            )
+            return call()
+
+        future = loop.run_in_executor(self._executor, run_call)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if cancel_event is not None:
+                cancel_event.set()
+            raise
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Run another blocking database function, such as a validation or a
+        schema introspection, on a worker thread.
+
+        Args:
+            func: The function.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            The return value of the function.
+        """
+        return await self._run(partial(func, *args, **kwargs))
+
+    async def run(
+        self,
+        db_name: str,
+        query: str,
+        timeout: Union[float, None] = None,
+        **kwargs,
+    ):
+        """
+        Asynchronously execute SQL query from given database.
+
+        Args:
+            db_name (str): Database name
+            query (str): SQL Query
+            timeout (Union[float, None]): Seconds after which the query is
+                                          interrupted. Defaults to the
+                                          executor timeout.
+            **kwargs: Additional arguments of execute_query.
+
+        Returns:
+            Tuple: The ColumnarResult and the error message, as returned
+                   by execute_query.
+        """
+        return await self._submit(
+            execute_query, timeout, db_name, query, **kwargs
+        )
+
+    async def run_page(
+        self,
+        db_name: str,
+        query: str,
+        timeout: Union[float, None] = None,
+        **kwargs,
+    ):
+        """
+        Asynchronously execute SQL query from given database, fetching a
+        single page.
+
+        Args:
+            db_name (str): Database name
+            query (str): SQL Query
+            timeout (Union[float, None]): Seconds after which the query is
+                                          interrupted. Defaults to the
+                                          executor timeout.
+            **kwargs: Additional arguments of execute_page.
+
+        Returns:
+            Tuple: The ColumnarResult, the error message and the page info,
+                   as returned by execute_page.
+        """
+        return await self._submit(
+            execute_page, timeout, db_name, query, **kwargs
+        )
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads.
+
+        Args:
+            wait (bool): Whether to wait for running queries to finish.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"QueryExecutor(max_workers={self.max_workers}, "
+            f"timeout={self.timeout})"
+        )
+
+
+_executor: Union[QueryExecutor, None] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> QueryExecutor:
+    """Get the shared query executor, creating it if needed.
+
+    Returns:
+        QueryExecutor: The shared executor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = QueryExecutor()
+        return _executor
+
+
+def shutdown_executor(wait: bool = True):
+    """Stop the shared query executor.
+
+    Args:
+        wait (bool): Whether to wait for running queries to finish.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+async def aexecute_query(
+    db_name: str, query: str, timeout: Union[float, None] = None, **kwargs
+):
+    """Asynchronously execute SQL query from given database on the shared
+       query executor.
+
+    Args:
+        db_name (str): Database name
+        query (str): SQL Query
+        timeout (Union[float, None]): Seconds after which the query is
+                                      interrupted.
+        **kwargs: Additional arguments of execute_query.
+
+    Returns:
+        Tuple: The ColumnarResult and the error message.
+    """
+    return await get_executor().run(
+        db_name, query, timeout=timeout, **kwargs
+    )
+
+
+async def aexecute_page(
+    db_name: str, query: str, timeout: Union[float, None] = None, **kwargs
+):
+    """Asynchronously execute SQL query from given database on the shared
+       query executor, fetching a single page.
+
+    Args:
+        db_name (str): Database name
+        query (str): SQL Query
+        timeout (Union[float, None]): Seconds after which the query is
+                                      interrupted.
+        **kwargs: Additional arguments of execute_page.
+
+    Returns:
+        Tuple: The ColumnarResult, the error message and the page info.
+    """
+    return await get_executor().run_page(
+        db_name, query, timeout=timeout, **kwargs
+    )
+
+
+async def acall(func, *args, **kwargs):
+    """Asynchronously run a blocking database function on the shared
+       query executor.
+
+    Args:
+        func: The function.
+        *args: Positional arguments of the function.
+        **kwargs: Keyword arguments of the function.
+
+    Returns:
+        The return value of the function.
+    """
+    return await get_executor().call(func, *args, **kwargs)
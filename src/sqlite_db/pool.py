@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from config.db_config import DBConfig
+
+
+def read_only_uri(db_name: str) -> str:
+    """Build a read-only SQLite URI for the given database file.
+
+    Args:
+        db_name (str): Database name
+
+    Returns:
+        str: URI opening the database with mode=ro.
+    """
+    return f"{Path(db_name).resolve().as_uri()}?mode=ro"
+
+
+class ConnectionPool:
+    """
+    A pool of read-only connections to a SQLite database, holding one
+    connection per worker thread.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        cache_size_kib: int = DBConfig.cache_size_kib,
+        mmap_size: int = DBConfig.mmap_size,
+        health_check_interval: float = DBConfig.health_check_interval,
+        enable_wal: bool = DBConfig.enable_wal,
+    ) -> None:
+        """
+        Initialize the ConnectionPool instance.
+
+        Args:
+            db_name (str): Database name
+            cache_size_kib (int): Page cache size per connection in KiB.
+            mmap_size (int): Bytes of the database file mapped into memory.
+            health_check_interval (float): Seconds between health checks
+                                           of a reused connection.
+            enable_wal (bool): Whether to switch the database to WAL mode.
+        """
+        self.db_name = db_name
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        if enable_wal:
+            self._enable_wal()
+
+    def _enable_wal(self):
+        """Switch the database file to WAL mode.
+
+        The journal mode is persistent, so it only needs a short-lived
+        writable connection once. Read-only deployments keep their mode.
+        """
+        if not Path(self.db_name).exists():
+            return
+        try:
+            conn = sqlite3.connect(self.db_name)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Could not enable WAL mode: {e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and tune a new read-only connection.
+
+        Returns:
+            sqlite3.Connection: The new connection.
+        """
+        conn = sqlite3.connect(
+            read_only_uri(self.db_name), uri=True, check_same_thread=False
+        )
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA query_only=1")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        """Close a connection and forget about it."""
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _ping(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection of the calling thread.
+
+        The connection is created on first use and pinged again once the
+        health check interval has passed, being replaced if it is broken.
+
+        Returns:
+            sqlite3.Connection: A read-only connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        now = time.monotonic()
+        if conn is not None and (
+            now - self._local.checked_at >= self.health_check_interval
+        ):
+            if not self._ping(conn):
+                self._discard(conn)
+                conn = None
+            self._local.checked_at = now
+
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.checked_at = now
+        return conn
+
+    def health_check(self) -> bool:
+        """Check that the database can be queried from the calling thread.
+
+        Returns:
+            bool: Whether the database is reachable.
+        """
+        try:
+            conn = self.connection()
+        except sqlite3.Error:
+            return False
+        if self._ping(conn):
+            return True
+        self._discard(conn)
+        self._local.conn = None
+        return False
+
+    def data_version(self) -> int:
+        """Read the data version bumped by every import or append.
+
+        Returns:
+            int: The data version, 0 if the database cannot be read.
+        """
+        try:
+            (version,) = (
+                self.connection().execute("PRAGMA user_version").fetchone()
+            )
+        except sqlite3.Error:
+            return 0
+        return version
+
+    def close(self):
+        """Close every connection of the pool."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def __repr__(self) -> str:
+        return (
+            f"ConnectionPool(db_name={self.db_name}, "
+            f"connections={len(self._connections)})"
+        )
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name: str) -> ConnectionPool:
+    """Get the shared connection pool of a database, creating it if needed.
+
+    Args:
+        db_name (str): Database name
+
+    Returns:
+        ConnectionPool: The pool of the database.
+    """
+    key = str(Path(db_name).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key)
+        return pool
+
+
+def close_pools():
+    """Close every shared connection pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,223 @@
+import csv
+import io
+import json
+import math
+from typing import Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+
+def _to_array(values: Sequence) -> np.ndarray:
+    """Convert the values of a column to the most compact NumPy array.
+
+    Integer columns become int64, numeric columns with NULLs become
+    float64 with NaN (as pandas does) and anything else an object array.
+
+    Args:
+        values (Sequence): The values of the column.
+
+    Returns:
+        np.ndarray: The column array.
+    """
+    kinds = {type(value) for value in values}
+    if kinds == {int}:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    elif kinds and kinds <= {int, float, type(None)}:
+        return np.array(
+            [np.nan if value is None else value for value in values],
+            dtype=np.float64,
+        )
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _to_python(array: np.ndarray) -> List:
+    """Convert a column array to Python values, with NaN as None.
+
+    Args:
+        array (np.ndarray): The column array.
+
+    Returns:
+        List: The column values.
+    """
+    values = array.tolist()
+    if array.dtype.kind == "f":
+        return [None if math.isnan(value) else value for value in values]
+    return values
+
+
+class ColumnarResult:
+    """
+    A query result holding the column names once and one array per column.
+    """
+
+    def __init__(self, columns: List[str], arrays: List[np.ndarray]) -> None:
+        """
+        Initialize the ColumnarResult instance.
+
+        Args:
+            columns (List[str]): The column names.
+            arrays (List[np.ndarray]): One array of values per column.
+        """
+        assert len(columns) == len(arrays), "One array per column expected"
+        self.columns = columns
+        self.arrays = arrays
+
+    @classmethod
+    def from_rows(
+        cls, columns: List[str], rows: List[Tuple]
+    ) -> "ColumnarResult":
+        """
+        Build a result from the row tuples of a cursor.
+
+        Args:
+            columns (List[str]): The column names.
+            rows (List[Tuple]): The fetched rows.
+
+        Returns:
+            ColumnarResult: The columnar result.
+        """
+        if rows:
+            arrays = [_to_array(values) for values in zip(*rows)]
+        else:
+            arrays = [np.empty(0, dtype=object) for _ in columns]
+        return cls(list(columns), arrays)
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "ColumnarResult":
+        """
+        Build a result from a list of row dictionaries.
+
+        Args:
+            records (List[Dict]): The rows as dictionaries.
+
+        Returns:
+            ColumnarResult: The columnar result.
+        """
+        columns = list(records[0].keys()) if records else []
+        rows = [tuple(record.get(c) for c in columns) for record in records]
+        return cls.from_rows(columns, rows)
+
+    def __len__(self) -> int:
+        return len(self.arrays[0]) if self.arrays else 0
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, index: slice) -> "ColumnarResult":
+        """
+        Select a range of rows without copying the column arrays.
+
+        Args:
+            index (slice): The rows to select.
+
+        Returns:
+            ColumnarResult: A view on the selected rows.
+        """
+        if not isinstance(index, slice):
+            raise TypeError("ColumnarResult only supports slicing rows")
+        return ColumnarResult(
+            self.columns, [array[index] for array in self.arrays]
+        )
+
+    def rows(self) -> Iterator[Tuple]:
+        """
+        Iterate over the rows as tuples of Python values.
+
+        Yields:
+            Tuple: The values of a row, in column order.
+        """
+        return zip(*(_to_python(array) for array in self.arrays))
+
+    def to_records(self) -> List[Dict]:
+        """
+        Convert the result to a list of row dictionaries.
+
+        Returns:
+            List[Dict]: One dictionary per row.
+        """
+        return [dict(zip(self.columns, row)) for row in self.rows()]
+
+    def to_dict(self) -> Dict:
+        """
+        Convert the result to a JSON serializable columnar dictionary.
+
+        Returns:
+            Dict: Dictionary with keys columns and data, holding one list
+                  of values per column.
+        """
+        return {
+            "columns": self.columns,
+            "data": [_to_python(array) for array in self.arrays],
+        }
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Convert the result to a pandas DataFrame.
+
+        Returns:
+            pd.DataFrame: The result data.
+        """
+        return pd.DataFrame(
+            {
+                column: array
+                for column, array in zip(self.columns, self.arrays)
+            },
+            columns=self.columns,
+        )
+
+    def to_json(self) -> str:
+        """
+        Serialize the result to columnar JSON.
+
+        Returns:
+            str: JSON object with keys columns and data.
+        """
+        return json.dumps(self.to_dict(), default=str)
+
+    def to_csv(self) -> str:
+        """
+        Serialize the result to CSV with a header row.
+
+        Returns:
+            str: The CSV text.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(self.columns)
+        writer.writerows(self.rows())
+        return buffer.getvalue()
+
+    def to_arrow_ipc(self) -> bytes:
+        """
+        Serialize the result to the Arrow IPC stream format.
+
+        Requires the optional pyarrow package.
+
+        Returns:
+            bytes: The Arrow IPC stream.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError(
+                "pyarrow is required to export results as Arrow IPC"
+            ) from e
+
+        table = pa.table(
+            {
+                column: pa.array(_to_python(array))
+                for column, array in zip(self.columns, self.arrays)
+            }
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def __repr__(self) -> str:
+        return f"ColumnarResult(rows={len(self)}, columns={self.columns})"
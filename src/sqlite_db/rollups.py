@@ -0,0 +1,167 @@
+import argparse
+import sqlite3
+from pathlib import Path
+
+from sqlite_db.db_constants import TABLE_COLUMNS, ROLLUPS, ROLLUP_MEASURES
+
+SOURCE_TABLE = "flights"
+
+
+def rollup_query(rollup_name: str, where: str = "") -> str:
+    """Build the aggregation query of a rollup table
+
+    Args:
+        rollup_name (str): Rollup table name, described in ROLLUPS
+        where (str, optional): WHERE clause restricting the flights
+
+    Returns:
+        str: SELECT statement returning the rows of the rollup
+    """
+    group = ", ".join(ROLLUPS[rollup_name])
+    measures = ", ".join(
+        f"{expression} AS {measure}"
+        for measure, expression in ROLLUP_MEASURES.items()
+    )
+    return (
+        f"SELECT {group}, {measures} FROM {SOURCE_TABLE} {where} "
+        f"GROUP BY {group}"
+    )
+
+
+def create_rollup_table(conn: sqlite3.Connection, rollup_name: str):
+    """Create an empty rollup table, replacing any existing one
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        rollup_name (str): Rollup table name, described in ROLLUPS
+    """
+    group = ROLLUPS[rollup_name]
+    columns = [
+        f"{column} {TABLE_COLUMNS[SOURCE_TABLE][column].split()[0]} NOT NULL"
+        for column in group
+    ] + [f"{measure} NUMERIC" for measure in ROLLUP_MEASURES]
+    conn.execute(f"DROP TABLE IF EXISTS {rollup_name}")
+    conn.execute(
+        f"CREATE TABLE {rollup_name} ({', '.join(columns)}, "
+        f"PRIMARY KEY ({', '.join(group)})) WITHOUT ROWID"
+    )
+
+
+def _rollup_state(conn: sqlite3.Connection, rollup_name: str):
+    """Get the definition and the last aggregated flight of a rollup
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        rollup_name (str): Rollup table name
+
+    Returns:
+        Tuple[str, int]: The aggregation query and the last flight rowid
+                         included, or None if the rollup was never built
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS _rollup_state ("
+        "rollup TEXT PRIMARY KEY, definition TEXT NOT NULL, "
+        "last_rowid INTEGER NOT NULL)"
+    )
+    return conn.execute(
+        "SELECT definition, last_rowid FROM _rollup_state WHERE rollup = ?",
+        (rollup_name,),
+    ).fetchone()
+
+
+def _changed_months(conn: sqlite3.Connection, last_rowid: int) -> list:
+    """List the months of the flights added after a given rowid"""
+    return conn.execute(
+        f"SELECT DISTINCT YEAR, MONTH FROM {SOURCE_TABLE} WHERE rowid > ?",
+        (last_rowid,),
+    ).fetchall()
+
+
+def refresh_rollup(
+    conn: sqlite3.Connection, rollup_name: str, full: bool = False
+) -> int:
+    """Build a rollup table or refresh the months with new flights
+
+    A rollup is rebuilt from scratch when it does not exist yet, when its
+    definition changed or when flights were removed. Otherwise only the
+    months of the flights appended since the last refresh are aggregated
+    again. The changes are left uncommitted, so that the caller can
+    publish them in the same transaction as the new flights.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        rollup_name (str): Rollup table name, described in ROLLUPS
+        full (bool, optional): Whether to force a complete rebuild
+
+    Returns:
+        int: Number of refreshed months, -1 for a complete rebuild
+    """
+    definition = rollup_query(rollup_name)
+    state = _rollup_state(conn, rollup_name)
+    (max_rowid,) = conn.execute(
+        f"SELECT COALESCE(MAX(rowid), 0) FROM {SOURCE_TABLE}"
+    ).fetchone()
+
+    rebuild = (
+        full
+        or state is None
+        or state[0] != definition
+        or state[1] > max_rowid
+    )
+    if rebuild:
+        create_rollup_table(conn, rollup_name)
+        conn.execute(f"INSERT INTO {rollup_name} {definition}")
+        refreshed = -1
+    else:
+        months = _changed_months(conn, state[1])
+        for year, month in months:
+            conn.execute(
+                f"DELETE FROM {rollup_name} WHERE YEAR = ? AND MONTH = ?",
+                (year, month),
+            )
+            conn.execute(
+                f"INSERT INTO {rollup_name} "
+                + rollup_query(rollup_name, "WHERE YEAR = ? AND MONTH = ?"),
+                (year, month),
+            )
+        refreshed = len(months)
+    conn.execute(
+        "INSERT OR REPLACE INTO _rollup_state VALUES (?, ?, ?)",
+        (rollup_name, definition, max_rowid),
+    )
+    return refreshed
+
+
+def refresh_rollups(conn: sqlite3.Connection, full: bool = False):
+    """Build or refresh every rollup table described in ROLLUPS, without
+       committing
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        full (bool, optional): Whether to force a complete rebuild
+    """
+    for rollup_name in ROLLUPS:
+        refreshed = refresh_rollup(conn, rollup_name, full=full)
+        if refreshed < 0:
+            print(f"Built rollup {rollup_name}")
+        else:
+            print(f"Refreshed {refreshed} months of rollup {rollup_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or refresh the rollup tables of the flights"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Rebuild every rollup table"
+    )
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(Path(__file__).parent / "flights.db")
+    refresh_rollups(conn, full=args.full)
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,758 @@
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Set, Tuple, Union
+
+from .pool import get_pool
+from .result import ColumnarResult
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+# Answer of a template query whose value is NULL.
+EMPTY_ANSWER = "No value was recorded{of_airline}{from_airport}{in_month}."
+# A period doubled by a name ending with one at the end of a sentence.
+SENTENCE_END_PATTERN = re.compile(r"\.\.(?=\s|$)")
+MONTH_NAMES = [
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+]
+# Month numbers by name and abbreviation.
+MONTHS = {
+    alias: number
+    for number, name in enumerate(MONTH_NAMES, 1)
+    for alias in (name.lower(), name[:3].lower())
+}
+MONTHS["sept"] = 9
+# Months which are also common words only count after these words.
+AMBIGUOUS_MONTHS = {"mar", "may"}
+MONTH_PREFIXES = {"during", "for", "in", "of"}
+# Words which say nothing about the shape of a question. Every other word
+# of a question must be known to a template for it to match.
+FILLER_WORDS = {
+    "a",
+    "all",
+    "an",
+    "and",
+    "are",
+    "as",
+    "at",
+    "by",
+    "did",
+    "do",
+    "does",
+    "during",
+    "each",
+    "every",
+    "for",
+    "from",
+    "give",
+    "has",
+    "have",
+    "in",
+    "is",
+    "list",
+    "me",
+    "of",
+    "on",
+    "per",
+    "please",
+    "show",
+    "tell",
+    "the",
+    "us",
+    "was",
+    "were",
+    "what",
+    "which",
+}
+# Words of airline and airport names which do not identify them alone.
+NAME_SUFFIXES = {
+    "air",
+    "airlines",
+    "airport",
+    "airways",
+    "co",
+    "corporation",
+    "inc",
+    "international",
+    "lines",
+}
+DELAY_WORDS = frozenset({"delay", "delayed", "late", "lateness"})
+DEPARTURE_WORDS = frozenset({"departure", "depart", "departing"})
+ARRIVAL_WORDS = frozenset({"arrival", "arrive", "arriving"})
+RANKING_WORDS = frozenset(
+    {"biggest", "highest", "longest", "most", "top", "worst"}
+)
+
+
+def _stem(word: str) -> str:
+    """Remove the plural s of a word, to ignore inflections."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+@dataclass(frozen=True)
+class Entity:
+    """
+    An airline or an airport a question may name.
+
+    Attributes:
+        kind (str): Either "airline" or "airport".
+        code (str): The IATA code.
+        name (str): The full name.
+        city (str): The city of an airport, which also names it.
+    """
+
+    kind: str
+    code: str
+    name: str
+    city: str = ""
+
+    def aliases(self) -> Set[Tuple[str, ...]]:
+        """
+        List the word sequences naming the entity.
+
+        Returns:
+            Set[Tuple[str, ...]]: The full names and the names without
+                                  generic words such as "airlines".
+        """
+        aliases = set()
+        for name in (self.name, self.city):
+            words = tuple(WORD_PATTERN.findall((name or "").lower()))
+            if not words:
+                continue
+            aliases.add(words)
+            short = tuple(w for w in words if w not in NAME_SUFFIXES)
+            # Short names such as "us" are common words.
+            if short and len(" ".join(short)) > 2:
+                aliases.add(short)
+        return aliases
+
+
+@dataclass
+class QuestionParse:
+    """
+    The slots found in a question and its remaining words.
+
+    Attributes:
+        words (Set[str]): Stemmed words which are neither slots nor
+                          filler words.
+        airlines (List[Entity]): Named airlines.
+        airports (List[Entity]): Named airports.
+        months (List[int]): Named months.
+        ambiguous (bool): Whether a name refers to several entities.
+    """
+
+    words: Set[str] = field(default_factory=set)
+    airlines: List[Entity] = field(default_factory=list)
+    airports: List[Entity] = field(default_factory=list)
+    months: List[int] = field(default_factory=list)
+    ambiguous: bool = False
+
+    def slots(self) -> Dict[str, List]:
+        return {
+            "airline": self.airlines,
+            "airport": self.airports,
+            "month": self.months,
+        }
+
+
+class LookupIndex:
+    """
+    Finds the airlines, airports and months named in questions through an
+    in-memory index of their names and codes.
+    """
+
+    def __init__(self, entities: List[Entity]) -> None:
+        """
+        Initialize the LookupIndex instance.
+
+        Args:
+            entities (List[Entity]): The airlines and airports.
+        """
+        self.codes: Dict[str, Entity] = {}
+        self.aliases: Dict[Tuple[str, ...], Entity] = {}
+        self.ambiguous: Set[Tuple[str, ...]] = set()
+        for entity in entities:
+            if entity.code.lower() not in FILLER_WORDS:
+                self.codes[entity.code.upper()] = entity
+            for alias in entity.aliases():
+                known = self.aliases.get(alias, entity)
+                if alias in self.ambiguous or known != entity:
+                    # Such as a city with two airports.
+                    self.aliases.pop(alias, None)
+                    self.ambiguous.add(alias)
+                else:
+                    self.aliases[alias] = entity
+        self.max_words = max(
+            map(len, self.aliases.keys() | self.ambiguous), default=1
+        )
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection) -> "LookupIndex":
+        """
+        Build the index from the airlines and airports tables.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the flights database.
+
+        Returns:
+            LookupIndex: The index.
+        """
+        airlines = conn.execute("SELECT IATA_CODE, AIRLINE FROM airlines")
+        airports = conn.execute(
+            "SELECT IATA_CODE, AIRPORT, CITY FROM airports"
+        )
+        return cls(
+            [Entity("airline", code, name) for code, name in airlines]
+            + [
+                Entity("airport", code, name, city)
+                for code, name, city in airports
+            ]
+        )
+
+    def _entity(self, tokens: List[str], index: int) -> Tuple:
+        """
+        Find the longest name starting at a word of a question.
+
+        Args:
+            tokens (List[str]): Words of the question in their case.
+            index (int): Position of the first word.
+
+        Returns:
+            Tuple: The named entity, or None for an ambiguous name or no
+                   name at all, and the number of words of the name.
+        """
+        words = [t.lower() for t in tokens[index:index + self.max_words]]
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            alias = tuple(words[:size])
+            if alias in self.aliases:
+                return self.aliases[alias], size
+            if alias in self.ambiguous:
+                return None, size
+        # Codes are written in capitals, e.g. "JFK".
+        if tokens[index].isupper() and tokens[index] in self.codes:
+            return self.codes[tokens[index]], 1
+        return None, 0
+
+    def parse(self, question: str) -> QuestionParse:
+        """
+        Find the slots of a question.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            QuestionParse: The slots and the remaining words.
+        """
+        tokens = WORD_PATTERN.findall(question)
+        parse = QuestionParse()
+        index = 0
+        while index < len(tokens):
+            entity, size = self._entity(tokens, index)
+            if size:
+                if entity is None:
+                    parse.ambiguous = True
+                elif entity.kind == "airline":
+                    parse.airlines.append(entity)
+                else:
+                    parse.airports.append(entity)
+                index += size
+                continue
+
+            word = tokens[index].lower()
+            previous = tokens[index - 1].lower() if index else ""
+            if word in MONTHS and (
+                word not in AMBIGUOUS_MONTHS or previous in MONTH_PREFIXES
+            ):
+                parse.months.append(MONTHS[word])
+            elif word not in FILLER_WORDS:
+                parse.words.add(_stem(word))
+            index += 1
+        return parse
+
+
+@dataclass
+class TemplateMatch:
+    """
+    A parameterized SQL query answering a question without the LLM.
+
+    Attributes:
+        name (str): Name of the matched template.
+        sql (str): The SQL query with ? parameters.
+        params (List): Values of the parameters.
+        answer (str): Format of the answer, see describe.
+        context (Dict[str, str]): Descriptions of the slots in the answer.
+        empty_answer (str): Format of the answer when the value is NULL.
+    """
+
+    name: str
+    sql: str
+    params: List
+    answer: str
+    context: Dict[str, str]
+    empty_answer: str = EMPTY_ANSWER
+
+    def describe(self, result: ColumnarResult) -> str:
+        """
+        Write the answer from the first result row, whose first value is
+        the label and last value the value in the answer format.
+
+        Args:
+            result (ColumnarResult): The non-empty result of the query,
+                                     starting at its first row.
+
+        Returns:
+            str: The answer.
+        """
+        row = next(result.rows())
+        singular = row[-1] == 1
+        # Averages are NULL when no flight has a value, e.g. no delay.
+        answer_format = self.empty_answer if row[-1] is None else self.answer
+        answer = answer_format.format(
+            label=_format_value(row[0]),
+            value=_format_value(row[-1]),
+            s="" if singular else "s",
+            were="was" if singular else "were",
+            **self.context,
+        )
+        # Names such as "Delta Air Lines Inc." already end the sentence.
+        return SENTENCE_END_PATTERN.sub(".", answer)
+
+
+# Builds the SQL query and its parameters for the slots of a question,
+# returns None if the question is not clear enough.
+SQLBuilder = Callable[[QuestionParse], Union[Tuple[str, List], None]]
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    """
+    A common shape of questions answered by a parameterized query.
+
+    Attributes:
+        name (str): The template name.
+        keywords (Tuple[FrozenSet[str], ...]): Groups of stemmed words, a
+                                               question has a word of each.
+        optional_words (FrozenSet[str]): Other words a question may have.
+        required_slots (FrozenSet[str]): Slots a question must fill, among
+                                         "airline", "airport" and "month".
+        optional_slots (FrozenSet[str]): Slots a question may fill.
+        tables (FrozenSet[str]): Tables read by the query.
+        build (SQLBuilder): Builds the query for the slots.
+        answer (str): Format of the answer, with the label and value of
+                      the first result row, the plural forms s and were
+                      agreeing with the value and the slot descriptions
+                      airline, of_airline, from_airport, in_month and
+                      delay.
+        empty_answer (str): Format of the answer when the value of the
+                            first result row is NULL.
+    """
+
+    name: str
+    keywords: Tuple[FrozenSet[str], ...]
+    optional_words: FrozenSet[str]
+    required_slots: FrozenSet[str]
+    optional_slots: FrozenSet[str]
+    tables: FrozenSet[str]
+    build: SQLBuilder
+    answer: str
+    empty_answer: str = EMPTY_ANSWER
+
+    def accepts(self, parse: QuestionParse) -> bool:
+        """
+        Check that a question has the shape of the template, with every
+        word known to it.
+
+        Args:
+            parse (QuestionParse): The parsed question.
+
+        Returns:
+            bool: Whether the template answers the question.
+        """
+        if parse.ambiguous:
+            return False
+        slots = parse.slots()
+        if any(len(values) > 1 for values in slots.values()):
+            return False
+        filled = {name for name, values in slots.items() if values}
+        if not self.required_slots <= filled:
+            return False
+        if not filled <= self.required_slots | self.optional_slots:
+            return False
+        if not all(group & parse.words for group in self.keywords):
+            return False
+        known = self.optional_words.union(*self.keywords)
+        return parse.words <= known
+
+
+def _delay_column(parse: QuestionParse) -> Union[str, None]:
+    """Choose the delay column named by a question, arrivals by default."""
+    departure = bool(parse.words & DEPARTURE_WORDS)
+    if departure and parse.words & ARRIVAL_WORDS:
+        return None
+    return "DEPARTURE" if departure else "ARRIVAL"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.1f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def _where(
+    alias: str,
+    parse: QuestionParse,
+    columns: Dict[str, str],
+    conditions: Tuple[str, ...] = (),
+):
+    """
+    Filter rows on the filled slots of a question.
+
+    Args:
+        alias (str): Alias of the filtered table.
+        parse (QuestionParse): The parsed question.
+        columns (Dict[str, str]): Filtered column by slot name.
+        conditions (Tuple[str, ...]): Conditions without parameters.
+
+    Returns:
+        Tuple[str, List]: The WHERE clause, empty without conditions, and
+                          its parameters.
+    """
+    conditions, params = list(conditions), []
+    for slot, values in parse.slots().items():
+        if values and slot in columns:
+            value = values[0]
+            conditions.append(f"{alias}.{columns[slot]} = ?")
+            params.append(value if slot == "month" else value.code)
+    if not conditions:
+        return "", params
+    return "WHERE " + " AND ".join(conditions), params
+
+
+def _average_delay_sql(parse: QuestionParse):
+    column = _delay_column(parse)
+    if column is None:
+        return None
+    where, params = _where(
+        "r", parse, {"airline": "AIRLINE", "month": "MONTH"}
+    )
+    sql = f"""SELECT a.AIRLINE,
+    ROUND(SUM(r.{column}_DELAY_SUM) * 1.0 / SUM(r.{column}_DELAY_COUNT), 2)
+    AS AVG_{column}_DELAY
+FROM rollup_airline_month AS r
+JOIN airlines AS a ON a.IATA_CODE = r.AIRLINE
+{where}
+GROUP BY a.AIRLINE
+ORDER BY AVG_{column}_DELAY DESC;"""
+    return sql, params
+
+
+def _airport_delay_sql(parse: QuestionParse):
+    if parse.words & ARRIVAL_WORDS:
+        # Arrival delays belong to the destination, not the origin.
+        return None
+    where, params = _where("r", parse, {"month": "MONTH"})
+    sql = f"""SELECT p.AIRPORT, p.CITY,
+    ROUND(SUM(r.DEPARTURE_DELAY_SUM) * 1.0 / SUM(r.DEPARTURE_DELAY_COUNT), 2)
+    AS AVG_DEPARTURE_DELAY
+FROM rollup_origin_month AS r
+JOIN airports AS p ON p.IATA_CODE = r.ORIGIN_AIRPORT
+{where}
+GROUP BY p.AIRPORT, p.CITY
+ORDER BY AVG_DEPARTURE_DELAY DESC
+LIMIT 10;"""
+    return sql, params
+
+
+def _cancellation_reasons_sql(parse: QuestionParse):
+    where, params = _where(
+        "f",
+        parse,
+        {"airline": "AIRLINE", "airport": "ORIGIN_AIRPORT", "month": "MONTH"},
+        ("f.CANCELLED = 1",),
+    )
+    sql = f"""SELECT CASE f.CANCELLATION_REASON
+        WHEN 'A' THEN 'Airline' WHEN 'B' THEN 'Weather'
+        WHEN 'C' THEN 'National Air System' WHEN 'D' THEN 'Security'
+        ELSE f.CANCELLATION_REASON END AS REASON,
+    COUNT(*) AS CANCELLATIONS
+FROM flights AS f
+{where}
+GROUP BY f.CANCELLATION_REASON
+ORDER BY CANCELLATIONS DESC;"""
+    return sql, params
+
+
+def _flight_count_sql(parse: QuestionParse):
+    if not parse.airports:
+        where, params = _where(
+            "r", parse, {"airline": "AIRLINE", "month": "MONTH"}
+        )
+        sql = f"""SELECT COALESCE(SUM(r.FLIGHTS), 0) AS FLIGHTS
+FROM rollup_airline_month AS r
+{where};"""
+        return sql, params
+    # Only the flights have both the airline and the origin.
+    where, params = _where(
+        "f",
+        parse,
+        {"airline": "AIRLINE", "airport": "ORIGIN_AIRPORT", "month": "MONTH"},
+    )
+    return f"SELECT COUNT(*) AS FLIGHTS\nFROM flights AS f\n{where};", params
+
+
+TEMPLATES = [
+    QueryTemplate(
+        name="airline_average_delay",
+        keywords=(frozenset({"average", "avg", "mean"}), DELAY_WORDS),
+        optional_words=frozenset(
+            {"airline", "carrier", "flight", "minute", "how", "long"}
+        )
+        | DEPARTURE_WORDS
+        | ARRIVAL_WORDS,
+        required_slots=frozenset({"airline"}),
+        optional_slots=frozenset({"month"}),
+        tables=frozenset({"airlines", "rollup_airline_month"}),
+        build=_average_delay_sql,
+        answer=(
+            "The average {delay} delay of {airline}{in_month} was {value} "
+            "minutes."
+        ),
+        empty_answer=(
+            "There were no delayed flights of {airline}{in_month}, no "
+            "{delay} delay was recorded."
+        ),
+    ),
+    QueryTemplate(
+        name="average_delay_by_airline",
+        keywords=(
+            frozenset({"average", "avg", "mean"}),
+            DELAY_WORDS,
+            frozenset({"airline", "carrier"}),
+        ),
+        optional_words=frozenset({"flight", "minute"})
+        | DEPARTURE_WORDS
+        | ARRIVAL_WORDS
+        | RANKING_WORDS,
+        required_slots=frozenset(),
+        optional_slots=frozenset({"month"}),
+        tables=frozenset({"airlines", "rollup_airline_month"}),
+        build=_average_delay_sql,
+        answer=(
+            "{label} had the longest average {delay} delay{in_month}, "
+            "{value} minutes. Every airline is listed below."
+        ),
+        empty_answer=(
+            "There were no delayed flights{in_month}, no {delay} delay was "
+            "recorded."
+        ),
+    ),
+    QueryTemplate(
+        name="most_delayed_airports",
+        keywords=(frozenset({"airport"}), DELAY_WORDS),
+        optional_words=frozenset({"average", "avg", "mean", "flight"})
+        | DEPARTURE_WORDS
+        | RANKING_WORDS,
+        required_slots=frozenset(),
+        optional_slots=frozenset({"month"}),
+        tables=frozenset({"airports", "rollup_origin_month"}),
+        build=_airport_delay_sql,
+        answer=(
+            "{label} had the longest average departure delay{in_month}, "
+            "{value} minutes. The ten most delayed airports are listed "
+            "below."
+        ),
+        empty_answer=(
+            "There were no delayed flights{in_month}, no departure delay "
+            "was recorded."
+        ),
+    ),
+    QueryTemplate(
+        name="cancellation_reasons",
+        keywords=(
+            frozenset({"cancellation", "cancelled", "canceled", "cancel"}),
+            frozenset({"reason", "cause", "why"}),
+        ),
+        optional_words=frozenset(
+            {"common", "frequent", "main", "flight", "get", "got"}
+        )
+        | RANKING_WORDS,
+        required_slots=frozenset(),
+        optional_slots=frozenset({"airline", "airport", "month"}),
+        tables=frozenset({"flights"}),
+        build=_cancellation_reasons_sql,
+        answer=(
+            "{label} was the most common reason of cancelled flights"
+            "{of_airline}{from_airport}{in_month}, with {value} "
+            "cancellation{s}."
+        ),
+    ),
+    QueryTemplate(
+        name="flight_count",
+        keywords=(
+            frozenset({"many", "number", "count"}),
+            frozenset({"flight"}),
+        ),
+        optional_words=frozenset(
+            {"how", "there", "total", "operate", "operated", "fly", "flew"}
+        )
+        | DEPARTURE_WORDS
+        | frozenset({"departed", "leave", "left"}),
+        required_slots=frozenset(),
+        optional_slots=frozenset({"airline", "airport", "month"}),
+        tables=frozenset({"flights", "rollup_airline_month"}),
+        build=_flight_count_sql,
+        answer=(
+            "There {were} {value} flight{s}{of_airline}{from_airport}"
+            "{in_month}."
+        ),
+    ),
+]
+
+
+class TemplateMatcher:
+    """
+    Answers common shapes of questions with parameterized SQL queries,
+    without the LLM, when a question has no word a template does not
+    know.
+    """
+
+    def __init__(
+        self,
+        index: LookupIndex,
+        tables: Set[str],
+        templates: List[QueryTemplate] = TEMPLATES,
+    ) -> None:
+        """
+        Initialize the TemplateMatcher instance.
+
+        Args:
+            index (LookupIndex): The index of airline and airport names.
+            tables (Set[str]): Tables of the database. Templates reading
+                               other tables are ignored.
+            templates (List[QueryTemplate]): The templates.
+        """
+        self.index = index
+        self.templates = [t for t in templates if t.tables <= tables]
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection) -> "TemplateMatcher":
+        """
+        Build the matcher of a database.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the flights database.
+
+        Returns:
+            TemplateMatcher: The matcher.
+        """
+        tables = {
+            name
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        return cls(LookupIndex.from_connection(conn), tables)
+
+    def match(self, question: str) -> Union[TemplateMatch, None]:
+        """
+        Find the query answering a question.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            Union[TemplateMatch, None]: The query, or None unless exactly
+                                        one template answers the question.
+        """
+        parse = self.index.parse(question)
+        matches = []
+        for template in self.templates:
+            if not template.accepts(parse):
+                continue
+            built = template.build(parse)
+            if built is not None:
+                matches.append((template, built))
+        if len(matches) != 1:
+            return None
+
+        template, (sql, params) = matches[0]
+        airline = parse.airlines[0].name if parse.airlines else ""
+        airport = parse.airports[0].name if parse.airports else ""
+        month = MONTH_NAMES[parse.months[0] - 1] if parse.months else ""
+        context = {
+            "airline": airline,
+            "of_airline": f" of {airline}" if airline else "",
+            "from_airport": f" from {airport}" if airport else "",
+            "in_month": f" in {month}" if month else "",
+            "delay": (_delay_column(parse) or "").lower(),
+        }
+        return TemplateMatch(
+            template.name,
+            sql,
+            params,
+            template.answer,
+            context,
+            template.empty_answer,
+        )
+
+
+_matchers: Dict[str, tuple] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(db_name: str) -> Union[TemplateMatcher, None]:
+    """Get the template matcher of a database, building it again whenever
+       its data version changes.
+
+    Args:
+        db_name (str): Database name
+
+    Returns:
+        Union[TemplateMatcher, None]: The matcher, or None if the
+                                      database cannot be read.
+    """
+    key = str(Path(db_name).resolve())
+    pool = get_pool(key)
+    version = pool.data_version()
+    with _matchers_lock:
+        cached = _matchers.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            matcher = TemplateMatcher.from_connection(pool.connection())
+        except sqlite3.Error as e:
+            print(f"Could not build the template matcher of {key}: {e}")
+            return None
+        _matchers[key] = (version, matcher)
+        return matcher
+
+
+def match_template(db_name: str, question: str) -> Union[TemplateMatch, None]:
+    """Find the parameterized query answering a common question shape.
+
+    Args:
+        db_name (str): Database name
+        question (str): The user question.
+
+    Returns:
+        Union[TemplateMatch, None]: The query, or None if the question
+                                    needs the LLM.
+    """
+    matcher = get_matcher(db_name)
+    return matcher.match(question) if matcher else None
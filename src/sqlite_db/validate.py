@@ -0,0 +1,103 @@
+import re
+import sqlite3
+from typing import Dict, List
+
+from .pool import get_pool
+
+READ_ONLY_KEYWORDS = ("SELECT", "WITH")
+READ_ONLY_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+LEADING_COMMENTS_PATTERN = re.compile(r"^\s*(?:--[^\n]*\n|/\*.*?\*/)\s*", re.S)
+
+
+def _strip_leading_comments(query: str) -> str:
+    """Remove comments preceding the first keyword of a query.
+
+    Args:
+        query (str): SQL Query
+
+    Returns:
+        str: Query starting at its first keyword.
+    """
+    previous = None
+    while previous != query:
+        previous = query
+        query = LEADING_COMMENTS_PATTERN.sub("", query, count=1)
+    return query.strip()
+
+
+def _read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    """Deny every statement action other than reading data."""
+    if action in READ_ONLY_ACTIONS:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def _error(code: str, message: str) -> Dict:
+    return {"code": code, "message": message}
+
+
+def check_query(conn: sqlite3.Connection, query: str) -> List[Dict]:
+    """Check a query against the schema of an open connection.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        query (str): SQL Query
+
+    Returns:
+        List[Dict]: Structured errors with keys code and message. Empty if
+                    the query is a valid single read-only statement.
+    """
+    statement = _strip_leading_comments(query or "")
+    if not statement:
+        return [_error("empty", "The query is empty.")]
+
+    terminated = statement + "\n;"
+    if not sqlite3.complete_statement(terminated):
+        return [_error("incomplete", "The query is not a complete statement.")]
+
+    keyword = statement.split(None, 1)[0].upper()
+    if keyword not in READ_ONLY_KEYWORDS:
+        return [
+            _error(
+                "not_read_only",
+                f"Only SELECT or WITH statements are allowed, got {keyword}.",
+            )
+        ]
+
+    conn.set_authorizer(_read_only_authorizer)
+    try:
+        conn.execute(f"EXPLAIN {statement}").fetchall()
+    except sqlite3.ProgrammingError as e:
+        return [_error("multiple_statements", str(e))]
+    except sqlite3.DatabaseError as e:
+        message = str(e)
+        if "not authorized" in message:
+            return [_error("not_read_only", message)]
+        if "syntax error" in message or "incomplete input" in message:
+            return [_error("syntax_error", message)]
+        return [_error("schema_error", message)]
+    finally:
+        conn.set_authorizer(None)
+    return []
+
+
+def validate_query(db_name: str, query: str) -> Dict:
+    """Validate SQL query against given database without executing it
+
+    Args:
+        db_name (str): Database name
+        query (str): SQL Query
+
+    Returns:
+        Dict: Dictionary with keys is_valid and errors.
+    """
+    try:
+        errors = check_query(get_pool(db_name).connection(), query)
+    except sqlite3.Error as e:
+        errors = [_error("connection_error", str(e))]
+    return {"is_valid": not errors, "errors": errors}
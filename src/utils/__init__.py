@@ -1,3 +1,7 @@
 from . import helpers
+from . import cache
+from . import digest
+from . import metrics
+from . import examples
 
-__all__ = ["helpers"]
+__all__ = ["helpers", "cache", "digest", "metrics", "examples"]
@@ -0,0 +1,518 @@
+import json
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Tuple, Union
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Words which do not change what a question asks for. Every other word,
+# such as names, codes, months, numbers, negations and comparisons, must
+# be the same for questions to be near-duplicates.
+STOP_WORDS = frozenset(
+    "a an the is are was were be been do does did can could you i me us "
+    "please show tell give list find what whats which s there of in for "
+    "on during with and".split()
+)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so that trivially different spellings share
+       a cache key.
+
+    Args:
+        question (str): The raw user question.
+
+    Returns:
+        str: Lower-cased question without punctuation and with collapsed
+             whitespace.
+    """
+    return " ".join(TOKEN_PATTERN.findall(question.lower()))
+
+
+def question_similarity(first: str, second: str) -> float:
+    """Compute the similarity between two normalized questions.
+
+    The score is the Jaccard index of the token sets. Questions whose
+    words other than stop words differ, or come in another order, never
+    match.
+
+    Args:
+        first (str): First normalized question.
+        second (str): Second normalized question.
+
+    Returns:
+        float: Similarity between 0.0 and 1.0.
+    """
+    first_tokens, second_tokens = set(first.split()), set(second.split())
+    if not first_tokens or not second_tokens:
+        return 0.0
+    if [t for t in first.split() if t not in STOP_WORDS] != [
+        t for t in second.split() if t not in STOP_WORDS
+    ]:
+        return 0.0
+    shared = first_tokens & second_tokens
+    return len(shared) / len(first_tokens | second_tokens)
+
+
+@dataclass
+class CacheEntry:
+    """
+    A cached answer for a question.
+
+    Attributes:
+        question (str): The normalized question.
+        sql (str): The generated SQL query.
+        is_valid (bool): The validation verdict of the SQL query.
+        answer (str): The final natural language answer.
+        created_at (float): Unix timestamp of when the entry was stored.
+        data_version (int): Version of the database the answer is based on.
+    """
+
+    question: str
+    sql: str
+    is_valid: bool
+    answer: str
+    created_at: float = field(default_factory=time.time)
+    data_version: int = 0
+
+
+class CacheBackend:
+    """
+    Base class for answer cache storage backends.
+    """
+
+    def get(self, key: str) -> Union[Dict, None]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        raise NotImplementedError
+
+    def keys(self) -> List[str]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """
+    An in-process LRU backend.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """
+        Initialize the InMemoryBackend instance.
+
+        Args:
+            max_entries (int): Maximum number of entries to keep.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Union[Dict, None]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._lock:
+            return iter(list(self._entries.items()))
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    A local file backend storing entries in a SQLite database.
+
+    The least recently accessed entries are evicted once the table grows
+    beyond max_entries. Processes opening the same file share the
+    entries, e.g. the workers of the app. Reads do not write: access
+    times are collected in memory and written in batches.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        max_entries: int = 1024,
+        table: str = "answer_cache",
+        touch_batch_size: int = 64,
+        touch_interval: float = 5.0,
+    ) -> None:
+        """
+        Initialize the SQLiteBackend instance.
+
+        Args:
+            db_name (str): Path to the cache database file.
+            max_entries (int): Maximum number of entries to keep.
+            table (str): Name of the table holding the entries.
+            touch_batch_size (int): Number of pending access times that
+                triggers a write.
+            touch_interval (float): Maximum number of seconds access
+                times stay pending.
+        """
+        assert table.isidentifier(), f"Invalid table name: {table}"
+        self.max_entries = max_entries
+        self.table = table
+        self.touch_batch_size = touch_batch_size
+        self.touch_interval = touch_interval
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.time()
+        self._keys: Union[List[str], None] = None
+        self._data_version = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at "
+            f"ON {self.table}(accessed_at)"
+        )
+        self._conn.commit()
+
+    def _write_touches(self) -> None:
+        """Write the pending access times, without committing."""
+        if self._touched:
+            self._conn.executemany(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                [(at, key) for key, at in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_since = time.time()
+
+    def get(self, key: str) -> Union[Dict, None]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if (
+                len(self._touched) >= self.touch_batch_size
+                or time.time() - self._touched_since >= self.touch_interval
+            ):
+                self._write_touches()
+                self._conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._keys = None
+            self._write_touches()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            (count,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} "
+                    "ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._keys = None
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key = ?", (key,)
+            )
+            self._conn.commit()
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM {self.table}"
+            ).fetchall()
+        return ((key, json.loads(value)) for key, value in rows)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            # Read the keys again only after a write of this or another
+            # connection.
+            (data_version,) = self._conn.execute(
+                "PRAGMA data_version"
+            ).fetchone()
+            if self._keys is None or data_version != self._data_version:
+                self._data_version = data_version
+                self._keys = [
+                    key
+                    for (key,) in self._conn.execute(
+                        f"SELECT key FROM {self.table}"
+                    )
+                ]
+            return self._keys
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys = None
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+
+class AnswerCache:
+    """
+    A cache of answers keyed on the normalized user question.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: Union[float, None] = None,
+    ) -> None:
+        """
+        Initialize the AnswerCache instance.
+
+        Args:
+            backend (CacheBackend): The storage backend.
+            ttl_seconds (float): Number of seconds an entry stays fresh.
+            similarity_threshold (Union[float, None]): Minimum similarity
+                for a near-duplicate match. Exact matches only if None.
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+    def _is_fresh(self, entry: CacheEntry, data_version: int) -> bool:
+        if entry.data_version != data_version:
+            return False
+        return time.time() - entry.created_at <= self.ttl_seconds
+
+    def get(
+        self, question: str, data_version: int = 0
+    ) -> Union[CacheEntry, None]:
+        """
+        Look up a cached answer for the question.
+
+        Args:
+            question (str): The raw user question.
+            data_version (int): The current version of the database.
+                Entries based on another version are stale.
+
+        Returns:
+            Union[CacheEntry, None]: The cached entry, or None on a miss.
+        """
+        key = normalize_question(question)
+        value = self.backend.get(key)
+        similar = value is None and self.similarity_threshold is not None
+        if similar:
+            key, value = self._find_similar(key)
+        if value is None:
+            return None
+
+        entry = CacheEntry(**value)
+        if not self._is_fresh(entry, data_version):
+            self.backend.delete(key)
+            return None
+        if similar and not entry.is_valid:
+            # Only the question itself is rejected, not similar ones.
+            return None
+        return entry
+
+    def _find_similar(self, key: str) -> Tuple[str, Union[Dict, None]]:
+        """
+        Find the most similar cached question above the threshold.
+
+        Args:
+            key (str): The normalized question.
+
+        Returns:
+            Tuple[str, Union[Dict, None]]: The matching key and value.
+        """
+        best_key, best_score = None, 0.0
+        for candidate_key in self.backend.keys():
+            score = question_similarity(key, candidate_key)
+            if score >= self.similarity_threshold and score > best_score:
+                best_key, best_score = candidate_key, score
+        if best_key is None:
+            return key, None
+        return best_key, self.backend.get(best_key)
+
+    def set(
+        self,
+        question: str,
+        sql: str,
+        is_valid: bool,
+        answer: str,
+        data_version: int = 0,
+    ):
+        """
+        Store an answer for the question.
+
+        Args:
+            question (str): The raw user question.
+            sql (str): The generated SQL query.
+            is_valid (bool): The validation verdict of the SQL query.
+            answer (str): The final natural language answer.
+            data_version (int): The version of the database queried.
+        """
+        key = normalize_question(question)
+        entry = CacheEntry(
+            question=key,
+            sql=sql,
+            is_valid=is_valid,
+            answer=answer,
+            data_version=data_version,
+        )
+        self.backend.set(key, asdict(entry))
+
+    def clear(self):
+        """Remove every cached answer."""
+        self.backend.clear()
+
+
+class CursorStore:
+    """
+    Keeps executed queries under opaque cursor tokens, so that later pages
+    of a result can be fetched without running the LLM pipeline again.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl_seconds: float = 3600.0):
+        """
+        Initialize the CursorStore instance.
+
+        Args:
+            backend (CacheBackend): The storage backend.
+            ttl_seconds (float): Number of seconds a cursor stays valid.
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    def create(self, **state) -> str:
+        """
+        Store the state of a result under a new cursor token.
+
+        Args:
+            **state: JSON serializable state, such as the SQL query.
+
+        Returns:
+            str: The cursor token.
+        """
+        token = secrets.token_urlsafe(16)
+        self.backend.set(token, {"created_at": time.time(), **state})
+        return token
+
+    def get(self, token: str) -> Union[Dict, None]:
+        """
+        Look up the state of a cursor.
+
+        Args:
+            token (str): The cursor token.
+
+        Returns:
+            Union[Dict, None]: The stored state, or None if the cursor is
+                               unknown or expired.
+        """
+        state = self.backend.get(token)
+        if state is None:
+            return None
+        if time.time() - state["created_at"] > self.ttl_seconds:
+            self.backend.delete(token)
+            return None
+        return state
+
+
+def create_answer_cache(
+    backend: str = "memory",
+    db_name: Union[str, None] = None,
+    ttl_seconds: float = 3600.0,
+    max_entries: int = 1024,
+    similarity_threshold: Union[float, None] = None,
+) -> AnswerCache:
+    """Create an answer cache with the requested backend.
+
+    Args:
+        backend (str): Either "memory" or "sqlite".
+        db_name (Union[str, None]): Path to the database file of the
+                                    SQLite backend.
+        ttl_seconds (float): Number of seconds an entry stays fresh.
+        max_entries (int): Maximum number of entries to keep.
+        similarity_threshold (Union[float, None]): Minimum similarity for
+                                                   a near-duplicate match.
+
+    Returns:
+        AnswerCache: The configured answer cache.
+    """
+    if backend == "memory":
+        storage = InMemoryBackend(max_entries=max_entries)
+    elif backend == "sqlite":
+        assert db_name, "db_name must be provided for the sqlite backend"
+        storage = SQLiteBackend(db_name, max_entries=max_entries)
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return AnswerCache(
+        storage,
+        ttl_seconds=ttl_seconds,
+        similarity_threshold=similarity_threshold,
+    )
+
+
+def create_cursor_store(
+    backend: str = "memory",
+    db_name: Union[str, None] = None,
+    ttl_seconds: float = 3600.0,
+    max_entries: int = 1024,
+) -> CursorStore:
+    """Create a cursor store with the requested backend.
+
+    Args:
+        backend (str): Either "memory" or "sqlite".
+        db_name (Union[str, None]): Path to the database file of the
+                                    SQLite backend.
+        ttl_seconds (float): Number of seconds a cursor stays valid.
+        max_entries (int): Maximum number of cursors to keep.
+
+    Returns:
+        CursorStore: The configured cursor store.
+    """
+    if backend == "memory":
+        storage = InMemoryBackend(max_entries=max_entries)
+    elif backend == "sqlite":
+        assert db_name, "db_name must be provided for the sqlite backend"
+        storage = SQLiteBackend(
+            db_name, max_entries=max_entries, table="result_cursors"
+        )
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return CursorStore(storage, ttl_seconds=ttl_seconds)
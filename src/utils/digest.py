@@ -0,0 +1,142 @@
+from typing import List, Union
+import numpy as np
+import pandas as pd
+
+from config.pipeline_config import PipelineConfig
+from sqlite_db.result import ColumnarResult
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of LLM tokens of a text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _column_stats(df: pd.DataFrame) -> List[str]:
+    """Describe every column of the result in one line.
+
+    Args:
+        df (pd.DataFrame): The result data.
+
+    Returns:
+        List[str]: One line of statistics per column.
+    """
+    lines = []
+    for column in df.columns:
+        values = df[column]
+        nulls = int(values.isna().sum())
+        if pd.api.types.is_numeric_dtype(values) and not (
+            pd.api.types.is_bool_dtype(values)
+        ):
+            numbers = values.dropna().to_numpy(dtype=float)
+            if numbers.size:
+                lines.append(
+                    f"- {column}: min={numbers.min():.4g}, "
+                    f"max={numbers.max():.4g}, mean={numbers.mean():.4g}, "
+                    f"nulls={nulls}"
+                )
+                continue
+        counts = values.value_counts(dropna=True)
+        top = ", ".join(f"{k} ({v})" for k, v in counts.head(5).items())
+        lines.append(
+            f"- {column}: distinct={len(counts)}, nulls={nulls}, top={top}"
+        )
+    return lines
+
+
+def _stratified_sample(df: pd.DataFrame, sample_size: int) -> pd.DataFrame:
+    """Sample rows covering every group of a low-cardinality column.
+
+    The first non-numeric column with at most sample_size distinct values
+    defines the strata. Without such a column the rows are sampled at
+    evenly spaced positions.
+
+    Args:
+        df (pd.DataFrame): The result data.
+        sample_size (int): Approximate number of rows to sample.
+
+    Returns:
+        pd.DataFrame: The sampled rows.
+    """
+    for column in df.columns:
+        if pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        n_groups = df[column].nunique(dropna=False)
+        if 1 < n_groups <= sample_size:
+            per_group = max(1, sample_size // n_groups)
+            return df.groupby(column, dropna=False, sort=False).head(
+                per_group
+            )
+    num = min(sample_size, len(df))
+    positions = np.unique(np.linspace(0, len(df) - 1, num=num).astype(int))
+    return df.iloc[positions]
+
+
+def build_result_digest(
+    result: ColumnarResult,
+    total_rows: Union[int, None] = None,
+    token_budget: int = PipelineConfig.digest_token_budget,
+    top_k: int = PipelineConfig.digest_top_k,
+    sample_size: int = PipelineConfig.digest_sample_size,
+) -> str:
+    """Build a bounded summary of a query result for the LLM prompt.
+
+    Results small enough for the token budget are returned as CSV.
+    Larger results are replaced by the row count, per column statistics,
+    the first top_k rows and a stratified sample of rows, cut off once the
+    budget is spent. A partial result is prefixed with the total row count.
+
+    Args:
+        result (ColumnarResult): Result data.
+        total_rows (Union[int, None]): Number of rows of the full result
+                                       when only a part of it is passed.
+        token_budget (int): Maximum estimated tokens of the digest.
+        top_k (int): Number of leading rows to include.
+        sample_size (int): Number of sampled rows to include.
+
+    Returns:
+        str: The result or its digest.
+    """
+    partial = total_rows is not None and total_rows > len(result)
+    header = f"Rows shown: {len(result)} of {total_rows}\n" if partial else ""
+
+    # Stop formatting rows as soon as the budget is exceeded.
+    used = estimate_tokens(header)
+    for row in result.rows():
+        used += estimate_tokens(str(row))
+        if used > token_budget:
+            break
+    else:
+        return header + result.to_csv()
+
+    df = result.to_dataframe()
+    row_count = f"Row count: {len(df)}"
+    if partial:
+        row_count += f" of {total_rows}"
+    sample = _stratified_sample(df, sample_size)
+    sections = [
+        [row_count, f"Columns: {', '.join(df.columns)}"],
+        ["Column statistics:"] + _column_stats(df),
+        [f"First {min(top_k, len(df))} rows:"]
+        + result[:top_k].to_csv().splitlines(),
+        ["Sample rows:"] + sample.to_csv(index=False).splitlines(),
+    ]
+
+    lines, used = [], 0
+    for section in sections:
+        for line in section:
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                lines.append("...")
+                return "\n".join(lines)
+            lines.append(line)
+            used += cost
+    return "\n".join(lines)
@@ -0,0 +1,330 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Union
+
+import numpy as np
+
+from .cache import TOKEN_PATTERN, normalize_question
+
+# Unverified examples only count half as much as verified ones.
+UNVERIFIED_WEIGHT = 0.5
+# Verified flag of removed examples, kept so other processes see removals.
+REMOVED = -1
+
+
+class ExampleStore:
+    """
+    A store of question and SQL pairs with a BM25 index over the
+    questions, persisted in a SQLite file and updated incrementally.
+
+    Every write gets the next version number, so that stores of other
+    processes sharing the file index the changes they have not seen yet
+    before searching. Once there are more than max_examples examples, the
+    oldest unverified ones are removed.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_examples: Union[int, None] = None,
+    ):
+        """
+        Initialize the ExampleStore instance, loading the stored examples.
+
+        Args:
+            db_name (str): Path to the SQLite database file.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+            max_examples (Union[int, None]): Maximum number of examples
+                kept, unlimited if None. Verified examples are never
+                evicted.
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_examples = max_examples
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sql_examples ("
+            "question TEXT PRIMARY KEY, sql TEXT NOT NULL, "
+            "verified INTEGER NOT NULL, created_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {
+            row[1]
+            for row in self._conn.execute("PRAGMA table_info(sql_examples)")
+        }
+        if "version" not in columns:
+            self._conn.execute(
+                "ALTER TABLE sql_examples "
+                "ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        # Syncs read the rows above a version, writes take the maximum.
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sql_examples_version "
+            "ON sql_examples(version)"
+        )
+        self._conn.commit()
+
+        self._data_version = None
+        self._reset()
+        with self._lock:
+            self._sync(force=True)
+
+    def __len__(self) -> int:
+        return sum(1 for weight in self._weights if weight > 0)
+
+    def _reset(self):
+        """Clear the in-memory index, to be read again from the table."""
+        self._questions: List[str] = []
+        self._sqls: List[str] = []
+        self._weights: List[float] = []
+        self._lengths: List[int] = []
+        self._positions: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._arrays: Dict[str, tuple] = {}
+        self._document_arrays = None
+        self._version = -1
+
+    def _index(self, question: str, sql: str, verified: bool):
+        """Add a normalized question to the in-memory index."""
+        weight = 1.0 if verified else UNVERIFIED_WEIGHT
+        self._document_arrays = None
+        position = self._positions.get(question)
+        if position is not None:
+            self._sqls[position] = sql
+            self._weights[position] = weight
+            return
+
+        terms = Counter(TOKEN_PATTERN.findall(question))
+        position = len(self._questions)
+        self._positions[question] = position
+        self._questions.append(question)
+        self._sqls.append(sql)
+        self._weights.append(weight)
+        self._lengths.append(sum(terms.values()))
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[position] = count
+            self._arrays.pop(term, None)
+
+    def _unindex(self, question: str):
+        """Stop returning a normalized question from searches."""
+        position = self._positions.get(question)
+        if position is not None:
+            self._weights[position] = 0.0
+            self._document_arrays = None
+
+    def _sync(self, force: bool = False):
+        """Index the examples written since the last sync.
+
+        Unless forced, the table is only read again once another
+        connection committed a change to the file.
+
+        Args:
+            force (bool): Whether to read the table in any case, e.g.
+                          after a write of this store.
+        """
+        (data_version,) = self._conn.execute(
+            "PRAGMA data_version"
+        ).fetchone()
+        if not force and data_version == self._data_version:
+            return
+        self._data_version = data_version
+        rows = self._conn.execute(
+            "SELECT question, sql, verified, version FROM sql_examples "
+            "WHERE version > ? ORDER BY version",
+            (self._version,),
+        ).fetchall()
+        for question, sql, verified, version in rows:
+            if verified == REMOVED:
+                self._unindex(question)
+            else:
+                self._index(question, sql, bool(verified))
+            self._version = version
+        if rows and len(self._questions) > 2 * len(self) + 64:
+            # Drop removed examples from memory by indexing the table again.
+            self._reset()
+            self._sync(force=True)
+
+    def _write(self, question: str, sql: str, verified: int, guard: str):
+        """Store an example under the next version number, without
+           committing.
+
+        Args:
+            question (str): The normalized question.
+            sql (str): The SQL query.
+            verified (int): 1 if verified, 0 if not, REMOVED if removed.
+            guard (str): SQL condition on the verified flag of the stored
+                         example, which must hold for the write to apply.
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sql_examples "
+            "SELECT ?, ?, ?, ?, next_version FROM ("
+            "SELECT COALESCE(MAX(version), 0) + 1 AS next_version "
+            "FROM sql_examples) WHERE NOT EXISTS ("
+            "SELECT 1 FROM sql_examples "
+            f"WHERE question = ? AND NOT ({guard}))",
+            (question, sql, verified, time.time(), question),
+        )
+
+    def _evict(self):
+        """Remove the oldest unverified examples beyond max_examples,
+           without committing.
+
+        The removals stay in the table for other stores to see, up to
+        max_examples of them.
+        """
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM sql_examples WHERE verified != ?",
+            (REMOVED,),
+        ).fetchone()
+        if count <= self.max_examples:
+            return
+        oldest = self._conn.execute(
+            "SELECT question FROM sql_examples WHERE verified = 0 "
+            "ORDER BY created_at LIMIT ?",
+            (count - self.max_examples,),
+        ).fetchall()
+        for (question,) in oldest:
+            self._write(question, "", REMOVED, "verified = 0")
+        self._conn.execute(
+            "DELETE FROM sql_examples WHERE question IN ("
+            "SELECT question FROM sql_examples WHERE verified = ? "
+            "ORDER BY version DESC LIMIT -1 OFFSET ?)",
+            (REMOVED, self.max_examples),
+        )
+
+    def _posting_arrays(self, term: str):
+        """Get the positions and term counts of a term as arrays."""
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings[term]
+            arrays = self._arrays[term] = (
+                np.fromiter(posting.keys(), dtype=np.int64),
+                np.fromiter(posting.values(), dtype=np.float64),
+            )
+        return arrays
+
+    def _documents(self):
+        """Get the weights and lengths of the examples as arrays."""
+        if self._document_arrays is None:
+            weights = np.array(self._weights, dtype=np.float64)
+            lengths = np.array(self._lengths, dtype=np.float64)
+            active = weights > 0
+            avg_length = lengths[active].mean() if active.any() else 0.0
+            self._document_arrays = (weights, lengths, active, avg_length)
+        return self._document_arrays
+
+    def add(self, question: str, sql: str, verified: bool = False):
+        """
+        Store the SQL query answering a question.
+
+        An unverified query never replaces a verified one.
+
+        Args:
+            question (str): The raw user question.
+            sql (str): The SQL query answering it.
+            verified (bool): Whether a user confirmed the answer.
+        """
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            self._write(
+                key, sql, int(verified), "TRUE" if verified else "verified < 1"
+            )
+            if self.max_examples is not None:
+                self._evict()
+            self._conn.commit()
+            self._sync(force=True)
+
+    def remove(self, question: str):
+        """
+        Forget the example of a question.
+
+        Args:
+            question (str): The raw user question.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._write(key, "", REMOVED, f"verified != {REMOVED}")
+            self._conn.commit()
+            self._sync(force=True)
+
+    def search(self, question: str, k: int = 3) -> List[Dict]:
+        """
+        Find the examples with the questions most similar to a question.
+
+        Args:
+            question (str): The raw user question.
+            k (int): Maximum number of examples to return.
+
+        Returns:
+            List[Dict]: Examples with keys question, sql and score, best
+                        first. Only examples sharing a word are returned.
+        """
+        terms = set(TOKEN_PATTERN.findall(normalize_question(question)))
+        with self._lock:
+            self._sync()
+            weights, lengths, active, avg_length = self._documents()
+            n_active = int(active.sum())
+            if not n_active or k <= 0:
+                return []
+
+            scores = np.zeros(len(weights))
+            for term in terms:
+                if term not in self._postings:
+                    continue
+                positions, counts = self._posting_arrays(term)
+                df = int(active[positions].sum())
+                idf = math.log(1 + (n_active - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (
+                    1 - self.b + self.b * lengths[positions] / avg_length
+                )
+                scores[positions] += (
+                    idf * counts * (self.k1 + 1) / (counts + norm)
+                )
+            scores *= weights
+
+            if k < len(scores):
+                top = np.argpartition(-scores, k)[:k]
+                top = top[np.argsort(-scores[top], kind="stable")]
+            else:
+                top = np.argsort(-scores, kind="stable")
+            return [
+                {
+                    "question": self._questions[i],
+                    "sql": self._sqls[i],
+                    "score": float(scores[i]),
+                }
+                for i in top
+                if scores[i] > 0
+            ]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def format_examples(examples: List[Dict]) -> str:
+    """Format examples for the SQL generation prompt.
+
+    Args:
+        examples (List[Dict]): Examples with keys question and sql.
+
+    Returns:
+        str: The examples section, empty if there are no examples.
+    """
+    if not examples:
+        return ""
+    lines = ["Examples of similar questions and their SQL:"]
+    for example in examples:
+        lines += [f"Question: {example['question']}", example["sql"], ""]
+    return "\n".join(lines)
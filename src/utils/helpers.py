@@ -1,4 +1,53 @@
 import json
+import re
+from typing import Dict
+
+# A markdown code block, possibly unclosed, with an optional language.
+CODE_BLOCK_PATTERN = re.compile(
+    r"```(?:sqlite|sql|json)?\s*(.*?)\s*(?:```|$)", re.S | re.I
+)
+
+
+def strip_code_block(data: str) -> str:
+    """Get the content of the first markdown code block of a response.
+
+    Args:
+        data (str): The response, possibly with text around the block.
+
+    Returns:
+        str: The content of the block, or the whole response stripped of
+             whitespace if it has no block.
+    """
+    match = CODE_BLOCK_PATTERN.search(data)
+    return match.group(1) if match else data.strip()
+
+
+def parse_json_object(data: str, **kwargs) -> Dict:
+    """Parse the JSON object of a response, ignoring a markdown code block
+       or text around the object.
+
+    Args:
+        data (str): The response containing a JSON object.
+        **kwargs: Additional arguments for the JSON decoder.
+
+    Returns:
+        Dict: The parsed object.
+
+    Raises:
+        ValueError: If the response holds no JSON object.
+    """
+    text = strip_code_block(data)
+    try:
+        value = json.loads(text, **kwargs)
+    except json.JSONDecodeError:
+        start = text.find("{")
+        if start < 0:
+            raise
+        # Decode the object, ignoring the text after it.
+        value, _ = json.JSONDecoder(**kwargs).raw_decode(text, start)
+    if not isinstance(value, dict):
+        raise ValueError(f"Expected a JSON object, got {type(value).__name__}")
+    return value
 
 
 def format_sql(data: str) -> str:
@@ -14,7 +63,7 @@ def format_sql(data: str) -> str:
               and extraneous whitespace.
 
     """
-    return data.strip("```sql").strip()
+    return strip_code_block(data)
 
 
 def format_json(data: str) -> dict:
@@ -26,4 +75,17 @@ def format_json(data: str) -> dict:
     Returns:
         dict: The JSON string without markdown code block syntax.
     """
-    return json.loads(data.strip("```json").strip())
+    return parse_json_object(data)
+
+
+def format_sse(event: str, data) -> str:
+    """Format an event for a server-sent events stream.
+
+    Args:
+        event (str): The event name.
+        data: JSON serializable payload of the event.
+
+    Returns:
+        str: The event in text/event-stream format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
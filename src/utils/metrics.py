@@ -0,0 +1,407 @@
+import bisect
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterator, List, Tuple, Union
+
+# Upper bounds of the latency buckets in seconds.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+# Upper bounds of the buckets of row and token counts.
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+Labels = Union[Dict[str, str], None]
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Labels) -> SeriesKey:
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def _series_name(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Write a series as name{label="value",...}, escaping the values."""
+    if not labels:
+        return name
+    pairs = ",".join(
+        '{}="{}"'.format(
+            label,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for label, value in labels
+    )
+    return f"{name}{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """
+    Counts of observed values in cumulative buckets, with their sum.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """
+        Initialize the Histogram instance.
+
+        Args:
+            buckets (Tuple[float, ...]): Increasing bucket upper bounds.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        List the number of values at most each bound.
+
+        Returns:
+            List[Tuple[float, int]]: Bound and count pairs, ending with
+                                     infinity and the total count.
+        """
+        total, pairs = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+
+class Metrics:
+    """
+    A thread-safe registry of named counters and histograms describing
+    the pipeline.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the Metrics instance.
+        """
+        self._counters: Dict[SeriesKey, float] = {}
+        self._histograms: Dict[SeriesKey, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        """
+        Increase a counter, creating it at zero if needed.
+
+        Args:
+            name (str): The counter name.
+            value (float): The amount to add.
+            labels (Labels): Labels of the counter series.
+        """
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def get(self, name: str, labels: Labels = None) -> float:
+        """
+        Read a counter.
+
+        Args:
+            name (str): The counter name.
+            labels (Labels): Labels of the counter series.
+
+        Returns:
+            float: The counter value, 0 if it was never increased.
+        """
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Labels = None,
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        """
+        Record a value in a histogram, creating it if needed.
+
+        Args:
+            name (str): The histogram name.
+            value (float): The observed value.
+            labels (Labels): Labels of the histogram series.
+            buckets (Tuple[float, ...]): Bucket upper bounds of a new
+                                         histogram.
+        """
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def histogram(
+        self, name: str, labels: Labels = None
+    ) -> Union[Histogram, None]:
+        """
+        Read a histogram.
+
+        Args:
+            name (str): The histogram name.
+            labels (Labels): Labels of the histogram series.
+
+        Returns:
+            Union[Histogram, None]: A copy of the histogram, None if
+                                    nothing was observed.
+        """
+        with self._lock:
+            histogram = self._histograms.get(_key(name, labels))
+            return histogram.copy() if histogram else None
+
+    @contextmanager
+    def timer(self, name: str, labels: Labels = None) -> Iterator[None]:
+        """
+        Observe the seconds spent in the block, even if it raises.
+
+        Args:
+            name (str): The histogram name.
+            labels (Labels): Labels of the histogram series.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def timed(self, name: str, labels: Labels = None):
+        """
+        Decorate a coroutine or async generator function to observe the
+        seconds spent in each call, until the generator is exhausted.
+
+        Args:
+            name (str): The histogram name.
+            labels (Labels): Labels of the histogram series.
+        """
+
+        def decorator(function):
+            if inspect.isasyncgenfunction(function):
+
+                @wraps(function)
+                async def timed_generator(*args, **kwargs):
+                    with self.timer(name, labels):
+                        async for item in function(*args, **kwargs):
+                            yield item
+
+                return timed_generator
+
+            @wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                with self.timer(name, labels):
+                    return await function(*args, **kwargs)
+
+            return timed_coroutine
+
+        return decorator
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Copy every counter.
+
+        Returns:
+            Dict[str, float]: Counter values by series name.
+        """
+        with self._lock:
+            return {
+                _series_name(name, labels): value
+                for (name, labels), value in self._counters.items()
+            }
+
+    def render_prometheus(self) -> str:
+        """
+        Write every counter and histogram in the Prometheus text format.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, h.copy()) for key, h in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            series = _series_name(name, labels)
+            lines.append(f"{series} {_format_value(value)}")
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, total in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket = _series_name(f"{name}_bucket", labels + (("le", le),))
+                lines.append(f"{bucket} {total}")
+            lines.append(
+                f"{_series_name(f'{name}_sum', labels)} "
+                f"{_format_value(histogram.sum)}"
+            )
+            lines.append(
+                f"{_series_name(f'{name}_count', labels)} {histogram.count}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Set every counter back to zero and forget every histogram."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def state(self) -> Dict:
+        """
+        Copy every counter and histogram as JSON serializable lists.
+
+        Returns:
+            Dict: Lists of counters and histograms, read by merge.
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), h.buckets, h.counts, h.sum, h.count]
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+    def merge(self, state: Dict):
+        """
+        Add the counters and histograms of another registry to this one.
+
+        Args:
+            state (Dict): The state of the other registry.
+        """
+        with self._lock:
+            for name, labels, value in state["counters"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+            for name, labels, buckets, counts, total, count in state[
+                "histograms"
+            ]:
+                key = (name, tuple(tuple(label) for label in labels))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(buckets)
+                if list(histogram.buckets) != list(buckets):
+                    continue
+                histogram.counts = [
+                    a + b for a, b in zip(histogram.counts, counts)
+                ]
+                histogram.sum += total
+                histogram.count += count
+
+
+class SharedMetrics:
+    """
+    Publishes the metrics of each worker process to a SQLite table, so
+    that any worker can report the metrics of all of them.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        registry: Metrics,
+        worker_id: Union[str, None] = None,
+    ) -> None:
+        """
+        Initialize the SharedMetrics instance.
+
+        Args:
+            db_name (str): Path to the shared SQLite database file.
+            registry (Metrics): The metrics of this worker.
+            worker_id (Union[str, None]): Identifier of this worker, its
+                                          process id if None.
+        """
+        self.registry = registry
+        self.worker_id = worker_id or str(os.getpid())
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS worker_metrics ("
+            "worker TEXT PRIMARY KEY, state TEXT NOT NULL, "
+            "published_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def publish(self):
+        """Write the current metrics of this worker."""
+        state = json.dumps(self.registry.state())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics VALUES (?, ?, ?)",
+                (self.worker_id, state, time.time()),
+            )
+            self._conn.commit()
+
+    def collect(self) -> Metrics:
+        """
+        Sum the last published metrics of every worker.
+
+        Returns:
+            Metrics: A registry holding the totals.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state FROM worker_metrics"
+            ).fetchall()
+        total = Metrics()
+        for (state,) in rows:
+            total.merge(json.loads(state))
+        return total
+
+    def clear(self):
+        """Forget the metrics of every worker, e.g. before a restart."""
+        with self._lock:
+            self._conn.execute("DELETE FROM worker_metrics")
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+metrics = Metrics()
@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Dict, List, Sequence, Union
+
+from src.sqlite_db.db_constants import TABLE_COLUMNS
+
+
+def write_flights_csv(
+    tmp_path: Path,
+    rows: Sequence[Union[List, Dict]],
+    name: str = "flights.csv",
+) -> Path:
+    """Write flights to a CSV file with every column of the flights table.
+
+    Args:
+        tmp_path (Path): Directory of the file.
+        rows (Sequence[Union[List, Dict]]): Values of the leading columns of
+            each flight, or its values by column name. Other columns are
+            left empty.
+        name (str): File name.
+
+    Returns:
+        Path: The CSV file.
+    """
+    columns = list(TABLE_COLUMNS["flights"])
+    lines = [",".join(columns)]
+    for row in rows:
+        if isinstance(row, dict):
+            values = [row.get(column, "") for column in columns]
+        else:
+            values = list(row) + [""] * (len(columns) - len(row))
+        lines.append(",".join(str(value) for value in values))
+    path = tmp_path / name
+    path.write_text("\n".join(lines) + "\n")
+    return path
@@ -0,0 +1,84 @@
+import time
+import pytest
+from src.llm.backends import (
+    Latency,
+    LLMResponse,
+    RecordingBackend,
+    ReplayBackend,
+    prompt_key,
+)
+from src.llm.llm_client import LLMClient
+
+MESSAGES = [{"role": "user", "content": "How many flights?"}]
+
+
+def test_prompt_key_ignores_sampling_parameters():
+    assert prompt_key(MESSAGES, temperature=0.0) == prompt_key(
+        MESSAGES, temperature=0.8
+    )
+    assert prompt_key(MESSAGES) != prompt_key(
+        MESSAGES, response_format={"type": "json_object"}
+    )
+
+
+def test_latency_samples():
+    assert Latency().sample() == 0.0
+    assert Latency.from_spec("fixed:0.5").sample() == 0.5
+
+    first = Latency.from_spec("lognormal:0.8:0.3:7")
+    second = Latency.from_spec("lognormal:0.8:0.3:7")
+    samples = [first.sample() for _ in range(2000)]
+    assert samples[:5] == [second.sample() for _ in range(5)]
+    assert min(samples) > 0
+    assert abs(sum(samples) / len(samples) - 0.8) < 0.05
+
+    with pytest.raises(ValueError):
+        Latency("pareto", 1.0)
+
+
+@pytest.mark.asyncio
+async def test_replay_backend_serves_recorded_responses():
+    backend = ReplayBackend(
+        {prompt_key(MESSAGES): "SELECT COUNT(*) FROM flights;"},
+        latency=Latency("fixed", 0.05),
+    )
+    start = time.perf_counter()
+    response = await backend.acomplete(MESSAGES)
+    assert response.content == "SELECT COUNT(*) FROM flights;"
+    assert time.perf_counter() - start >= 0.05
+    tokens = [token async for token in backend.astream(MESSAGES)]
+    assert "".join(tokens) == "SELECT COUNT(*) FROM flights;"
+    assert len(tokens) == 4
+
+    with pytest.raises(KeyError):
+        backend.complete([{"role": "user", "content": "Unknown"}])
+    assert ReplayBackend(default="None").complete(MESSAGES).content == "None"
+
+
+@pytest.mark.asyncio
+async def test_recording_is_replayed(tmp_path):
+    recording = str(tmp_path / "recording.jsonl")
+    backend = RecordingBackend(
+        ReplayBackend(default=LLMResponse("Many", 12, 1)), recording
+    )
+    assert (await backend.acomplete(MESSAGES)).content == "Many"
+
+    replay = ReplayBackend.from_file(recording)
+    expected = {prompt_key(MESSAGES): LLMResponse("Many", 12, 1)}
+    assert replay.responses == expected
+
+
+@pytest.mark.asyncio
+async def test_llm_client_uses_backend():
+    human_message = "{question}"
+    key = prompt_key(MESSAGES, response_format={"type": "text"})
+    backend = ReplayBackend({key: "9"})
+    client = LLMClient(backend=backend)
+    result = await client.arun(
+        input_message={"question": "How many flights?"},
+        human_message=human_message,
+    )
+    assert result == "9"
+    assert client.run(
+        input_message={"question": "Unknown"}, human_message=human_message
+    ) == ""
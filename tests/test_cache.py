@@ -0,0 +1,148 @@
+import time
+from src.utils.cache import (
+    create_answer_cache,
+    create_cursor_store,
+    normalize_question,
+    question_similarity,
+)
+
+
+def test_normalize_question():
+    assert (
+        normalize_question("  Which airline has the MOST delays?? ")
+        == "which airline has the most delays"
+    )
+
+
+def test_exact_match_hit_and_miss():
+    cache = create_answer_cache()
+    cache.set("How many flights?", "SELECT 1", True, "Many flights")
+
+    entry = cache.get("how many flights")
+    assert entry is not None
+    assert entry.sql == "SELECT 1"
+    assert entry.answer == "Many flights"
+    assert cache.get("How many airports?") is None
+
+
+def test_expired_entries_are_dropped():
+    cache = create_answer_cache(ttl_seconds=0.0)
+    cache.set("How many flights?", "SELECT 1", True, "Many flights")
+    time.sleep(0.01)
+    assert cache.get("How many flights?") is None
+
+
+def test_entries_of_other_data_versions_are_stale():
+    cache = create_answer_cache()
+    cache.set("How many flights?", "SELECT 1", True, "Many", data_version=1)
+    assert cache.get("How many flights?", data_version=1) is not None
+    assert cache.get("How many flights?", data_version=2) is None
+
+
+def test_lru_eviction():
+    cache = create_answer_cache(max_entries=2)
+    cache.set("first question", "SELECT 1", True, "one")
+    cache.set("second question", "SELECT 2", True, "two")
+    cache.get("first question")
+    cache.set("third question", "SELECT 3", True, "three")
+
+    assert cache.get("first question") is not None
+    assert cache.get("second question") is None
+
+
+def test_near_duplicate_match():
+    cache = create_answer_cache(similarity_threshold=0.8)
+    cache.set(
+        "which airline has the most delayed flights in 2015",
+        "SELECT 1",
+        True,
+        "WN",
+    )
+
+    assert cache.get("Which airline has most delayed flights in 2015?")
+    assert cache.get("which airline has most delayed flights in 2014") is None
+
+
+def test_negations_and_comparisons_must_match():
+    assert question_similarity(
+        "which airline has the most delays",
+        "which airline has the least delays",
+    ) == 0.0
+    assert question_similarity(
+        "flights cancelled before noon", "flights cancelled after noon"
+    ) == 0.0
+    assert question_similarity(
+        "which flights were delayed", "which flights were not delayed"
+    ) == 0.0
+
+    cache = create_answer_cache(similarity_threshold=0.5)
+    cache.set("which airline has the most delays", "SELECT 1", True, "WN")
+    assert cache.get("which airline has the fewest delays") is None
+    assert cache.get("which airline has most delays") is not None
+
+
+def test_near_duplicates_must_ask_for_the_same_things():
+    assert question_similarity(
+        "delays for delta in january", "delays for united in february"
+    ) == 0.0
+    assert question_similarity(
+        "flights from atl to jfk", "flights from jfk to atl"
+    ) == 0.0
+    assert question_similarity(
+        "what are the delays of delta", "show the delays for delta"
+    ) > 0.0
+
+
+def test_rejections_are_not_served_to_similar_questions():
+    cache = create_answer_cache(similarity_threshold=0.5)
+    cache.set("what is the weather for delta", "", False, "Out of scope")
+    assert cache.get("What is the weather for Delta?") is not None
+    assert cache.get("what is the weather of delta") is None
+
+
+def test_sqlite_near_duplicates_see_other_connections(tmp_path):
+    db_name = tmp_path / "cache.db"
+    first = create_answer_cache(
+        backend="sqlite", db_name=db_name, similarity_threshold=0.8
+    )
+    second = create_answer_cache(
+        backend="sqlite", db_name=db_name, similarity_threshold=0.8
+    )
+    assert second.get("which airline has the most delayed flights") is None
+
+    first.set("which airline has the most delayed flights", "S", True, "WN")
+    assert second.get("which airline has most delayed flights").answer == "WN"
+
+
+def test_sqlite_backend_persists(tmp_path):
+    db_name = tmp_path / "cache.db"
+    cache = create_answer_cache(backend="sqlite", db_name=db_name)
+    cache.set("How many flights?", "SELECT 1", False, "Out of scope")
+
+    reopened = create_answer_cache(backend="sqlite", db_name=db_name)
+    entry = reopened.get("how many flights")
+    assert entry is not None
+    assert entry.is_valid is False
+
+
+def test_sqlite_backend_batches_access_times(tmp_path):
+    cache = create_answer_cache(
+        backend="sqlite", db_name=tmp_path / "cache.db", max_entries=2
+    )
+    cache.set("first question", "SELECT 1", True, "one")
+    cache.set("second question", "SELECT 2", True, "two")
+    cache.get("first question")
+    assert cache.backend._touched
+
+    cache.set("third question", "SELECT 3", True, "three")
+    assert not cache.backend._touched
+    assert cache.get("first question") is not None
+    assert cache.get("second question") is None
+
+
+def test_cursor_store_round_trip():
+    store = create_cursor_store()
+    token = store.create(sql="SELECT 1", message="One")
+
+    assert store.get(token)["sql"] == "SELECT 1"
+    assert store.get("unknown") is None
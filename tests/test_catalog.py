@@ -0,0 +1,68 @@
+import sqlite3
+import pytest
+from src.sqlite_db.catalog import SchemaCatalog, get_catalog, introspect_table
+from src.sqlite_db.create import csv_to_sqlite
+from tests.conftest import write_flights_csv
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    airlines = tmp_path / "airlines.csv"
+    airlines.write_text("IATA_CODE,AIRLINE\nAA,American Airlines Inc.\n")
+    flights = write_flights_csv(
+        tmp_path,
+        [[2015, 1, 1, 4, "AA", 98, "N407AS", "ANC", "SEA", 5, 2354.0, -11.0]],
+    )
+    db_path = tmp_path / "flights.db"
+    csv_to_sqlite(db_path, {"airlines": airlines, "flights": flights})
+    return db_path
+
+
+def test_catalog_introspects_tables(db_path):
+    catalog = get_catalog(db_path)
+    assert isinstance(catalog, SchemaCatalog)
+    assert "_ingest_progress" not in catalog.tables
+    assert "rollup_airline_month" in catalog.tables
+
+    flights = catalog.tables["flights"]
+    assert flights.row_count == 1
+    assert "idx_flights_date" in flights.indexes
+    origin = next(c for c in flights.columns if c.name == "ORIGIN_AIRPORT")
+    assert (origin.type, origin.samples) == ("TEXT", ["ANC"])
+    assert origin.distinct_values == 1
+    assert get_catalog(db_path) is catalog
+
+
+def test_relevant_schema_prunes_columns(db_path):
+    schema = get_catalog(db_path).relevant_schema(
+        "Which airline had the most cancelled flights from ANC?"
+    )
+    flights = next(
+        line for line in schema.splitlines() if line.startswith("- flights")
+    )
+    assert "CANCELLED INTEGER" in flights
+    assert "ORIGIN_AIRPORT TEXT" in flights
+    assert "TAXI_OUT" not in flights
+    assert "ORIGIN_AIRPORT TEXT ~1 distinct e.g. 'ANC'" in flights
+    assert "(ORIGIN_AIRPORT, YEAR, MONTH)" in flights
+    assert "- airlines.IATA_CODE = flights.AIRLINE" in schema
+
+
+def test_query_schema_describes_referenced_tables(db_path):
+    schema = get_catalog(db_path).query_schema("SELECT * FROM airlines")
+    assert schema.splitlines() == [
+        "- airlines ~1 rows (IATA_CODE TEXT ~1 distinct e.g. 'AA', "
+        "AIRLINE TEXT ~1 distinct e.g. 'American Airlines Inc.') "
+        "indexed on (IATA_CODE)"
+    ]
+
+
+def test_introspection_samples_the_whole_table():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE trips (ORIGIN TEXT)")
+    conn.executemany(
+        "INSERT INTO trips VALUES (?)",
+        [("ANC",)] * 90 + [("SEA",)] * 10,
+    )
+    table = introspect_table(conn, "trips", sample_rows=10)
+    assert set(table.columns[0].samples) == {"ANC", "SEA"}
@@ -0,0 +1,108 @@
+import pytest
+import sqlite3
+from src.sqlite_db.create import (
+    append_flights,
+    csv_to_sqlite,
+    ingest_csv,
+)
+from tests.conftest import write_flights_csv
+
+FLIGHT_ROWS = [
+    [2015, 1, 1, 4, "AA", 98, "N407AS", "ANC", "SEA", 5, 2354.0, -11.0],
+    [2015, 1, 2, 5, "DL", 2336, "N3KUAA", "LAX", "PBI", 10, 2.0, -8.0],
+]
+
+
+@pytest.fixture
+def csv_files(tmp_path):
+    airlines = tmp_path / "airlines.csv"
+    airlines.write_text(
+        "IATA_CODE,AIRLINE\nAA,American Airlines Inc.\nDL,Delta Air Lines\n"
+    )
+    flights = write_flights_csv(tmp_path, FLIGHT_ROWS)
+    return {"airlines": airlines, "flights": flights}
+
+
+def test_csv_to_sqlite_typed_schema(tmp_path, csv_files):
+    db_path = tmp_path / "flights.db"
+    csv_to_sqlite(db_path, csv_files)
+
+    conn = sqlite3.connect(db_path)
+    columns = {
+        row[1]: (row[2], row[5])
+        for row in conn.execute("PRAGMA table_info(flights)")
+    }
+    assert columns["MONTH"] == ("INTEGER", 0)
+    assert columns["DEPARTURE_DELAY"] == ("REAL", 0)
+    assert conn.execute(
+        "SELECT typeof(FLIGHT_NUMBER), typeof(WEATHER_DELAY) FROM flights"
+    ).fetchone() == ("integer", "null")
+    primary_keys = [
+        row[1]
+        for row in conn.execute("PRAGMA table_info(airlines)")
+        if row[5]
+    ]
+    assert primary_keys == ["IATA_CODE"]
+    conn.close()
+
+
+def test_csv_to_sqlite_indexes_and_statistics(tmp_path, csv_files):
+    db_path = tmp_path / "flights.db"
+    csv_to_sqlite(db_path, csv_files, covering_indexes=True)
+
+    conn = sqlite3.connect(db_path)
+    indexes = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+    assert {"idx_flights_date", "idx_flights_airline_delays"} <= indexes
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM flights "
+        "WHERE YEAR = 2015 AND MONTH = 1"
+    ).fetchall()
+    assert "idx_flights_date" in str(plan)
+    conn.close()
+
+
+def test_ingest_csv_resumes_in_chunks(tmp_path, csv_files):
+    conn = sqlite3.connect(tmp_path / "flights.db")
+    flights = csv_files["flights"]
+    assert ingest_csv(conn, "flights", flights, n_rows=1, chunk_size=1) == 1
+    assert ingest_csv(conn, "flights", flights, chunk_size=1, resume=True) == 2
+
+    numbers = [
+        row[0]
+        for row in conn.execute("SELECT FLIGHT_NUMBER FROM flights")
+    ]
+    assert numbers == [98, 2336]
+    assert conn.execute(
+        "SELECT rows_loaded, completed FROM _ingest_progress"
+    ).fetchone() == (2, 1)
+    conn.close()
+
+
+def test_append_flights_skips_duplicates(tmp_path, csv_files):
+    db_path = tmp_path / "flights.db"
+    csv_to_sqlite(db_path, csv_files)
+    new_flights = tmp_path / "new_flights.csv"
+    lines = csv_files["flights"].read_text().splitlines()
+    extra = lines[1].replace("2015,1,1,", "2015,2,1,")
+    new_flights.write_text("\n".join([lines[0], lines[2], extra, extra]))
+
+    assert append_flights(db_path, new_flights) == 1
+    assert append_flights(db_path, new_flights) == 0
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM flights").fetchone()[0] == 3
+    assert conn.execute(
+        "SELECT FLIGHTS FROM rollup_airline_month WHERE MONTH = 2"
+    ).fetchone() == (1,)
+    assert conn.execute(
+        "SELECT rows_read, rows_added, last_date, data_version "
+        "FROM _ingest_watermark ORDER BY id"
+    ).fetchall() == [(3, 1, "2015-02-01", 2), (3, 0, "2015-02-01", 2)]
+    conn.close()
@@ -0,0 +1,35 @@
+from src.sqlite_db.result import ColumnarResult
+from src.utils.digest import build_result_digest, estimate_tokens
+
+
+def test_small_result_is_unchanged():
+    result = ColumnarResult.from_records([{"AIRLINE": "AA", "delay": 1.5}])
+    assert build_result_digest(result) == "AIRLINE,delay\nAA,1.5\n"
+
+
+def test_large_result_is_summarized_within_budget():
+    result = ColumnarResult.from_records(
+        [
+            {"AIRLINE": ["AA", "DL", "WN"][i % 3], "delay": float(i)}
+            for i in range(10000)
+        ]
+    )
+    digest = build_result_digest(result, token_budget=300)
+
+    assert estimate_tokens(digest) <= 300 + 10
+    assert "Row count: 10000" in digest
+    assert "delay: min=0, max=9999, mean=5000" in digest
+    assert "AIRLINE: distinct=3" in digest
+
+
+def test_sample_covers_every_group():
+    result = ColumnarResult.from_records(
+        [
+            {"AIRLINE": "AA" if i < 9990 else "DL", "delay": i}
+            for i in range(10000)
+        ]
+    )
+    digest = build_result_digest(result, token_budget=1000, top_k=2)
+
+    sample = digest.split("Sample rows:")[1]
+    assert "DL," in sample
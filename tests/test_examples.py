@@ -0,0 +1,83 @@
+from src.utils.examples import ExampleStore, format_examples
+
+
+def _store(tmp_path):
+    store = ExampleStore(str(tmp_path / "examples.db"))
+    store.add(
+        "Which airline has the most cancelled flights?",
+        "SELECT AIRLINE FROM flights;",
+    )
+    store.add(
+        "What is the average arrival delay per airport?",
+        "SELECT ORIGIN_AIRPORT FROM flights;",
+    )
+    store.add("How many airports are there?", "SELECT COUNT(*) FROM airports;")
+    return store
+
+
+def test_search_ranks_similar_questions_first(tmp_path):
+    store = _store(tmp_path)
+    examples = store.search("Which airline cancelled the most flights?", k=2)
+    assert examples[0]["sql"] == "SELECT AIRLINE FROM flights;"
+    assert len(examples) <= 2
+    assert store.search("weather forecast", k=2) == []
+
+
+def test_verified_examples_outrank_unverified(tmp_path):
+    store = _store(tmp_path)
+    store.add("Average delay per airline?", "SELECT 1;")
+    store.add("Average delay per airport?", "SELECT 2;", verified=True)
+    assert store.search("average delay per", k=1)[0]["sql"] == "SELECT 2;"
+
+    # A verified example is not replaced by an unverified one.
+    store.add("Average delay per airport?", "SELECT 3;")
+    assert store.search("delay airport", k=1)[0]["sql"] == "SELECT 2;"
+
+
+def test_examples_persist_and_remove(tmp_path):
+    store = _store(tmp_path)
+    store.remove("How many airports are there?")
+    store.close()
+
+    reloaded = ExampleStore(str(tmp_path / "examples.db"))
+    assert len(reloaded) == 2
+    assert all(
+        "airports" not in e["sql"] for e in reloaded.search("airports", k=3)
+    )
+
+
+def test_format_examples():
+    assert format_examples([]) == ""
+    text = format_examples([{"question": "how many flights", "sql": "S;"}])
+    assert "Question: how many flights\nS;" in text
+
+
+def test_stores_sharing_a_file_see_each_other(tmp_path):
+    first = _store(tmp_path)
+    second = ExampleStore(str(tmp_path / "examples.db"))
+    assert len(second) == 3
+
+    first.add("Average delay per airport?", "SELECT 2;", verified=True)
+    assert second.search("delay airport", k=1)[0]["sql"] == "SELECT 2;"
+    # The verified example of the other store is not replaced.
+    second.add("Average delay per airport?", "SELECT 3;")
+    assert first.search("delay airport", k=1)[0]["sql"] == "SELECT 2;"
+
+    second.remove("Average delay per airport?")
+    assert first.search("delay airport", k=1)[0]["sql"] != "SELECT 2;"
+    assert len(first) == len(second) == 3
+
+
+def test_oldest_unverified_examples_are_evicted(tmp_path):
+    store = ExampleStore(str(tmp_path / "examples.db"), max_examples=2)
+    store.add("Average delay per airline?", "SELECT 1;", verified=True)
+    store.add("How many airports are there?", "SELECT 2;")
+    store.add("How many airlines are there?", "SELECT 3;")
+    store.add("How many flights are there?", "SELECT 4;")
+
+    assert len(store) == 2
+    sqls = {e["sql"] for e in store.search("how many average delay", k=5)}
+    assert sqls == {"SELECT 1;", "SELECT 4;"}
+
+    other = ExampleStore(str(tmp_path / "examples.db"))
+    assert len(other) == 2
@@ -1,5 +1,5 @@
 import pytest
-from src.sqlite_db.execute import execute_query
+from src.sqlite_db.execute import execute_query, execute_page
 import sqlite3
 
 
@@ -34,3 +34,97 @@ def test_execute_query_invalid_sql(temp_db):
     assert result is None  # Should be None when an error occurs
     assert error is not None  # There should be an error message
     assert "SQL Error" in error  # Checking for SQL error message
+
+
+@pytest.fixture
+def paged_db(tmp_path):
+    db_path = tmp_path / "paged.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE flights (id INTEGER)")
+    conn.executemany(
+        "INSERT INTO flights VALUES (?)", [(i,) for i in range(25)]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_execute_query_limit(paged_db):
+    result, error = execute_query(
+        paged_db,
+        "SELECT id FROM flights ORDER BY id -- all flights;",
+        limit=5,
+        offset=10,
+    )
+    assert error is None
+    assert [row["id"] for row in result.to_records()] == [10, 11, 12, 13, 14]
+
+
+def test_execute_page_with_params(paged_db):
+    result, error, page = execute_page(
+        paged_db,
+        "SELECT id FROM flights WHERE id >= ? ORDER BY id",
+        page=2,
+        page_size=5,
+        count_cap=100,
+        params=[15],
+    )
+    assert error is None
+    assert [row["id"] for row in result.to_records()] == [20, 21, 22, 23, 24]
+    assert page["total"] == 10
+
+
+def test_execute_page_with_total(paged_db):
+    result, error, page = execute_page(
+        paged_db,
+        "SELECT id FROM flights;",
+        page=2,
+        page_size=10,
+        count_cap=100,
+    )
+    assert error is None
+    assert len(result) == 10
+    assert page["has_more"] is True
+    assert page["total"] == 25
+    assert page["total_capped"] is False
+
+
+def test_execute_page_total_capped(paged_db):
+    _, _, page = execute_page(
+        paged_db, "SELECT id FROM flights", page_size=10, count_cap=20
+    )
+    assert page["total"] == 20
+    assert page["total_capped"] is True
+
+
+def test_execute_page_reuses_known_total(paged_db):
+    _, _, page = execute_page(
+        paged_db,
+        "SELECT id FROM flights",
+        page=2,
+        page_size=10,
+        count_cap=100,
+        total=99,
+    )
+    # The rows are not counted again.
+    assert (page["total"], page["total_capped"]) == (99, False)
+
+    # The last page knows the exact total without counting.
+    _, _, page = execute_page(
+        paged_db,
+        "SELECT id FROM flights",
+        page=3,
+        page_size=10,
+        count_cap=20,
+        total=20,
+        total_capped=True,
+    )
+    assert (page["total"], page["total_capped"]) == (25, False)
+
+
+def test_execute_page_last_page(paged_db):
+    result, _, page = execute_page(
+        paged_db, "SELECT id FROM flights", page=3, page_size=10
+    )
+    assert len(result) == 5
+    assert page["has_more"] is False
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+import sqlite3
+from src.sqlite_db.executor import QueryExecutor
+from src.sqlite_db.validate import validate_query
+
+SLOW_QUERY = """
+WITH RECURSIVE counter(n) AS (
+    SELECT 1 UNION ALL SELECT n + 1 FROM counter
+)
+SELECT COUNT(*) AS total FROM counter
+"""
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE flights (id INTEGER, name TEXT)")
+    conn.execute("INSERT INTO flights VALUES (1, 'Flight A')")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def executor():
+    executor = QueryExecutor(max_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_success(executor, temp_db):
+    result, error = await executor.run(temp_db, "SELECT * FROM flights")
+    assert result.to_records() == [{"id": 1, "name": "Flight A"}]
+    assert error is None
+
+
+@pytest.mark.asyncio
+async def test_run_timeout(executor, temp_db):
+    result, error = await executor.run(temp_db, SLOW_QUERY, timeout=0.1)
+    assert result is None
+    assert error.startswith("Timeout Error")
+
+
+@pytest.mark.asyncio
+async def test_run_cancel_interrupts_query(executor, temp_db):
+    task = asyncio.create_task(executor.run(temp_db, SLOW_QUERY))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # The worker is free again once the query has been interrupted.
+    result, error = await asyncio.wait_for(
+        executor.run(temp_db, "SELECT * FROM flights"), timeout=5
+    )
+    assert error is None
+
+
+@pytest.mark.asyncio
+async def test_call_runs_on_a_worker_thread(executor, temp_db):
+    result = await executor.call(validate_query, temp_db, "SELECT id FROM x")
+    assert result["errors"][0]["code"] == "schema_error"
@@ -2,8 +2,11 @@ import pytest
 from unittest.mock import patch, AsyncMock
 from src.llm.generator import (
     generate_sql_query,
+    generate_sql_json,
     validate_sql_query,
+    repair_sql_query,
     generate_natural_response,
+    stream_natural_response,
 )
 
 
@@ -25,6 +28,40 @@ async def test_generate_sql_query_success(mock_llm):
     assert result == expected_response
 
 
+@pytest.mark.asyncio
+async def test_generate_sql_query_forwards_temperature(mock_llm):
+    mock_llm.arun.return_value = "SELECT * FROM flights"
+    await generate_sql_query(mock_llm, "test query", temperature=0.7)
+    assert mock_llm.arun.call_args.kwargs["temperature"] == 0.7
+
+
+@pytest.mark.asyncio
+async def test_generate_sql_json_in_one_call(mock_llm):
+    mock_llm.arun.return_value = {
+        "sql": "SELECT * FROM flights",
+        "in_scope": True,
+        "tables_used": ["flights"],
+    }
+    result = await generate_sql_json(mock_llm, "test query")
+    assert result == {
+        "status": True,
+        "result": "SELECT * FROM flights",
+        "tables_used": ["flights"],
+    }
+    assert mock_llm.arun.call_args.kwargs["response_format"] == "json_object"
+
+    # Responses the client could not parse are parsed again.
+    mock_llm.arun.return_value = (
+        'Sure: {"sql": "SELECT 1", "in_scope": false, "tables_used": []}'
+    )
+    result = await generate_sql_json(mock_llm, "what is the weather")
+    assert result == {"status": True, "result": None, "tables_used": []}
+
+    mock_llm.arun.return_value = "no JSON here"
+    result = await generate_sql_json(mock_llm, "test query")
+    assert result["status"] is False
+
+
 @pytest.mark.asyncio
 async def test_validate_sql_query_invalid(mock_llm):
     mock_response = "{'is_valid': true}"
@@ -34,6 +71,21 @@ async def test_validate_sql_query_invalid(mock_llm):
     assert result == expected_response
 
 
+@pytest.mark.asyncio
+async def test_repair_sql_query_sends_error(mock_llm):
+    mock_llm.arun.return_value = "SELECT AIRLINE FROM flights"
+    result = await repair_sql_query(
+        mock_llm,
+        "which airline",
+        "SELECT nope FROM flights",
+        "no such column: nope",
+        "- flights (AIRLINE TEXT)",
+    )
+    assert result == {"status": True, "result": "SELECT AIRLINE FROM flights"}
+    input_msg = mock_llm.arun.call_args.kwargs["input_message"]
+    assert input_msg["error"] == "no such column: nope"
+
+
 @pytest.mark.asyncio
 async def test_generate_natural_response_success(mock_llm):
     mock_response = "Found 5 flights"
@@ -42,3 +94,20 @@ async def test_generate_natural_response_success(mock_llm):
     expected_response = {"status": True, "result": mock_response}
     result = await generate_natural_response(mock_llm, "how many flights", "5")
     assert result == expected_response
+
+
+@pytest.mark.asyncio
+async def test_stream_natural_response_success(mock_llm):
+    async def mock_stream(**kwargs):
+        for token in ["Found ", "5 ", "flights"]:
+            yield token
+
+    mock_llm.astream = mock_stream
+
+    tokens = [
+        token
+        async for token in stream_natural_response(
+            mock_llm, "how many flights", "5"
+        )
+    ]
+    assert "".join(tokens) == "Found 5 flights"
@@ -1,4 +1,10 @@
-from src.utils.helpers import format_sql, format_json
+import pytest
+from src.utils.helpers import (
+    format_sql,
+    format_json,
+    format_sse,
+    parse_json_object,
+)
 
 
 def test_format_sql_cleans_markdown():
@@ -6,6 +12,9 @@ def test_format_sql_cleans_markdown():
         ("```sql\nSELECT * FROM flights;\n```", "SELECT * FROM flights;"),
         ("```SELECT * FROM flights;```", "SELECT * FROM flights;"),
         ("SELECT * FROM flights;", "SELECT * FROM flights;"),
+        ("SELECT COUNT(*) FROM flights", "SELECT COUNT(*) FROM flights"),
+        ("Here it is:\n```sql\nSELECT 1;\n```\nDone.", "SELECT 1;"),
+        ("```sqlite\nSELECT 1;", "SELECT 1;"),
     ]
 
     for input_sql, expected in test_cases:
@@ -17,7 +26,21 @@ def test_format_json_parses_correctly():
         ('```json\n{"valid": true}\n```', {"valid": True}),
         ('{"valid": false}', {"valid": False}),
         ('  \n\n{"count": 5}  ', {"count": 5}),
+        ('The result is {"sql": "SELECT 1"} as asked.', {"sql": "SELECT 1"}),
+        ('```\n{"valid": true}\n```', {"valid": True}),
     ]
 
     for input_json, expected in test_cases:
         assert format_json(input_json) == expected
+
+
+def test_parse_json_object_rejects_other_responses():
+    for response in ("None", "[1, 2]", "{broken"):
+        with pytest.raises(ValueError):
+            parse_json_object(response)
+
+
+def test_format_sse():
+    assert format_sse("rows", [{"id": 1}]) == (
+        'event: rows\ndata: [{"id": 1}]\n\n'
+    )
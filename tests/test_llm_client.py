@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from src.llm.backends import ReplayBackend
+from src.llm.llm_client import LLMClient
+from src.llm.telemetry import TelemetryExporter, TelemetrySink
+
+
+class ListSink(TelemetrySink):
+    def __init__(self):
+        self.events = []
+
+    def export(self, events):
+        self.events.extend(events)
+
+
+@pytest.mark.asyncio
+async def test_requests_get_their_own_trace():
+    client = LLMClient(backend=ReplayBackend(default="9"), trace_id="client")
+    assert client.trace_id == "client"
+
+    async def current_trace_id():
+        await asyncio.sleep(0)
+        return client.trace_id
+
+    async def request():
+        with client.trace_request() as trace_id:
+            # Tasks started within the request inherit its trace.
+            inner = await asyncio.ensure_future(current_trace_id())
+            with client.trace_request() as joined:
+                assert joined == trace_id
+            return trace_id, inner
+
+    (first, first_inner), (second, _) = await asyncio.gather(
+        request(), request()
+    )
+    assert first == first_inner
+    assert first != second
+    assert client.trace_id == "client"
+
+
+def test_feedback_scores_the_given_trace():
+    sink = ListSink()
+    client = LLMClient(
+        backend=ReplayBackend(default="9"),
+        telemetry=TelemetryExporter(sink),
+    )
+
+    client.score_generation(5, "Helpfulness", trace_id="request")
+    client.score_generation(1, "Helpfulness")
+    client.close()
+    scored = [event for event in sink.events if event["type"] == "score"]
+    assert [score["trace_id"] for score in scored] == [
+        "request",
+        client.trace_id,
+    ]
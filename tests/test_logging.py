@@ -0,0 +1,59 @@
+import json
+import logging
+import sys
+import threading
+from src.config.log_config import LogConfig
+from src.config.log_handlers import QueueListenerHandler
+from src.config.log_path_formatter import JsonFormatter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class Payload:
+    def __init__(self):
+        self.thread = None
+
+    def __str__(self):
+        self.thread = threading.current_thread()
+        return "payload"
+
+
+def test_queue_handler_formats_off_the_calling_thread():
+    target = ListHandler()
+    target.set_name("test_list_handler")
+    handler = QueueListenerHandler("test_list_handler")
+    logger = logging.getLogger("test_queue_handler")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        payload = Payload()
+        logger.warning("Result: %s", payload)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    assert target.messages == ["Result: payload"]
+    assert payload.thread is not threading.current_thread()
+
+
+def test_json_formatter_truncates_messages(monkeypatch):
+    monkeypatch.setattr(LogConfig, "max_message_chars", 10)
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record = logging.LogRecord(
+            "root", logging.ERROR, __file__, 3, "%s", ("x" * 25,), None
+        )
+        record.exc_info = sys.exc_info()
+
+    fields = json.loads(JsonFormatter().format(record))
+    assert fields["level"] == "ERROR"
+    assert fields["message"] == "x" * 10 + "... [15 chars truncated]"
+    assert fields["exception"].endswith("ValueError: bad")
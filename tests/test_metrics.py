@@ -0,0 +1,114 @@
+import threading
+import pytest
+from src.utils.metrics import Histogram, Metrics, SharedMetrics
+
+
+def test_increment_and_snapshot():
+    metrics = Metrics()
+    metrics.increment("sql_repair_attempts")
+    metrics.increment("sql_repair_attempts", 2)
+
+    assert metrics.get("sql_repair_attempts") == 3
+    assert metrics.get("unknown") == 0
+    assert metrics.snapshot() == {"sql_repair_attempts": 3}
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_increment_is_thread_safe():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.increment("calls")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.get("calls") == 4000
+
+
+def test_labels_are_separate_series():
+    metrics = Metrics()
+    metrics.increment("llm_requests_total", labels={"status": "success"})
+    metrics.increment("llm_requests_total", labels={"status": "error"})
+    metrics.increment("llm_requests_total", labels={"status": "error"})
+
+    assert metrics.get("llm_requests_total", {"status": "error"}) == 2
+    assert metrics.get("llm_requests_total") == 0
+    assert metrics.snapshot() == {
+        'llm_requests_total{status="success"}': 1,
+        'llm_requests_total{status="error"}': 2,
+    }
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert histogram.count == 4
+    assert histogram.sum == 2.65
+
+
+@pytest.mark.asyncio
+async def test_timer_and_timed():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.timer("stage_seconds", {"stage": "execute"}):
+            raise ValueError()
+    assert metrics.histogram("stage_seconds", {"stage": "execute"}).count == 1
+    assert metrics.histogram("stage_seconds") is None
+
+    @metrics.timed("request_seconds")
+    async def answer():
+        return 42
+
+    @metrics.timed("request_seconds")
+    async def events():
+        yield 1
+        yield 2
+
+    assert await answer() == 42
+    assert [event async for event in events()] == [1, 2]
+    assert metrics.histogram("request_seconds").count == 2
+
+
+def test_render_prometheus():
+    metrics = Metrics()
+    metrics.increment("sqlite_errors_total", labels={"error": 'SQL "Error"'})
+    metrics.observe("sqlite_rows_returned", 5, buckets=(1, 10))
+
+    assert metrics.render_prometheus().splitlines() == [
+        "# TYPE sqlite_errors_total counter",
+        'sqlite_errors_total{error="SQL \\"Error\\""} 1',
+        "# TYPE sqlite_rows_returned histogram",
+        'sqlite_rows_returned_bucket{le="1"} 0',
+        'sqlite_rows_returned_bucket{le="10"} 1',
+        'sqlite_rows_returned_bucket{le="+Inf"} 1',
+        "sqlite_rows_returned_sum 5",
+        "sqlite_rows_returned_count 1",
+    ]
+
+
+def test_shared_metrics_sum_the_workers(tmp_path):
+    db_name = str(tmp_path / "shared.db")
+    first, second = Metrics(), Metrics()
+    first.increment("requests_total", labels={"status": "success"})
+    second.increment("requests_total", 2, labels={"status": "success"})
+    first.observe("request_seconds", 0.1)
+    second.observe("request_seconds", 0.3)
+
+    for worker, registry in (("1", first), ("2", second)):
+        shared = SharedMetrics(db_name, registry, worker_id=worker)
+        shared.publish()
+    total = shared.collect()
+    assert total.get("requests_total", {"status": "success"}) == 3
+    assert total.histogram("request_seconds").count == 2
+
+    shared.clear()
+    assert shared.collect().snapshot() == {}
+    shared.close()
@@ -0,0 +1,62 @@
+import pytest
+import sqlite3
+import threading
+from src.sqlite_db.pool import ConnectionPool
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE flights (id INTEGER, name TEXT)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_pool_connection_is_read_only_wal(temp_db):
+    pool = ConnectionPool(temp_db)
+    conn = pool.connection()
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO flights VALUES (1, 'Flight A')")
+    pool.close()
+
+
+def test_pool_reuses_connection_per_thread(temp_db):
+    pool = ConnectionPool(temp_db)
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.connection()))
+    thread.start()
+    thread.join()
+
+    assert pool.connection() is pool.connection()
+    assert pool.connection() is not other[0]
+    pool.close()
+
+
+def test_pool_replaces_broken_connection(temp_db):
+    pool = ConnectionPool(temp_db, health_check_interval=0.0)
+    conn = pool.connection()
+    conn.close()
+
+    assert pool.connection() is not conn
+    assert pool.health_check()
+    pool.close()
+
+
+def test_pool_health_check_missing_database(tmp_path):
+    pool = ConnectionPool(tmp_path / "missing.db")
+    assert not pool.health_check()
+
+
+def test_pool_reads_data_version(temp_db):
+    pool = ConnectionPool(temp_db)
+    assert pool.data_version() == 0
+
+    conn = sqlite3.connect(temp_db)
+    conn.execute("PRAGMA user_version=3")
+    conn.close()
+    assert pool.data_version() == 3
+    pool.close()
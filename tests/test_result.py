@@ -0,0 +1,46 @@
+import json
+import numpy as np
+import pytest
+from src.sqlite_db.result import ColumnarResult
+
+
+@pytest.fixture
+def result():
+    return ColumnarResult.from_rows(
+        ["AIRLINE", "FLIGHTS", "DELAY"],
+        [("AA", 10, 1.5), ("DL", 20, None), ("WN", 30, 3.0)],
+    )
+
+
+def test_column_arrays(result):
+    assert len(result) == 3
+    assert result.arrays[1].dtype == np.int64
+    assert result.arrays[2].dtype == np.float64
+    assert result.arrays[0].dtype == object
+
+
+def test_to_records_and_slicing(result):
+    assert result[1:].to_records() == [
+        {"AIRLINE": "DL", "FLIGHTS": 20, "DELAY": None},
+        {"AIRLINE": "WN", "FLIGHTS": 30, "DELAY": 3.0},
+    ]
+
+
+def test_to_json(result):
+    assert json.loads(result.to_json()) == {
+        "columns": ["AIRLINE", "FLIGHTS", "DELAY"],
+        "data": [["AA", "DL", "WN"], [10, 20, 30], [1.5, None, 3.0]],
+    }
+
+
+def test_to_csv(result):
+    assert result.to_csv() == (
+        "AIRLINE,FLIGHTS,DELAY\nAA,10,1.5\nDL,20,\nWN,30,3.0\n"
+    )
+
+
+def test_to_arrow_ipc(result):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.ipc.open_stream(result.to_arrow_ipc()).read_all()
+    assert table.column_names == result.columns
+    assert table.num_rows == 3
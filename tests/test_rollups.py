@@ -0,0 +1,64 @@
+import pytest
+import sqlite3
+from src.sqlite_db.create import create_table
+from src.sqlite_db.rollups import refresh_rollup
+
+COLUMNS = [
+    "YEAR",
+    "MONTH",
+    "DAY",
+    "DAY_OF_WEEK",
+    "AIRLINE",
+    "FLIGHT_NUMBER",
+    "ORIGIN_AIRPORT",
+    "DESTINATION_AIRPORT",
+    "ARRIVAL_DELAY",
+    "CANCELLED",
+]
+
+
+def insert_flights(conn, rows):
+    conn.executemany(
+        f"INSERT INTO flights ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))})",
+        rows,
+    )
+    conn.commit()
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    create_table(conn, "flights")
+    insert_flights(
+        conn,
+        [
+            (2015, 1, 1, 4, "AA", 1, "JFK", "LAX", 20.0, 0),
+            (2015, 1, 2, 5, "AA", 2, "JFK", "SFO", None, 1),
+            (2015, 2, 1, 7, "DL", 3, "ATL", "LAX", 5.0, 0),
+        ],
+    )
+    yield conn
+    conn.close()
+
+
+def test_refresh_rollup_builds_aggregates(conn):
+    assert refresh_rollup(conn, "rollup_airline_month") == -1
+    rows = conn.execute(
+        "SELECT AIRLINE, MONTH, FLIGHTS, CANCELLED_FLIGHTS, "
+        "ARRIVAL_DELAY_SUM, ARRIVAL_DELAY_COUNT, DELAYED_ARRIVALS "
+        "FROM rollup_airline_month ORDER BY AIRLINE"
+    ).fetchall()
+    assert rows == [("AA", 1, 2, 1, 20, 1, 1), ("DL", 2, 1, 0, 5, 1, 0)]
+
+
+def test_refresh_rollup_only_new_months(conn):
+    refresh_rollup(conn, "rollup_airline_month")
+    insert_flights(conn, [(2015, 2, 3, 2, "DL", 4, "ATL", "JFK", 30.0, 0)])
+
+    assert refresh_rollup(conn, "rollup_airline_month") == 1
+    assert refresh_rollup(conn, "rollup_airline_month") == 0
+    assert conn.execute(
+        "SELECT FLIGHTS, ARRIVAL_DELAY_SUM FROM rollup_airline_month "
+        "WHERE AIRLINE = 'DL'"
+    ).fetchone() == (2, 35)
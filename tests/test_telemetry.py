@@ -0,0 +1,73 @@
+import json
+import threading
+from src.llm.telemetry import (
+    FileSink,
+    TelemetryExporter,
+    TelemetrySink,
+    metrics,
+)
+
+
+class BlockingSink(TelemetrySink):
+    def __init__(self):
+        self.release = threading.Event()
+        self.events = []
+
+    def export(self, events):
+        self.release.wait()
+        self.events.extend(events)
+
+
+def test_file_sink_gets_the_events_in_batches(tmp_path):
+    file_name = tmp_path / "telemetry.jsonl"
+    exporter = TelemetryExporter(FileSink(str(file_name)), batch_size=2)
+
+    trace = exporter.trace("request", name="query")
+    generation = trace.generation(name="sql_generation", input="question")
+    generation.end(output="SELECT 1")
+    exporter.score("request", name="Helpfulness", value=5)
+    assert exporter.flush()
+    exporter.close()
+
+    lines = file_name.read_text().splitlines()
+    events = [json.loads(line) for line in lines]
+    assert [event["type"] for event in events] == [
+        "trace-create",
+        "generation-create",
+        "generation-update",
+        "score",
+    ]
+    assert {event["trace_id"] for event in events} == {"request"}
+    assert events[1]["id"] == events[2]["id"] == generation.id
+    assert "end_time" in events[2]["body"]
+
+
+def test_full_queue_drops_events():
+    metrics.reset()
+    sink = BlockingSink()
+    exporter = TelemetryExporter(sink, max_queue_size=2, batch_size=1)
+
+    for index in range(10):
+        exporter.trace(f"request-{index}")
+    # The export thread holds at most one event besides the queue.
+    assert metrics.get("telemetry_dropped_total") >= 7
+    sink.release.set()
+    exporter.close()
+    assert len(sink.events) + metrics.get("telemetry_dropped_total") == 10
+
+
+def test_sampling_keeps_or_drops_whole_traces():
+    sink = BlockingSink()
+    sink.release.set()
+    exporter = TelemetryExporter(sink, sample_rate=0.5)
+
+    for index in range(100):
+        trace = exporter.trace(f"request-{index}")
+        trace.generation(name="sql_generation").end(output="SELECT 1")
+    exporter.close()
+
+    kept = {}
+    for event in sink.events:
+        kept[event["trace_id"]] = kept.get(event["trace_id"], 0) + 1
+    assert 0 < len(kept) < 100
+    assert set(kept.values()) == {3}
@@ -0,0 +1,101 @@
+import pytest
+from src.sqlite_db.create import csv_to_sqlite
+from src.sqlite_db.db_constants import TABLE_COLUMNS
+from src.sqlite_db.execute import execute_query
+from src.sqlite_db.templates import match_template
+from tests.conftest import write_flights_csv
+
+# Leading columns of the flights table and the arrival delay.
+FLIGHT_COLUMNS = list(TABLE_COLUMNS["flights"])[:12] + ["ARRIVAL_DELAY"]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    airlines = tmp_path / "airlines.csv"
+    airlines.write_text(
+        "IATA_CODE,AIRLINE\n"
+        "AA,American Airlines Inc.\n"
+        "MQ,American Eagle Airlines Inc.\n"
+        "DL,Delta Air Lines Inc.\n"
+    )
+    airports = tmp_path / "airports.csv"
+    airports.write_text(
+        "IATA_CODE,AIRPORT,CITY,STATE,COUNTRY,LATITUDE,LONGITUDE\n"
+        "JFK,John F. Kennedy International Airport,New York,NY,USA,0,0\n"
+        "LGA,LaGuardia Airport,New York,NY,USA,0,0\n"
+        "ATL,Hartsfield-Jackson Atlanta International Airport,Atlanta,"
+        "GA,USA,0,0\n"
+    )
+    rows = [
+        [2015, 7, 1, 3, "DL", 1, "N1", "ATL", "JFK", 5, 0, 10.0, 10.0],
+        [2015, 7, 2, 4, "DL", 2, "N2", "ATL", "LGA", 5, 0, 20.0, 20.0],
+        [2015, 8, 1, 6, "MQ", 3, "N3", "JFK", "ATL", 5, 0, 30.0, 30.0],
+        # A cancelled flight has no delays.
+        [2015, 8, 2, 7, "AA", 4, "N4", "LGA", "ATL", 5, "", "", ""],
+    ]
+    flights = write_flights_csv(
+        tmp_path, [dict(zip(FLIGHT_COLUMNS, row)) for row in rows]
+    )
+    db_path = tmp_path / "flights.db"
+    csv_to_sqlite(
+        db_path,
+        {"airlines": airlines, "airports": airports, "flights": flights},
+    )
+    return db_path
+
+
+def test_template_answers_with_parameters(db_path):
+    matched = match_template(
+        db_path, "What is the average arrival delay for Delta in July?"
+    )
+    assert matched.name == "airline_average_delay"
+    assert matched.params == ["DL", 7]
+
+    result, error = execute_query(db_path, matched.sql, params=matched.params)
+    assert error is None
+    assert matched.describe(result) == (
+        "The average arrival delay of Delta Air Lines Inc. in July was "
+        "15.0 minutes."
+    )
+
+    matched = match_template(
+        db_path, "How many flights did American Eagle operate from JFK?"
+    )
+    assert matched.params == ["MQ", "JFK"]
+    result, _ = execute_query(db_path, matched.sql, params=matched.params)
+    assert matched.describe(result) == (
+        "There was 1 flight of American Eagle Airlines Inc. from "
+        "John F. Kennedy International Airport."
+    )
+
+    matched = match_template(db_path, "How many flights did Delta operate?")
+    result, _ = execute_query(db_path, matched.sql, params=matched.params)
+    assert matched.describe(result).endswith(" of Delta Air Lines Inc.")
+
+
+def test_template_answers_without_delays(db_path):
+    matched = match_template(
+        db_path, "What is the average arrival delay of American in August?"
+    )
+    assert matched.params == ["AA", 8]
+    result, _ = execute_query(db_path, matched.sql, params=matched.params)
+    assert matched.describe(result) == (
+        "There were no delayed flights of American Airlines Inc. in August, "
+        "no arrival delay was recorded."
+    )
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # Two airports are in New York.
+        "How many flights departed from New York?",
+        # The template does not know about weekends.
+        "What is the average delay of Delta on weekends?",
+        # Templates take a single airline.
+        "How many flights did Delta and American operate?",
+        "Which airline operates the most flights?",
+    ],
+)
+def test_unclear_questions_need_the_llm(db_path, question):
+    assert match_template(db_path, question) is None
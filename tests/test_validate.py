@@ -0,0 +1,44 @@
+import pytest
+from src.sqlite_db.validate import validate_query
+import sqlite3
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE flights (id INTEGER, name TEXT)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def error_codes(response):
+    return [error["code"] for error in response["errors"]]
+
+
+def test_validate_query_valid(temp_db):
+    response = validate_query(
+        temp_db,
+        "-- count\nWITH f AS (SELECT id FROM flights) SELECT * FROM f; -- all",
+    )
+    assert response == {"is_valid": True, "errors": []}
+
+
+@pytest.mark.parametrize(
+    "query, code",
+    [
+        ("", "empty"),
+        ("SELECT 'Flight A FROM flights", "incomplete"),
+        ("SELECT * FROM flights WHERE (id = 1", "syntax_error"),
+        ("DELETE FROM flights", "not_read_only"),
+        ("SELECT 1; DROP TABLE flights", "multiple_statements"),
+        ("SELECT FROM flights", "syntax_error"),
+        ("SELECT missing FROM flights", "schema_error"),
+        ("SELECT * FROM invalid_table", "schema_error"),
+    ],
+)
+def test_validate_query_invalid(temp_db, query, code):
+    response = validate_query(temp_db, query)
+    assert response["is_valid"] is False
+    assert error_codes(response) == [code]